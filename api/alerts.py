@@ -1,41 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, status
+from typing import List, Optional
 from schemas import alert as alert_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from core.etag import conditional_get, document_etag
+from core.pagination import PageParams, paginate
+from db import aio, snapshots, writes
+from db.aggregates import aggregate_cache, alert_summary
+from db.firestore_client import get_db, FirestoreClient
 from google.cloud.firestore_v1.base_query import FieldFilter
 from datetime import datetime, timezone
 
 router = APIRouter(tags=["Alerts"])
 
 @router.post("/api/users/{user_id}/alerts/", response_model=alert_schema.Alert, status_code=status.HTTP_201_CREATED)
-def create_alert(user_id: str, alert_in: alert_schema.AlertCreate, db: Client = Depends(get_db)):
+async def create_alert(user_id: str, alert_in: alert_schema.AlertCreate, background_tasks: BackgroundTasks, db: FirestoreClient = Depends(get_db)):
     if alert_in.userId != user_id:
         raise HTTPException(status_code=400, detail="User ID in path and body do not match.")
     data = alert_in.model_dump()
     data['createdAt'] = datetime.now(timezone.utc)
-    _ , ref = db.collection('alerts').add(data)
-    doc = ref.get()
+    doc = await writes.create_document(db, 'alerts', data)
+    aggregate_cache.invalidate("alerts", user_id)
+    background_tasks.add_task(snapshots.alert_written, db, user_id, None, data)
     return alert_schema.Alert(id=doc.id, **doc.to_dict())
 
 @router.get("/api/users/{user_id}/alerts/", response_model=List[alert_schema.Alert])
-def get_alerts_for_user(user_id: str, db: Client = Depends(get_db)):
-    docs = db.collection('alerts').where(filter=FieldFilter("userId", "==", user_id)).order_by("createdAt", direction="DESCENDING").stream()
-    return [alert_schema.Alert(id=doc.id, **doc.to_dict()) for doc in docs]
+async def get_alerts_for_user(user_id: str, response: Response, page: PageParams = Depends(), db: FirestoreClient = Depends(get_db)):
+    query = db.collection('alerts').where(filter=FieldFilter("userId", "==", user_id))
+    return await paginate(query, page, response, alert_schema.Alert, order_by="createdAt", direction="DESCENDING")
+
+@router.get("/api/users/{user_id}/alerts/summary", response_model=alert_schema.AlertSummary)
+async def get_alert_summary(user_id: str, db: FirestoreClient = Depends(get_db)):
+    """Alert and unread counts for badges, computed by aggregation queries instead of listing alerts."""
+    return await alert_summary(db, user_id)
 
 @router.get("/api/alerts/{alert_id}", response_model=alert_schema.Alert)
-def get_alert(alert_id: str, db: Client = Depends(get_db)):
-    doc = db.collection('alerts').document(alert_id).get()
+async def get_alert(alert_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    doc = await aio.get(db.collection('alerts').document(alert_id))
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Alert not found")
+    not_modified = conditional_get(request, response, document_etag(doc))
+    if not_modified:
+        return not_modified
     return alert_schema.Alert(id=doc.id, **doc.to_dict())
 
 @router.patch("/api/alerts/{alert_id}", response_model=alert_schema.Alert)
-def update_alert(alert_id: str, alert_update: alert_schema.AlertUpdate, db: Client = Depends(get_db)):
+async def update_alert(alert_id: str, alert_update: alert_schema.AlertUpdate, response: Response, background_tasks: BackgroundTasks, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
     ref = db.collection('alerts').document(alert_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Alert not found")
     update_data = alert_update.model_dump(exclude_unset=True)
-    ref.update(update_data)
-    updated_doc = ref.get()
-    return alert_schema.Alert(id=updated_doc.id, **updated_doc.to_dict())
\ No newline at end of file
+    previous_doc, updated_doc = await writes.update_with_previous(db, ref, update_data, if_match=if_match)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    aggregate_cache.invalidate("alerts", updated_doc.get('userId'))
+    background_tasks.add_task(snapshots.alert_written, db, updated_doc.get('userId'), previous_doc.to_dict(), updated_doc.to_dict())
+    response.headers["ETag"] = document_etag(updated_doc)
+    return alert_schema.Alert(id=updated_doc.id, **updated_doc.to_dict())
@@ -1,36 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from typing import Optional
 from schemas import challenge as challenge_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from core.etag import conditional_get, document_etag
+from db import writes
+from db.cache import profile_cache
+from db.firestore_client import get_db, FirestoreClient
 
 # Path is now based on user_id
 router = APIRouter(prefix="/api/users/{user_id}/challenges", tags=["Challenges"])
 
 @router.post("/", response_model=challenge_schema.Challenge, status_code=status.HTTP_201_CREATED)
-def create_or_replace_challenge_profile(user_id: str, challenge_in: challenge_schema.ChallengeCreate, db: Client = Depends(get_db)):
+async def create_or_replace_challenge_profile(user_id: str, challenge_in: challenge_schema.ChallengeCreate, db: FirestoreClient = Depends(get_db)):
     if challenge_in.userId != user_id:
         raise HTTPException(status_code=400, detail="User ID in path and body do not match.")
     
     # Use the user_id as the document ID
     ref = db.collection('challenges').document(user_id)
     data = challenge_in.model_dump()
-    ref.set(data)
-    doc = ref.get()
+    doc = await writes.set_document(ref, data)
+    profile_cache.invalidate('challenges', user_id)
     return challenge_schema.Challenge(id=doc.id, **doc.to_dict())
 
 @router.get("/", response_model=challenge_schema.Challenge)
-def get_challenge_profile(user_id: str, db: Client = Depends(get_db)):
-    doc = db.collection('challenges').document(user_id).get()
+async def get_challenge_profile(user_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    doc = await profile_cache.get(db, 'challenges', user_id)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Challenge profile not found for this user")
+    not_modified = conditional_get(request, response, document_etag(doc))
+    if not_modified:
+        return not_modified
     return challenge_schema.Challenge(id=doc.id, **doc.to_dict())
 
 @router.patch("/", response_model=challenge_schema.Challenge)
-def update_challenge_profile(user_id: str, challenge_update: challenge_schema.ChallengeUpdate, db: Client = Depends(get_db)):
+async def update_challenge_profile(user_id: str, challenge_update: challenge_schema.ChallengeUpdate, response: Response, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
     ref = db.collection('challenges').document(user_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Challenge profile not found for this user")
     update_data = challenge_update.model_dump(exclude_unset=True)
-    ref.update(update_data)
-    updated_doc = ref.get()
-    return challenge_schema.Challenge(id=updated_doc.id, **updated_doc.to_dict())
\ No newline at end of file
+    # A cached copy can serve as the base of the update; a stale one just fails the precondition
+    cached = await profile_cache.get(db, 'challenges', user_id)
+    updated_doc = await writes.update_document(db, ref, update_data, current=cached if cached.exists else None, if_match=if_match)
+    profile_cache.invalidate('challenges', user_id)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="Challenge profile not found for this user")
+    response.headers["ETag"] = document_etag(updated_doc)
+    return challenge_schema.Challenge(id=updated_doc.id, **updated_doc.to_dict())
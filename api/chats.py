@@ -1,52 +1,146 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from schemas import chat as chat_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from schemas import batch as batch_schema
+from core.config import settings
+from core.etag import conditional_get, document_etag
+from core.serialization import dumps
+from core.pagination import PageParams, paginate
+from db import aio, bulk, snapshots, writes
+from db.chat_hub import chat_hub
+from db.firestore_client import get_db, FirestoreClient
 from google.cloud.firestore_v1.base_query import FieldFilter # Import FieldFilter
 from datetime import datetime, timezone
 
 router_for_farm = APIRouter(prefix="/api/farms/{farm_id}/chats", tags=["Chats"])
 router_for_single_chat = APIRouter(prefix="/api/chats", tags=["Chats"])
 
+SINCE = Query(None, description="Only messages sent after this time, e.g. the timestamp of the newest message the client has.")
+
+
+def _since_query(db, farm_id: str, since):
+    query = db.collection('chats').where(filter=FieldFilter("farmId", "==", farm_id))
+    if since is not None:
+        query = query.where(filter=FieldFilter("timestamp", ">", since))
+    return query
+
+
+def _sse(event: str, doc) -> str:
+    body = {"id": doc.id} if event == "removed" else chat_schema.Chat(id=doc.id, **doc.to_dict())
+    return f"id: {doc.id}\nevent: {event}\ndata: {dumps(body).decode()}\n\n"
+
+
+async def _chat_events(db, farm_id: str, since):
+    """
+    Server-Sent Events for one client: messages after `since` first, then live
+    changes from the farm's shared listener. The subscription is taken before
+    the catch-up query runs, so nothing falls in between.
+    """
+    subscriber = chat_hub.subscribe(farm_id)
+    try:
+        sent = set()
+        if since is not None:
+            async for doc in aio.iterate(_since_query(db, farm_id, since).order_by("timestamp")):
+                sent.add(doc.id)
+                yield _sse("added", doc)
+        while True:
+            event = await subscriber.next_event(settings.CHAT_STREAM_HEARTBEAT)
+            if subscriber.overflowed:
+                # Too far behind; the client refetches with `since` and reconnects
+                yield "event: reset\ndata: {}\n\n"
+                return
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            kind, doc = event
+            if kind == "added" and doc.id in sent:
+                continue
+            yield _sse(kind, doc)
+    finally:
+        chat_hub.unsubscribe(farm_id, subscriber)
+
 @router_for_farm.post("/", response_model=chat_schema.Chat, status_code=status.HTTP_201_CREATED)
-def create_chat_message(farm_id: str, chat_in: chat_schema.ChatCreate, db: Client = Depends(get_db)):
+async def create_chat_message(farm_id: str, chat_in: chat_schema.ChatCreate, background_tasks: BackgroundTasks, db: FirestoreClient = Depends(get_db)):
     if chat_in.farmId != farm_id:
         raise HTTPException(status_code=400, detail="Farm ID in path and body do not match.")
     
     farm_ref = db.collection('farms').document(farm_id)
-    if not farm_ref.get().exists:
+    if not (await aio.get(farm_ref)).exists:
         raise HTTPException(status_code=404, detail="Farm not found")
 
     chat_data = chat_in.model_dump()
     chat_data['timestamp'] = datetime.now(timezone.utc)
     
     # Correctly save to the top-level 'chats' collection
-    _ , chat_ref = db.collection('chats').add(chat_data)
-    created_doc = chat_ref.get()
+    created_doc = await writes.create_document(db, 'chats', chat_data)
+    background_tasks.add_task(snapshots.recent_written, db, farm_id, 'chats', [created_doc])
     return chat_schema.Chat(id=created_doc.id, **created_doc.to_dict())
 
 
+@router_for_farm.post("/batch", response_model=batch_schema.BatchResult)
+async def create_chat_messages_batch(farm_id: str, batch_in: batch_schema.BatchCreate, background_tasks: BackgroundTasks, db: FirestoreClient = Depends(get_db)):
+    """
+    Creates many chat messages in one request after checking the farm once.
+    Each item is validated as a ChatCreate and gets its own result; items carrying
+    an idempotencyKey are only ever written once, so a retried sync is safe.
+    """
+    if not (await aio.get(db.collection('farms').document(farm_id))).exists:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    result = await bulk.ingest_for_farm('chats', farm_id, batch_in.items, chat_schema.ChatCreate, 'timestamp')
+    if result.created:
+        background_tasks.add_task(snapshots.recent_refreshed, db, farm_id, 'chats')
+    return result
+
+
 @router_for_farm.get("/", response_model=List[chat_schema.Chat])
-def get_chats_for_farm(farm_id: str, db: Client = Depends(get_db)):
-    # THIS FUNCTION IS NOW CORRECTED
+async def get_chats_for_farm(farm_id: str, response: Response, since: Optional[datetime] = SINCE, page: PageParams = Depends(), db: FirestoreClient = Depends(get_db)):
+    """
+    Lists a farm's chat history, oldest first. Pass `since` to fetch only the
+    messages newer than those the client already holds.
+    """
     farm_ref = db.collection('farms').document(farm_id)
-    if not farm_ref.get().exists:
+    if not (await aio.get(farm_ref)).exists:
         raise HTTPException(status_code=404, detail="Farm not found")
         
     # Correctly query the top-level 'chats' collection and filter by farmId
-    chats_ref = db.collection('chats').where(
-        filter=FieldFilter("farmId", "==", farm_id)
-    ).order_by("timestamp").stream()
-    
-    return [chat_schema.Chat(id=doc.id, **doc.to_dict()) for doc in chats_ref]
+    query = _since_query(db, farm_id, since)
+    return await paginate(query, page, response, chat_schema.Chat, order_by="timestamp")
+
+
+@router_for_farm.get("/stream", response_class=StreamingResponse)
+async def stream_chats_for_farm(farm_id: str, since: Optional[datetime] = SINCE, db: FirestoreClient = Depends(get_db)):
+    """
+    Pushes the farm's new, edited and deleted messages as Server-Sent Events
+    (`added`, `modified`, `removed`, each carrying the message as JSON). A
+    `reset` event means the client fell behind and should refetch with `since`.
+    """
+    if not (await aio.get(db.collection('farms').document(farm_id))).exists:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    return StreamingResponse(
+        _chat_events(db, farm_id, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
-# --- (The single get and patch endpoints remain the same) ---
 @router_for_single_chat.get("/{chat_id}", response_model=chat_schema.Chat)
-def get_chat_message(chat_id: str, db: Client = Depends(get_db)):
-    # ... code ...
-    pass
+async def get_chat_message(chat_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    chat_doc = await aio.get(db.collection('chats').document(chat_id))
+    if not chat_doc.exists:
+        raise HTTPException(status_code=404, detail="Chat message not found")
+    not_modified = conditional_get(request, response, document_etag(chat_doc))
+    if not_modified:
+        return not_modified
+    return chat_schema.Chat(id=chat_doc.id, **chat_doc.to_dict())
+
 @router_for_single_chat.patch("/{chat_id}", response_model=chat_schema.Chat)
-def update_chat_message(chat_id: str, chat_update: chat_schema.ChatUpdate, db: Client = Depends(get_db)):
-    # ... code ...
-    pass
\ No newline at end of file
+async def update_chat_message(chat_id: str, chat_update: chat_schema.ChatUpdate, response: Response, background_tasks: BackgroundTasks, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
+    chat_ref = db.collection('chats').document(chat_id)
+    update_data = chat_update.model_dump(exclude_unset=True)
+    updated_doc = await writes.update_document(db, chat_ref, update_data, if_match=if_match)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="Chat message not found")
+    background_tasks.add_task(snapshots.recent_written, db, updated_doc.get('farmId'), 'chats', [updated_doc])
+    response.headers["ETag"] = document_etag(updated_doc)
+    return chat_schema.Chat(id=updated_doc.id, **updated_doc.to_dict())
@@ -1,38 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, status
+from typing import Optional
 from schemas import crop as crop_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from core.etag import conditional_get, document_etag
+from core.config import settings
+from db import aio, rollups, snapshots, writes
+from db.cache import profile_cache
+from db.firestore_client import get_db, FirestoreClient
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/api/farms/{farm_id}/crops", tags=["Crops"])
 
 @router.post("/", response_model=crop_schema.Crop, status_code=status.HTTP_201_CREATED)
-def create_or_replace_crop_profile(farm_id: str, crop_in: crop_schema.CropCreate, db: Client = Depends(get_db)):
+async def create_or_replace_crop_profile(farm_id: str, crop_in: crop_schema.CropCreate, background_tasks: BackgroundTasks, db: FirestoreClient = Depends(get_db)):
     if crop_in.farmId != farm_id:
         raise HTTPException(status_code=400, detail="Farm ID in path and body do not match.")
     
     crop_ref = db.collection('crops').document(farm_id)
     crop_data = crop_in.model_dump()
-    crop_data['createdAt'] = datetime.now(timezone.utc)
+    crop_data['createdAt'] = crop_data['updatedAt'] = datetime.now(timezone.utc)
     
+    rollup_changes = []
+    if settings.REGION_ROLLUPS_ENABLED:
+        # The profile being replaced, if any, leaves the regional rollup; without rollups the POST is one write
+        previous_doc, region = await asyncio.gather(aio.get(crop_ref), rollups.farm_region(db, farm_id))
+        previous = rollups.crop_contribution(previous_doc.to_dict()) if previous_doc.exists else {}
+        rollup_changes.append((region, rollups.difference(rollups.crop_contribution(crop_data), previous)))
     # Use set() to create or overwrite the document with the farm_id
-    crop_ref.set(crop_data)
-    created_doc = crop_ref.get()
+    created_doc = await writes.set_document(crop_ref, crop_data)
+    profile_cache.invalidate('crops', farm_id)
+    await rollups.apply(db, rollup_changes)
+    background_tasks.add_task(snapshots.crop_written, db, farm_id, crop_data)
     return crop_schema.Crop(id=created_doc.id, **created_doc.to_dict())
 
 @router.get("/", response_model=crop_schema.Crop)
-def get_crop_profile(farm_id: str, db: Client = Depends(get_db)):
-    crop_doc = db.collection('crops').document(farm_id).get()
+async def get_crop_profile(farm_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    crop_doc = await profile_cache.get(db, 'crops', farm_id)
     if not crop_doc.exists:
         raise HTTPException(status_code=404, detail="Crop profile not found for this farm")
+    not_modified = conditional_get(request, response, document_etag(crop_doc))
+    if not_modified:
+        return not_modified
     return crop_schema.Crop(id=crop_doc.id, **crop_doc.to_dict())
 
 @router.patch("/", response_model=crop_schema.Crop)
-def update_crop_profile(farm_id: str, crop_update: crop_schema.CropUpdate, db: Client = Depends(get_db)):
+async def update_crop_profile(farm_id: str, crop_update: crop_schema.CropUpdate, response: Response, background_tasks: BackgroundTasks, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
     crop_ref = db.collection('crops').document(farm_id)
-    if not crop_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Crop profile not found for this farm")
     update_data = crop_update.model_dump(exclude_unset=True)
-    crop_ref.update(update_data)
-    updated_doc = crop_ref.get()
-    return crop_schema.Crop(id=updated_doc.id, **updated_doc.to_dict())
\ No newline at end of file
+    update_data['updatedAt'] = datetime.now(timezone.utc) # picked up by incremental scoring runs
+    # A cached copy can serve as the base of the update; a stale one just fails the precondition
+    cached = await profile_cache.get(db, 'crops', farm_id)
+    previous_doc, updated_doc = await writes.update_with_previous(db, crop_ref, update_data, current=cached if cached.exists else None, if_match=if_match)
+    profile_cache.invalidate('crops', farm_id)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="Crop profile not found for this farm")
+    change = rollups.difference(rollups.crop_contribution(updated_doc.to_dict()), rollups.crop_contribution(previous_doc.to_dict()))
+    if rollups.prune(change):
+        await rollups.apply(db, [(await rollups.farm_region(db, farm_id), change)])
+    background_tasks.add_task(snapshots.crop_written, db, farm_id, updated_doc.to_dict())
+    response.headers["ETag"] = document_etag(updated_doc)
+    return crop_schema.Crop(id=updated_doc.id, **updated_doc.to_dict())
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends, HTTPException
+from schemas import deletion_job as job_schema
+from db import aio, deletion
+from db.firestore_client import get_db, FirestoreClient
+
+router = APIRouter(prefix="/api/deletion-jobs", tags=["Deletion Jobs"])
+
+@router.get("/{job_id}", response_model=job_schema.DeletionJob)
+async def get_deletion_job(job_id: str, db: FirestoreClient = Depends(get_db)):
+    """Progress of a farm or user deletion started by DELETE /api/farms/{id} or /api/users/{id}."""
+    job_doc = await aio.get(db.collection(deletion.COLLECTION).document(job_id))
+    if not job_doc.exists:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job_schema.DeletionJob.from_job(job_doc.id, job_doc.to_dict())
@@ -0,0 +1,72 @@
+import zlib
+from enum import Enum
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from core.serialization import dumps
+from db import aio
+from db.firestore_client import get_db, FirestoreClient
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+router = APIRouter(tags=["Exports"])
+
+# Raw output is buffered up to this size before being compressed and sent
+CHUNK_BYTES = 64 * 1024
+
+class FarmExport(str, Enum):
+    logs = "logs"
+    chats = "chats"
+    soil_profiles = "soil-profiles"
+
+class UserExport(str, Enum):
+    alerts = "alerts"
+
+COLLECTIONS = {"logs": "logs", "chats": "chats", "soil-profiles": "soilProfiles", "alerts": "alerts"}
+
+
+async def _ndjson(query, compress: bool):
+    """
+    Streams documents as one JSON object per line, pulling from Firestore only as
+    fast as the client reads, so memory stays flat however many rows there are.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 = gzip container
+    buffer = []
+    size = 0
+    async for doc in aio.iterate(query):
+        # Same encoder as the JSON responses, so timestamps read the same in both
+        buffer.append(dumps({"id": doc.id, **doc.to_dict()}) + b"\n")
+        size += len(buffer[-1])
+        if size >= CHUNK_BYTES:
+            chunk = b"".join(buffer)
+            buffer, size = [], 0
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else chunk
+    chunk = b"".join(buffer)
+    yield compressor.compress(chunk) + compressor.flush() if compressor else chunk
+
+
+def _export(db, collection: str, field: str, value: str, start_after: Optional[str], compress: bool):
+    # Ordered by document id so the id of the last line received is a resume cursor
+    query = db.collection(collection).where(filter=FieldFilter(field, "==", value)).order_by(FieldPath.document_id())
+    if start_after:
+        query = query.start_after([start_after])
+    headers = {"Content-Encoding": "gzip"} if compress else None
+    return StreamingResponse(_ndjson(query, compress), media_type="application/x-ndjson", headers=headers)
+
+
+RESUME = Query(None, description="Resume after this document id, i.e. the id on the last line received.")
+GZIP = Query(False, description="Gzip-compress the stream.")
+
+
+@router.get("/api/farms/{farm_id}/export/{collection}", response_class=StreamingResponse,
+            summary="Export a farm collection as NDJSON")
+async def export_farm_collection(farm_id: str, collection: FarmExport, start_after: Optional[str] = RESUME,
+                                 gzip: bool = GZIP, db: FirestoreClient = Depends(get_db)):
+    return _export(db, COLLECTIONS[collection.value], "farmId", farm_id, start_after, gzip)
+
+
+@router.get("/api/users/{user_id}/export/{collection}", response_class=StreamingResponse,
+            summary="Export a user collection as NDJSON")
+async def export_user_collection(user_id: str, collection: UserExport, start_after: Optional[str] = RESUME,
+                                 gzip: bool = GZIP, db: FirestoreClient = Depends(get_db)):
+    return _export(db, COLLECTIONS[collection.value], "userId", user_id, start_after, gzip)
@@ -1,51 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, status
+from typing import List, Optional
 from schemas import farm as farm_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from schemas import deletion_job as job_schema
+from core.etag import conditional_get, document_etag
+from core.pagination import PageParams, paginate
+from db import aio, deletion, rollups, snapshots, writes
+from db.aggregates import aggregate_cache, farm_summary
+from db.firestore_client import get_db, FirestoreClient
 from google.cloud.firestore_v1.base_query import FieldFilter
 from datetime import datetime, timezone
 
 router = APIRouter(tags=["Farms"])
 
 @router.post("/api/users/{user_id}/farms/", response_model=farm_schema.Farm, status_code=status.HTTP_201_CREATED)
-def create_farm(user_id: str, farm_in: farm_schema.FarmCreate, db: Client = Depends(get_db)):
+async def create_farm(user_id: str, farm_in: farm_schema.FarmCreate, background_tasks: BackgroundTasks, db: FirestoreClient = Depends(get_db)):
     if farm_in.userId != user_id:
         raise HTTPException(status_code=400, detail="User ID in path and body do not match.")
     farm_data = farm_in.model_dump()
     farm_data['lastUpdated'] = datetime.now(timezone.utc)
-    _ , farm_ref = db.collection('farms').add(farm_data)
-    created_doc = farm_ref.get()
+    created_doc = await writes.create_document(db, 'farms', farm_data)
+    aggregate_cache.invalidate("farms", user_id)
+    await rollups.farm_changed(db, created_doc.id, None, farm_data)
+    background_tasks.add_task(snapshots.farm_written, db, user_id, created_doc.id, farm_data)
     return farm_schema.Farm(id=created_doc.id, **created_doc.to_dict())
 
 @router.get("/api/users/{user_id}/farms/", response_model=List[farm_schema.Farm])
-def get_farms_for_user(user_id: str, db: Client = Depends(get_db)):
-    farms_ref = db.collection('farms').where(filter=FieldFilter("userId", "==", user_id)).stream()
-    return [farm_schema.Farm(id=doc.id, **doc.to_dict()) for doc in farms_ref]
+async def get_farms_for_user(user_id: str, response: Response, page: PageParams = Depends(), db: FirestoreClient = Depends(get_db)):
+    query = db.collection('farms').where(filter=FieldFilter("userId", "==", user_id))
+    return await paginate(query, page, response, farm_schema.Farm)
+
+@router.get("/api/users/{user_id}/farms/summary", response_model=farm_schema.FarmSummary)
+async def get_farm_summary(user_id: str, db: FirestoreClient = Depends(get_db)):
+    """Farm count, total area and average scores across a user's farms, from one aggregation query."""
+    return await farm_summary(db, user_id)
 
 @router.get("/api/farms/{farm_id}", response_model=farm_schema.Farm)
-def get_farm(farm_id: str, db: Client = Depends(get_db)):
-    farm_doc = db.collection('farms').document(farm_id).get()
+async def get_farm(farm_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    farm_doc = await aio.get(db.collection('farms').document(farm_id))
     if not farm_doc.exists:
         raise HTTPException(status_code=404, detail="Farm not found")
+    not_modified = conditional_get(request, response, document_etag(farm_doc))
+    if not_modified:
+        return not_modified
     return farm_schema.Farm(id=farm_doc.id, **farm_doc.to_dict())
 
 @router.patch("/api/farms/{farm_id}", response_model=farm_schema.Farm)
-def update_farm(farm_id: str, farm_update: farm_schema.FarmUpdate, db: Client = Depends(get_db)):
+async def update_farm(farm_id: str, farm_update: farm_schema.FarmUpdate, response: Response, background_tasks: BackgroundTasks, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
     farm_ref = db.collection('farms').document(farm_id)
-    if not farm_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Farm not found")
     update_data = farm_update.model_dump(exclude_unset=True)
     update_data['lastUpdated'] = datetime.now(timezone.utc)
-    farm_ref.update(update_data)
-    updated_doc = farm_ref.get()
+    previous_doc, updated_doc = await writes.update_with_previous(db, farm_ref, update_data, if_match=if_match)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    aggregate_cache.invalidate("farms", updated_doc.get('userId'))
+    await rollups.farm_changed(db, farm_id, previous_doc.to_dict(), updated_doc.to_dict())
+    background_tasks.add_task(snapshots.farm_written, db, updated_doc.get('userId'), farm_id, updated_doc.to_dict())
+    response.headers["ETag"] = document_etag(updated_doc)
     return farm_schema.Farm(id=updated_doc.id, **updated_doc.to_dict())
 
-@router.delete("/api/farms/{farm_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_farm(farm_id: str, db: Client = Depends(get_db)):
-    # Note: In a real app, you'd also delete all child documents (logs, crops, etc.)
+@router.delete("/api/farms/{farm_id}", response_model=job_schema.DeletionJob, status_code=status.HTTP_202_ACCEPTED)
+async def delete_farm(farm_id: str, response: Response, background_tasks: BackgroundTasks, db: FirestoreClient = Depends(get_db)):
+    """
+    Deletes the farm right away and starts a background job that removes its
+    crops, soil profiles, logs and chats. Poll the Location for progress.
+    """
     farm_ref = db.collection('farms').document(farm_id)
-    if not farm_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Farm not found")
-    farm_ref.delete()
-    return
\ No newline at end of file
+    for _ in range(writes.UPDATE_ATTEMPTS):
+        farm_doc = await aio.get(farm_ref)
+        if not farm_doc.exists:
+            raise HTTPException(status_code=404, detail="Farm not found")
+        batch, job_ref, job = deletion.farm_deletion(db, farm_doc)
+        try:
+            await aio.write(batch.commit)
+            break
+        except deletion.CONFLICTS:
+            continue  # deleted by a concurrent DELETE, or changed since it was read
+    else:
+        raise HTTPException(status_code=409, detail="Farm is being modified concurrently, please retry.")
+    aggregate_cache.invalidate("farms", farm_doc.get('userId'))
+    background_tasks.add_task(snapshots.farm_removed, db, farm_doc.get('userId'), farm_id)
+    deletion.submit(job_ref.id)
+    response.headers["Location"] = f"/api/deletion-jobs/{job_ref.id}"
+    return job_schema.DeletionJob.from_job(job_ref.id, job)
@@ -1,39 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from typing import List, Optional
 from schemas import finance as finance_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from core.etag import conditional_get, document_etag
+from core.pagination import PageParams, paginate
+from db import aio, writes
+from db.firestore_client import get_db, FirestoreClient
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(tags=["Finance"])
 
 @router.post("/api/users/{user_id}/finance/", response_model=finance_schema.Finance, status_code=status.HTTP_201_CREATED)
-def create_finance_profile(user_id: str, finance_in: finance_schema.FinanceCreate, db: Client = Depends(get_db)):
+async def create_finance_profile(user_id: str, finance_in: finance_schema.FinanceCreate, db: FirestoreClient = Depends(get_db)):
     if finance_in.userId != user_id:
         raise HTTPException(status_code=400, detail="User ID in path and body do not match.")
     data = finance_in.model_dump()
-    _ , ref = db.collection('finance').add(data)
-    doc = ref.get()
+    doc = await writes.create_document(db, 'finance', data)
     return finance_schema.Finance(id=doc.id, **doc.to_dict())
 
 @router.get("/api/users/{user_id}/finance/", response_model=List[finance_schema.Finance])
-def get_finance_profiles_for_user(user_id: str, db: Client = Depends(get_db)):
-    docs = db.collection('finance').where(filter=FieldFilter("userId", "==", user_id)).stream()
-    return [finance_schema.Finance(id=doc.id, **doc.to_dict()) for doc in docs]
+async def get_finance_profiles_for_user(user_id: str, response: Response, page: PageParams = Depends(), db: FirestoreClient = Depends(get_db)):
+    query = db.collection('finance').where(filter=FieldFilter("userId", "==", user_id))
+    return await paginate(query, page, response, finance_schema.Finance)
 
 @router.get("/api/finance/{finance_id}", response_model=finance_schema.Finance)
-def get_finance_profile(finance_id: str, db: Client = Depends(get_db)):
-    doc = db.collection('finance').document(finance_id).get()
+async def get_finance_profile(finance_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    doc = await aio.get(db.collection('finance').document(finance_id))
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Finance profile not found")
+    not_modified = conditional_get(request, response, document_etag(doc))
+    if not_modified:
+        return not_modified
     return finance_schema.Finance(id=doc.id, **doc.to_dict())
 
 @router.patch("/api/finance/{finance_id}", response_model=finance_schema.Finance)
-def update_finance_profile(finance_id: str, finance_update: finance_schema.FinanceUpdate, db: Client = Depends(get_db)):
+async def update_finance_profile(finance_id: str, finance_update: finance_schema.FinanceUpdate, response: Response, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
     ref = db.collection('finance').document(finance_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Finance profile not found")
     update_data = finance_update.model_dump(exclude_unset=True)
-    ref.update(update_data)
-    updated_doc = ref.get()
-    return finance_schema.Finance(id=updated_doc.id, **updated_doc.to_dict())
\ No newline at end of file
+    updated_doc = await writes.update_document(db, ref, update_data, if_match=if_match)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="Finance profile not found")
+    response.headers["ETag"] = document_etag(updated_doc)
+    return finance_schema.Finance(id=updated_doc.id, **updated_doc.to_dict())
@@ -1,41 +1,123 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response, status
+from typing import List, Optional
 from schemas import log as log_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from schemas import batch as batch_schema
+from core.etag import conditional_get, document_etag
+from core.pagination import PageParams, paginate
+from core.serialization import document_dict
+from core import geohash
+from core.config import settings
+from db import aio, bulk, geo, snapshots, writes
+from db.aggregates import aggregate_cache, log_summary
+from db.firestore_client import get_db, FirestoreClient
 from google.cloud.firestore_v1.base_query import FieldFilter
 from datetime import datetime, timezone
 
 router = APIRouter(tags=["Activity Logs"])
 
 @router.post("/api/farms/{farm_id}/logs/", response_model=log_schema.Log, status_code=status.HTTP_201_CREATED)
-def create_log(farm_id: str, log_in: log_schema.LogCreate, db: Client = Depends(get_db)):
+async def create_log(farm_id: str, log_in: log_schema.LogCreate, background_tasks: BackgroundTasks, db: FirestoreClient = Depends(get_db)):
     if log_in.farmId != farm_id:
         raise HTTPException(status_code=400, detail="Farm ID in path and body do not match.")
-    data = log_in.model_dump()
+    data = geo.with_geohash(log_in.model_dump())
     data['timestamp'] = datetime.now(timezone.utc)
-    _ , ref = db.collection('logs').add(data)
-    doc = ref.get()
+    doc = await writes.create_document(db, 'logs', data)
+    aggregate_cache.invalidate("logs", farm_id)
+    background_tasks.add_task(snapshots.recent_written, db, farm_id, 'logs', [doc])
     return log_schema.Log(id=doc.id, **doc.to_dict())
 
+@router.post("/api/farms/{farm_id}/logs/batch", response_model=batch_schema.BatchResult)
+async def create_logs_batch(farm_id: str, batch_in: batch_schema.BatchCreate, background_tasks: BackgroundTasks, db: FirestoreClient = Depends(get_db)):
+    """
+    Creates many activity logs in one request, e.g. when a field agent syncs offline work.
+    Each item is validated as a LogCreate and gets its own result; items carrying an
+    idempotencyKey are only ever written once, so a retried sync is safe.
+    """
+    if not (await aio.get(db.collection('farms').document(farm_id))).exists:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    result = await bulk.ingest_for_farm('logs', farm_id, batch_in.items, log_schema.LogCreate, 'timestamp', prepare=geo.with_geohash)
+    aggregate_cache.invalidate("logs", farm_id)
+    if result.created:
+        background_tasks.add_task(snapshots.recent_refreshed, db, farm_id, 'logs')
+    return result
+
+@router.get("/api/farms/{farm_id}/logs/summary", response_model=log_schema.LogSummary)
+async def get_log_summary(farm_id: str, activity_type: Optional[List[str]] = Query(None, alias="activityType"), db: FirestoreClient = Depends(get_db)):
+    """
+    Number of logs on the farm, in total and per activity type, computed by
+    aggregation queries. Repeat `activityType` to choose the types counted,
+    up to LOG_SUMMARY_MAX_TYPES of them.
+    """
+    activity_types = list(dict.fromkeys(activity_type)) if activity_type else settings.LOG_ACTIVITY_TYPES
+    if len(activity_types) > settings.LOG_SUMMARY_MAX_TYPES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.LOG_SUMMARY_MAX_TYPES} distinct activityType values can be counted at once.")
+    return await log_summary(db, farm_id, activity_types)
+
 @router.get("/api/farms/{farm_id}/logs/", response_model=List[log_schema.Log])
-def get_logs_for_farm(farm_id: str, db: Client = Depends(get_db)):
-    docs = db.collection('logs').where(filter=FieldFilter("farmId", "==", farm_id)).order_by("timestamp", direction="DESCENDING").stream()
-    return [log_schema.Log(id=doc.id, **doc.to_dict()) for doc in docs]
+async def get_logs_for_farm(farm_id: str, response: Response, page: PageParams = Depends(), db: FirestoreClient = Depends(get_db)):
+    query = db.collection('logs').where(filter=FieldFilter("farmId", "==", farm_id))
+    return await paginate(query, page, response, log_schema.Log, order_by="timestamp", direction="DESCENDING")
+
+@router.get("/api/logs/nearby", response_model=List[log_schema.Log])
+async def get_logs_nearby(
+    response: Response,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, alias="radiusKm", gt=0),
+    min_lat: Optional[float] = Query(None, alias="minLat", ge=-90, le=90),
+    min_lng: Optional[float] = Query(None, alias="minLng", ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, alias="maxLat", ge=-90, le=90),
+    max_lng: Optional[float] = Query(None, alias="maxLng", ge=-180, le=180),
+    activity_type: Optional[str] = Query(None, alias="activityType"),
+    since: Optional[datetime] = Query(None, description="Only logs recorded after this time."),
+    limit: int = Query(100, ge=1, le=1000),
+    db: FirestoreClient = Depends(get_db),
+):
+    """
+    Logs recorded within `radiusKm` of lat/lng, or inside the box
+    minLat/minLng/maxLat/maxLng, newest first, e.g. pesticide logs within
+    10 km over the last week to spot an outbreak. X-Results-Truncated: true
+    means the area was too busy to search completely; narrow it with `since`.
+    """
+    if lat is not None and lng is not None and radius_km is not None:
+        if radius_km > settings.GEO_MAX_RADIUS_KM:
+            raise HTTPException(status_code=400, detail=f"radiusKm can be at most {settings.GEO_MAX_RADIUS_KM}.")
+        bbox = geohash.radius_bbox(lat, lng, radius_km)
+        contains = lambda la, ln: geohash.distance_km(lat, lng, la, ln) <= radius_km
+    elif None not in (min_lat, min_lng, max_lat, max_lng):
+        if min_lat > max_lat or min_lng > max_lng:
+            raise HTTPException(status_code=400, detail="minLat/minLng must not exceed maxLat/maxLng.")
+        bbox = (min_lat, min_lng, max_lat, max_lng)
+        if geohash.distance_km(min_lat, min_lng, max_lat, max_lng) / 2 > settings.GEO_MAX_RADIUS_KM:
+            raise HTTPException(status_code=400, detail=f"The box can span at most {2 * settings.GEO_MAX_RADIUS_KM} km corner to corner.")
+        contains = lambda la, ln: geohash.in_bbox(la, ln, bbox)
+    else:
+        raise HTTPException(status_code=400, detail="Pass lat, lng and radiusKm, or minLat, minLng, maxLat and maxLng.")
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    docs, truncated = await geo.logs_in_area(db, bbox, contains, limit, activity_type=activity_type, since=since)
+    if truncated:
+        response.headers[geo.TRUNCATED_HEADER] = "true"
+    return [document_dict(doc) for doc in docs]
 
 @router.get("/api/logs/{log_id}", response_model=log_schema.Log)
-def get_log(log_id: str, db: Client = Depends(get_db)):
-    doc = db.collection('logs').document(log_id).get()
+async def get_log(log_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    doc = await aio.get(db.collection('logs').document(log_id))
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Log not found")
+    not_modified = conditional_get(request, response, document_etag(doc))
+    if not_modified:
+        return not_modified
     return log_schema.Log(id=doc.id, **doc.to_dict())
 
 @router.patch("/api/logs/{log_id}", response_model=log_schema.Log)
-def update_log(log_id: str, log_update: log_schema.LogUpdate, db: Client = Depends(get_db)):
+async def update_log(log_id: str, log_update: log_schema.LogUpdate, response: Response, background_tasks: BackgroundTasks, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
     ref = db.collection('logs').document(log_id)
-    if not ref.get().exists:
+    update_data = geo.with_geohash(log_update.model_dump(exclude_unset=True))
+    updated_doc = await writes.update_document(db, ref, update_data, if_match=if_match)
+    if updated_doc is None:
         raise HTTPException(status_code=404, detail="Log not found")
-    update_data = log_update.model_dump(exclude_unset=True)
-    ref.update(update_data)
-    updated_doc = ref.get()
-    return log_schema.Log(id=updated_doc.id, **updated_doc.to_dict())
\ No newline at end of file
+    aggregate_cache.invalidate("logs", updated_doc.get('farmId'))
+    background_tasks.add_task(snapshots.recent_written, db, updated_doc.get('farmId'), 'logs', [updated_doc])
+    response.headers["ETag"] = document_etag(updated_doc)
+    return log_schema.Log(id=updated_doc.id, **updated_doc.to_dict())
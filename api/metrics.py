@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from core import metrics, startup
+
+router = APIRouter(tags=["Monitoring"])
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of this worker's request metrics and startup phases."""
+    return PlainTextResponse(metrics.render() + startup.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import Optional
+from schemas import region as region_schema
+from core.etag import conditional_get, document_etag
+from db import aio, rollups
+from db.firestore_client import get_db, FirestoreClient
+
+router = APIRouter(prefix="/api/regions", tags=["Regions"])
+
+@router.get("/summary", response_model=region_schema.RegionSummary)
+async def get_region_summary(request: Request, response: Response, state: str = Query(...), district: Optional[str] = None, taluka: Optional[str] = None, db: FirestoreClient = Depends(get_db)):
+    """
+    Farm count, area, average soil nutrients, irrigation methods and current
+    crops for a state, a district (state + district) or a taluka (all three),
+    read from one precomputed rollup document.
+    """
+    if taluka and not district:
+        raise HTTPException(status_code=400, detail="A taluka needs its district.")
+    ref = rollups.rollup_ref(db, rollups.region_of({"state": state, "district": district, "taluka": taluka}))
+    rollup_doc = await aio.get(ref) if ref is not None else None
+    if rollup_doc is None or not rollup_doc.exists:
+        raise HTTPException(status_code=404, detail="No farms recorded for this region")
+    not_modified = conditional_get(request, response, document_etag(rollup_doc))
+    if not_modified:
+        return not_modified
+    return region_schema.RegionSummary.from_rollup(rollup_doc.id, rollup_doc.to_dict(), rollups.SOIL_FIELDS)
@@ -1,36 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from typing import Optional
 from schemas import resource as resource_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from core.etag import conditional_get, document_etag
+from db import writes
+from db.cache import profile_cache
+from db.firestore_client import get_db, FirestoreClient
 
 # Path is now based on user_id
 router = APIRouter(prefix="/api/users/{user_id}/resources", tags=["Resources"])
 
 @router.post("/", response_model=resource_schema.Resource, status_code=status.HTTP_201_CREATED)
-def create_or_replace_resource_profile(user_id: str, resource_in: resource_schema.ResourceCreate, db: Client = Depends(get_db)):
+async def create_or_replace_resource_profile(user_id: str, resource_in: resource_schema.ResourceCreate, db: FirestoreClient = Depends(get_db)):
     if resource_in.userId != user_id:
         raise HTTPException(status_code=400, detail="User ID in path and body do not match.")
     
     # Use the user_id as the document ID to enforce a one-to-one relationship
     resource_ref = db.collection('resources').document(user_id)
     resource_data = resource_in.model_dump()
-    resource_ref.set(resource_data)
-    created_doc = resource_ref.get()
+    resource_data['updatedAt'] = datetime.now(timezone.utc) # picked up by incremental scoring runs
+    created_doc = await writes.set_document(resource_ref, resource_data)
+    profile_cache.invalidate('resources', user_id)
     return resource_schema.Resource(id=created_doc.id, **created_doc.to_dict())
 
 @router.get("/", response_model=resource_schema.Resource)
-def get_resource_profile(user_id: str, db: Client = Depends(get_db)):
-    doc = db.collection('resources').document(user_id).get()
+async def get_resource_profile(user_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    doc = await profile_cache.get(db, 'resources', user_id)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Resource profile not found for this user")
+    not_modified = conditional_get(request, response, document_etag(doc))
+    if not_modified:
+        return not_modified
     return resource_schema.Resource(id=doc.id, **doc.to_dict())
 
 @router.patch("/", response_model=resource_schema.Resource)
-def update_resource_profile(user_id: str, resource_update: resource_schema.ResourceUpdate, db: Client = Depends(get_db)):
+async def update_resource_profile(user_id: str, resource_update: resource_schema.ResourceUpdate, response: Response, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
     ref = db.collection('resources').document(user_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Resource profile not found for this user")
     update_data = resource_update.model_dump(exclude_unset=True)
-    ref.update(update_data)
-    updated_doc = ref.get()
-    return resource_schema.Resource(id=updated_doc.id, **updated_doc.to_dict())
\ No newline at end of file
+    update_data['updatedAt'] = datetime.now(timezone.utc)
+    # A cached copy can serve as the base of the update; a stale one just fails the precondition
+    cached = await profile_cache.get(db, 'resources', user_id)
+    updated_doc = await writes.update_document(db, ref, update_data, current=cached if cached.exists else None, if_match=if_match)
+    profile_cache.invalidate('resources', user_id)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="Resource profile not found for this user")
+    response.headers["ETag"] = document_etag(updated_doc)
+    return resource_schema.Resource(id=updated_doc.id, **updated_doc.to_dict())
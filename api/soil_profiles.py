@@ -1,42 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+import asyncio
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, status
+from typing import List, Optional
 from schemas import soil_profile as sp_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from core.etag import conditional_get, document_etag
+from core.pagination import PageParams, paginate
+from db import aio, rollups, snapshots, writes
+from db.firestore_client import get_db, FirestoreClient
 from google.cloud.firestore_v1.base_query import FieldFilter
 from datetime import datetime, timezone
 
 router = APIRouter(tags=["Soil Profiles"])
 
 @router.post("/api/farms/{farm_id}/soil-profiles/", response_model=sp_schema.SoilProfile, status_code=status.HTTP_201_CREATED)
-def create_soil_profile(farm_id: str, sp_in: sp_schema.SoilProfileCreate, db: Client = Depends(get_db)):
+async def create_soil_profile(farm_id: str, sp_in: sp_schema.SoilProfileCreate, background_tasks: BackgroundTasks, db: FirestoreClient = Depends(get_db)):
     if sp_in.farmId != farm_id:
         raise HTTPException(status_code=400, detail="Farm ID in path and body do not match.")
     sp_data = sp_in.model_dump()
     sp_data['lastTestedAt'] = datetime.now(timezone.utc)
-    _ , sp_ref = db.collection('soilProfiles').add(sp_data)
-    created_doc = sp_ref.get()
+    created_doc, region = await asyncio.gather(
+        writes.create_document(db, 'soilProfiles', sp_data),
+        rollups.farm_region(db, farm_id),
+    )
+    await rollups.apply(db, [(region, rollups.soil_contribution(sp_data))])
+    background_tasks.add_task(snapshots.soil_written, db, farm_id, created_doc.id, sp_data)
     return sp_schema.SoilProfile(id=created_doc.id, **created_doc.to_dict())
 
 @router.get("/api/farms/{farm_id}/soil-profiles/", response_model=List[sp_schema.SoilProfile])
-def get_soil_profiles_for_farm(farm_id: str, db: Client = Depends(get_db)):
-    sp_ref = db.collection('soilProfiles').where(filter=FieldFilter("farmId", "==", farm_id)).stream()
-    return [sp_schema.SoilProfile(id=doc.id, **doc.to_dict()) for doc in sp_ref]
+async def get_soil_profiles_for_farm(farm_id: str, response: Response, page: PageParams = Depends(), db: FirestoreClient = Depends(get_db)):
+    query = db.collection('soilProfiles').where(filter=FieldFilter("farmId", "==", farm_id))
+    return await paginate(query, page, response, sp_schema.SoilProfile)
 
 @router.get("/api/soil-profiles/{profile_id}", response_model=sp_schema.SoilProfile)
-def get_soil_profile(profile_id: str, db: Client = Depends(get_db)):
-    sp_doc = db.collection('soilProfiles').document(profile_id).get()
+async def get_soil_profile(profile_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    sp_doc = await aio.get(db.collection('soilProfiles').document(profile_id))
     if not sp_doc.exists:
         raise HTTPException(status_code=404, detail="Soil profile not found")
+    not_modified = conditional_get(request, response, document_etag(sp_doc))
+    if not_modified:
+        return not_modified
     return sp_schema.SoilProfile(id=sp_doc.id, **sp_doc.to_dict())
 
 @router.patch("/api/soil-profiles/{profile_id}", response_model=sp_schema.SoilProfile)
-def update_soil_profile(profile_id: str, sp_update: sp_schema.SoilProfileUpdate, db: Client = Depends(get_db)):
+async def update_soil_profile(profile_id: str, sp_update: sp_schema.SoilProfileUpdate, response: Response, background_tasks: BackgroundTasks, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
     sp_ref = db.collection('soilProfiles').document(profile_id)
-    if not sp_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Soil profile not found")
     update_data = sp_update.model_dump(exclude_unset=True)
     update_data['lastTestedAt'] = datetime.now(timezone.utc)
-    sp_ref.update(update_data)
-    updated_doc = sp_ref.get()
-    return sp_schema.SoilProfile(id=updated_doc.id, **updated_doc.to_dict())
\ No newline at end of file
+    previous_doc, updated_doc = await writes.update_with_previous(db, sp_ref, update_data, if_match=if_match)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="Soil profile not found")
+    change = rollups.difference(rollups.soil_contribution(updated_doc.to_dict()), rollups.soil_contribution(previous_doc.to_dict()))
+    if rollups.prune(change):
+        region = await rollups.farm_region(db, updated_doc.get('farmId'))
+        await rollups.apply(db, [(region, change)])
+    background_tasks.add_task(snapshots.soil_written, db, updated_doc.get('farmId'), profile_id, updated_doc.to_dict())
+    response.headers["ETag"] = document_etag(updated_doc)
+    return sp_schema.SoilProfile(id=updated_doc.id, **updated_doc.to_dict())
@@ -1,11 +1,16 @@
-import io
+import asyncio
+import itertools
 import os
+import threading
+from collections import deque
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from schemas import tts as tts_schema
-from google.cloud import texttospeech
-from google.oauth2 import service_account
-from fastapi.concurrency import run_in_threadpool
+from core.config import settings
+from core.sentences import chunk_text
+from core.tts_cache import TTSCache, normalize_text
+from core import metrics
+from core.metrics import run_in_threadpool
 
 # --- Router Setup ---
 router = APIRouter(prefix="/api/tts", tags=["Text-to-Speech"])
@@ -19,49 +24,165 @@ VOICE_PARAMS = {
 }
 
 # --- Google TTS Client Initialization (Updated) ---
+# The client library and its gRPC channel are only loaded on first use (the
+# startup warm-up, or else the first TTS request), which keeps them off the
+# cold start of workers that may never synthesize anything.
 tts_client = None
-try:
-    # Get the specific credentials file path from the new environment variable
-    tts_credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_tts")
-    
-    if not tts_credentials_path:
-        print("WARNING: GOOGLE_APPLICATION_CREDENTIALS_tts not set. TTS will be unavailable.")
-    else:
-        # Create a credentials object from that specific file
-        credentials = service_account.Credentials.from_service_account_file(tts_credentials_path)
-        # Initialize the client with the specific credentials
-        tts_client = texttospeech.TextToSpeechClient(credentials=credentials)
-        print("✅ TTS Client initialized with specific credentials.")
-
-except Exception as e:
-    print(f"CRITICAL: Could not initialize Google TTS Client. Error: {e}")
-    # tts_client remains None
-
-# --- API Endpoint (No changes needed here) ---
+_tts_client_loaded = False
+_tts_client_lock = threading.Lock()
+
+def get_tts_client():
+    """The TTS client, created on first call; None if it is not configured or failed to start."""
+    global tts_client, _tts_client_loaded
+    if _tts_client_loaded or tts_client is not None:
+        return tts_client
+    with _tts_client_lock:
+        if _tts_client_loaded:
+            return tts_client
+        try:
+            # Get the specific credentials file path from the new environment variable
+            tts_credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_tts")
+
+            if not tts_credentials_path:
+                print("WARNING: GOOGLE_APPLICATION_CREDENTIALS_tts not set. TTS will be unavailable.")
+            else:
+                from google.cloud import texttospeech
+                from google.oauth2 import service_account
+                # Create a credentials object from that specific file
+                credentials = service_account.Credentials.from_service_account_file(tts_credentials_path)
+                # Initialize the client with the specific credentials
+                tts_client = texttospeech.TextToSpeechClient(credentials=credentials)
+                print("✅ TTS Client initialized with specific credentials.")
+
+        except Exception as e:
+            print(f"CRITICAL: Could not initialize Google TTS Client. Error: {e}")
+            # tts_client remains None
+        _tts_client_loaded = True
+    return tts_client
+
+
+async def _loaded_tts_client():
+    if tts_client is not None or _tts_client_loaded:
+        return tts_client
+    # Loading the library and credentials blocks, so keep it off the event loop
+    return await run_in_threadpool(get_tts_client)
+
+
+def warm_up_tts():
+    """Creates the client and opens its channel with a free voice listing."""
+    client = get_tts_client()
+    if client is not None:
+        client.list_voices(language_code=VOICE_PARAMS["english"]["language_code"])
+
+
+# --- Audio Cache ---
+# Shared on disk by all workers on the host; see core/tts_cache.py
+tts_cache = TTSCache(
+    directory=settings.TTS_CACHE_DIR,
+    memory_bytes=settings.TTS_CACHE_MEMORY_BYTES,
+    disk_bytes=settings.TTS_CACHE_DISK_BYTES,
+)
+
+async def _synthesize_cached(text: str, voice_config: dict) -> bytes:
+    from google.cloud import texttospeech
+    client = tts_client
+    synthesis_input = texttospeech.SynthesisInput(text=text)
+    voice = texttospeech.VoiceSelectionParams(
+        language_code=voice_config["language_code"], name=voice_config["name"]
+    )
+    audio_encoding = texttospeech.AudioEncoding.MP3
+    audio_config = texttospeech.AudioConfig(audio_encoding=audio_encoding)
+
+    async def synthesize():
+        with metrics.timer("tts_upstream"):
+            response = await run_in_threadpool(
+                client.synthesize_speech,
+                input=synthesis_input, voice=voice, audio_config=audio_config
+            )
+        return response.audio_content
+
+    cache_key = tts_cache.key(text, voice_config["language_code"], voice_config["name"], audio_encoding.name)
+    return await tts_cache.get_or_create(cache_key, synthesize)
+
+
+async def _synthesize_ahead(chunks: list, voice_config: dict):
+    """
+    Keeps up to TTS_STREAM_WINDOW chunks synthesizing ahead of the client and
+    yields their MP3 frames strictly in order as each one completes.
+    """
+    remaining = iter(chunks)
+    pending = deque(
+        asyncio.ensure_future(_synthesize_cached(chunk, voice_config))
+        for chunk in itertools.islice(remaining, settings.TTS_STREAM_WINDOW)
+    )
+    try:
+        while pending:
+            audio = await pending.popleft()
+            next_chunk = next(remaining, None)
+            if next_chunk is not None:
+                pending.append(asyncio.ensure_future(_synthesize_cached(next_chunk, voice_config)))
+            yield audio
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _stream_after(first: bytes, audio_chunks):
+    """Yields the already synthesized first chunk, then the rest of `audio_chunks`."""
+    try:
+        yield first
+        async for audio in audio_chunks:
+            yield audio
+    except Exception as e:
+        # Headers are already sent, so the stream can only be cut short
+        print(f"An error occurred during streaming TTS synthesis: {e}")
+    finally:
+        await audio_chunks.aclose()
+
+
+# --- API Endpoints ---
 @router.post("/synthesize",
              response_class=StreamingResponse,
              summary="Convert text to speech",
              description="Takes text and a supported language, returns an MP3 audio stream.")
 async def synthesize_speech(request_body: tts_schema.TTSRequest):
-    if not tts_client:
+    if not await _loaded_tts_client():
         raise HTTPException(status_code=503, detail="Text-to-Speech service is currently unavailable.")
 
     try:
         voice_config = VOICE_PARAMS.get(request_body.language.value)
-        synthesis_input = texttospeech.SynthesisInput(text=request_body.text)
-        voice = texttospeech.VoiceSelectionParams(
-            language_code=voice_config["language_code"], name=voice_config["name"]
-        )
-        audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
-        
-        response = await run_in_threadpool(
-            tts_client.synthesize_speech,
-            input=synthesis_input, voice=voice, audio_config=audio_config
-        )
-        
-        return StreamingResponse(io.BytesIO(response.audio_content), media_type="audio/mpeg")
+        audio = await _synthesize_cached(normalize_text(request_body.text), voice_config)
+        return Response(audio, media_type="audio/mpeg")
 
     except Exception as e:
         print(f"An error occurred during TTS synthesis: {e}")
         raise HTTPException(status_code=500, detail="An internal error occurred while synthesizing speech.")
 
+
+@router.post("/synthesize/stream",
+             response_class=StreamingResponse,
+             summary="Stream long text as speech",
+             description="Splits the text at sentence boundaries, synthesizes the pieces concurrently "
+                         "and streams the MP3 audio in order as soon as each piece is ready.")
+async def synthesize_speech_stream(request_body: tts_schema.TTSRequest):
+    if not await _loaded_tts_client():
+        raise HTTPException(status_code=503, detail="Text-to-Speech service is currently unavailable.")
+
+    chunks = chunk_text(normalize_text(request_body.text), settings.TTS_CHUNK_MAX_BYTES)
+    if not chunks:
+        raise HTTPException(status_code=400, detail="Text must not be empty.")
+    voice_config = VOICE_PARAMS.get(request_body.language.value)
+    audio_chunks = _synthesize_ahead(chunks, voice_config)
+    # Wait for the first chunk before sending headers, so an upstream failure is still a 500
+    try:
+        first = await audio_chunks.__anext__()
+    except Exception as e:
+        await audio_chunks.aclose()
+        print(f"An error occurred during streaming TTS synthesis: {e}")
+        raise HTTPException(status_code=500, detail="An internal error occurred while synthesizing speech.")
+    return StreamingResponse(_stream_after(first, audio_chunks), media_type="audio/mpeg")
+
+
+@router.get("/cache/stats", summary="TTS audio cache counters")
+async def get_tts_cache_stats():
+    return tts_cache.snapshot()
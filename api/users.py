@@ -1,63 +1,81 @@
 # api/users.py
-import bcrypt
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from typing import List, Dict, Any 
-from typing import List
+import asyncio
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, status
+from typing import List, Dict, Any, Optional
 from schemas import user as user_schema
-from db.firestore_client import get_db
-from google.cloud.firestore_v1.client import Client
+from schemas import deletion_job as job_schema
+from schemas import snapshot as snapshot_schema
+from core.config import settings
+from core.etag import collection_etag, conditional_get, document_etag
+from core.pagination import PageParams, paginate
+from core.security import hash_password, needs_rehash, verify_password
+from db import aio, deletion, rollups, snapshots, writes
+from db.phone_index import index_ref
+from db.firestore_client import get_db, FirestoreClient
+from google.api_core.exceptions import Conflict
 from google.cloud.firestore_v1.base_query import FieldFilter
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
 @router.post("/register", response_model=user_schema.User, status_code=status.HTTP_201_CREATED)
-def register_user(user_in: user_schema.UserCreate, db: Client = Depends(get_db)):
+async def register_user(user_in: user_schema.UserCreate, db: FirestoreClient = Depends(get_db)):
     """
     Registers a new user by hashing their password and saving it to the database.
+    The user and their phone index entry are created atomically, so a phone
+    number can only ever be registered once.
     """
-    users_ref = db.collection('users').where(filter=FieldFilter('phone', '==', user_in.phone)).limit(1).stream()
-    if any(users_ref):
-        raise HTTPException(status_code=409, detail="User with this phone number already exists.")
-    
     # Hash the plain-text password using bcrypt
-    hashed_password = bcrypt.hashpw(user_in.password.encode('utf-8'), bcrypt.gensalt())
+    hashed_password = await hash_password(user_in.password)
     
     user_data = user_in.model_dump(exclude={"password"})
-    user_data['hashed_password'] = hashed_password.decode('utf-8') # Store the hash
+    user_data['hashed_password'] = hashed_password # Store the hash
     user_data['createdAt'] = datetime.now(timezone.utc)
     user_data['lastLogin'] = datetime.now(timezone.utc)
 
-    _ , user_ref = db.collection('users').add(user_data)
-    created_doc = user_ref.get()
-    return user_schema.User(id=created_doc.id, **created_doc.to_dict())
+    user_ref = db.collection('users').document()
+    batch = db.batch()
+    batch.create(index_ref(db, user_in.phone), {"userId": user_ref.id})
+    batch.create(user_ref, user_data)
+    try:
+        await aio.write(batch.commit)
+    except Conflict:
+        raise HTTPException(status_code=409, detail="User with this phone number already exists.")
+    return user_schema.User(id=user_ref.id, **user_data)
 
 
 @router.post("/login", response_model=user_schema.User)
-def login_user(login_data: user_schema.UserLogin, db: Client = Depends(get_db)):
+async def login_user(login_data: user_schema.UserLogin, db: FirestoreClient = Depends(get_db)):
     """
     Logs a user in by verifying their password against the stored hash.
     Returns the user's data upon success.
     """
-    users_stream = db.collection('users').where(filter=FieldFilter('phone', '==', login_data.phone)).limit(1).stream()
-    user_doc = next(users_stream, None)
+    index_doc = await aio.get(index_ref(db, login_data.phone))
+    user_doc = None
+    if index_doc.exists:
+        user_doc = await aio.get(db.collection('users').document(index_doc.get('userId')))
     
     # Check if user exists
-    if not user_doc:
+    if not user_doc or not user_doc.exists:
         raise HTTPException(status_code=404, detail="User with this phone number not found")
     
     user_data = user_doc.to_dict()
-    stored_hash = user_data.get("hashed_password", "").encode('utf-8')
+    stored_hash = user_data.get("hashed_password", "")
 
     # Securely check the provided password against the stored hash
-    if not bcrypt.checkpw(login_data.password.encode('utf-8'), stored_hash):
+    if not await verify_password(login_data.password, stored_hash):
         raise HTTPException(status_code=401, detail="Incorrect password")
 
     # If password is correct, update lastLogin timestamp and return user data
-    user_doc.reference.update({"lastLogin": datetime.now(timezone.utc)})
-    
-    # Refetch the document to include the updated lastLogin time in the response
-    updated_doc = user_doc.reference.get()
+    login_update = {"lastLogin": datetime.now(timezone.utc)}
+    if needs_rehash(stored_hash):
+        # Upgrade the stored hash to the configured cost while we have the plain password
+        login_update['hashed_password'] = await hash_password(login_data.password)
+
+    # The queried snapshot doubles as the base of the update, so no refetch is needed
+    updated_doc = await writes.update_document(db, user_doc.reference, login_update, current=user_doc)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="User with this phone number not found")
     
     return user_schema.User(id=updated_doc.id, **updated_doc.to_dict())
 
@@ -65,86 +83,171 @@ def login_user(login_data: user_schema.UserLogin, db: Client = Depends(get_db)):
 # --- Other User Management Endpoints ---
 
 @router.get("/", response_model=List[user_schema.User])
-def get_all_users(db: Client = Depends(get_db)):
-    users_ref = db.collection('users').stream()
-    return [user_schema.User(id=doc.id, **doc.to_dict()) for doc in users_ref]
+async def get_all_users(response: Response, page: PageParams = Depends(), db: FirestoreClient = Depends(get_db)):
+    return await paginate(db.collection('users'), page, response, user_schema.User)
 
 
 @router.get("/{user_id}", response_model=user_schema.User)
-def get_user(user_id: str, db: Client = Depends(get_db)):
-    user_doc = db.collection('users').document(user_id).get()
+async def get_user(user_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    user_doc = await aio.get(db.collection('users').document(user_id))
     if not user_doc.exists:
         raise HTTPException(status_code=404, detail="User not found")
+    not_modified = conditional_get(request, response, document_etag(user_doc))
+    if not_modified:
+        return not_modified
     return user_schema.User(id=user_doc.id, **user_doc.to_dict())
 
 
 @router.patch("/{user_id}", response_model=user_schema.User)
-def update_user(user_id: str, user_update: user_schema.UserUpdate, db: Client = Depends(get_db)):
+async def update_user(user_id: str, user_update: user_schema.UserUpdate, response: Response, background_tasks: BackgroundTasks, if_match: Optional[str] = Header(None), db: FirestoreClient = Depends(get_db)):
     user_ref = db.collection('users').document(user_id)
-    if not user_ref.get().exists:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     update_data = user_update.model_dump(exclude_unset=True)
-    user_ref.update(update_data)
-    updated_doc = user_ref.get()
+    updated_doc = await writes.update_document(db, user_ref, update_data, if_match=if_match)
+    if updated_doc is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    background_tasks.add_task(snapshots.user_written, db, user_id, updated_doc.to_dict())
+    response.headers["ETag"] = document_etag(updated_doc)
     return user_schema.User(id=updated_doc.id, **updated_doc.to_dict())
 
 
-@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: str, db: Client = Depends(get_db)):
+@router.delete("/{user_id}", response_model=job_schema.DeletionJob, status_code=status.HTTP_202_ACCEPTED)
+async def delete_user(user_id: str, response: Response, db: FirestoreClient = Depends(get_db)):
+    """
+    Deletes the user and releases their phone number right away, then removes
+    their farms and everything under them in a background job.
+    """
     user_ref = db.collection('users').document(user_id)
-    if not user_ref.get().exists:
+    farms_query = db.collection('farms').where(filter=FieldFilter("userId", "==", user_id)).select(rollups.FIELDS["farms"])
+    for _ in range(writes.UPDATE_ATTEMPTS):
+        user_doc, farm_docs = await asyncio.gather(aio.get(user_ref), aio.stream(farms_query))
+        if not user_doc.exists:
+            raise HTTPException(status_code=404, detail="User not found")
+        # Releasing the phone number in the same batch lets it be registered again
+        batch, job_ref, job = deletion.user_deletion(db, user_doc, farm_docs)
+        try:
+            await aio.write(batch.commit)
+            break
+        except deletion.CONFLICTS:
+            continue  # deleted by a concurrent DELETE, or changed since it was read
+    else:
+        raise HTTPException(status_code=409, detail="User is being modified concurrently, please retry.")
+    deletion.submit(job_ref.id)
+    response.headers["Location"] = f"/api/deletion-jobs/{job_ref.id}"
+    return job_schema.DeletionJob.from_job(job_ref.id, job)
+
+@router.get("/{user_id}/home", response_model=snapshot_schema.UserSnapshot)
+async def get_user_home(user_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
+    """
+    What the home screen shows: the user's farms with their current crop,
+    latest soil test and newest logs and chats, plus the unread alert count.
+    With USER_SNAPSHOTS_ENABLED this is one read of the user's snapshot
+    document, kept up to date by the write handlers; otherwise it is
+    computed from the source collections on every call.
+    """
+    if not settings.USER_SNAPSHOTS_ENABLED:
+        snapshot = await snapshots.build(db, user_id)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return snapshot_schema.UserSnapshot.from_snapshot(snapshot)
+    snapshot_doc = await snapshots.load(db, user_id)
+    if snapshot_doc is None:
         raise HTTPException(status_code=404, detail="User not found")
-    user_ref.delete()
-    return
+    not_modified = conditional_get(request, response, document_etag(snapshot_doc))
+    if not_modified:
+        return not_modified
+    return snapshot_schema.UserSnapshot.from_snapshot(snapshot_doc.to_dict())
 
 @router.get("/{user_id}/profile/deep", response_model=Dict[str, Any])
-def get_full_user_profile(user_id: str, db: Client = Depends(get_db)):
+async def get_full_user_profile(user_id: str, request: Request, response: Response, db: FirestoreClient = Depends(get_db)):
     """
     Performs a "deep fetch" to retrieve all data related to a single user,
     including their profile, farms, and all farm-related sub-collections.
+
+    The fetch runs as a two-level plan so latency follows the depth of the tree
+    rather than its size: first the user, their resource/challenge profiles and
+    the user-centric collections are read concurrently, then every farm's crop
+    profile is read in one multi-get while the per-farm collections are queried
+    in parallel. At most DEEP_FETCH_CONCURRENCY calls are in flight at a time.
+    The ETag covers every document in the tree, so an unchanged profile is a 304.
+
+    Resource and challenge profiles belong to the user, so they are read once
+    and returned under every farm, as resource_profile and challenge_profile.
+    The password hash is never part of the profile.
     """
-    full_profile = {}
+    limiter = asyncio.Semaphore(settings.DEEP_FETCH_CONCURRENCY)
 
-    # 1. Fetch the main user profile
-    user_doc = db.collection('users').document(user_id).get()
-    if not user_doc.exists:
+    async def fetch(call):
+        async with limiter:
+            return await call
+
+    async def get_docs(refs):
+        return {doc.reference.path: doc for doc in await aio.get_all(db, refs)}
+
+    def query(collection, field, value):
+        return aio.stream(db.collection(collection).where(filter=FieldFilter(field, "==", value)))
+
+    def as_dicts(docs):
+        return [{"id": doc.id, **doc.to_dict()} for doc in docs]
+
+    # 1. The user document and everything keyed directly by user_id.
+    # Resources and challenges are one-to-one with the user, not the farm.
+    user_ref = db.collection('users').document(user_id)
+    resource_ref = db.collection('resources').document(user_id)
+    challenge_ref = db.collection('challenges').document(user_id)
+    user_docs, finance_docs, alert_docs, farm_docs = await asyncio.gather(
+        fetch(get_docs([user_ref, resource_ref, challenge_ref])),
+        fetch(query('finance', 'userId', user_id)),
+        fetch(query('alerts', 'userId', user_id)),
+        fetch(query('farms', 'userId', user_id)),
+    )
+
+    user_doc = user_docs.get(user_ref.path)
+    if user_doc is None or not user_doc.exists:
         raise HTTPException(status_code=404, detail="User not found")
-    full_profile['profile'] = {"id": user_doc.id, **user_doc.to_dict()}
 
-    # 2. Fetch all user-centric collections
-    finance_docs = db.collection('finance').where(filter=FieldFilter("userId", "==", user_id)).stream()
-    full_profile['finance_records'] = [{"id": doc.id, **doc.to_dict()} for doc in finance_docs]
-    
-    alert_docs = db.collection('alerts').where(filter=FieldFilter("userId", "==", user_id)).stream()
-    full_profile['alerts'] = [{"id": doc.id, **doc.to_dict()} for doc in alert_docs]
+    profile = {"id": user_doc.id, **user_doc.to_dict()}
+    profile.pop('hashed_password', None)
+    resource_doc = user_docs.get(resource_ref.path)
+    challenge_doc = user_docs.get(challenge_ref.path)
+    full_profile = {
+        'profile': profile,
+        'finance_records': as_dicts(finance_docs),
+        'alerts': as_dicts(alert_docs),
+    }
+
+    # 2. For every farm: the crop profiles in a single multi-get, plus the
+    # one-to-many collections, all fanned out together.
+    farm_ids = [farm_doc.id for farm_doc in farm_docs]
+    crop_refs = [db.collection('crops').document(farm_id) for farm_id in farm_ids]
+    per_farm = [
+        fetch(query(collection, 'farmId', farm_id))
+        for farm_id in farm_ids
+        for collection in ('soilProfiles', 'logs', 'chats')
+    ]
+    crop_docs, *farm_children = await asyncio.gather(
+        fetch(get_docs(crop_refs)) if crop_refs else asyncio.sleep(0, result={}),
+        *per_farm,
+    )
+
+    all_docs = [*user_docs.values(), *finance_docs, *alert_docs, *farm_docs, *crop_docs.values()]
+    all_docs += [doc for docs in farm_children for doc in docs]
+    not_modified = conditional_get(request, response, collection_etag(all_docs))
+    if not_modified:
+        return not_modified
 
-    # 3. Fetch all farms for the user
-    farm_docs = db.collection('farms').where(filter=FieldFilter("userId", "==", user_id)).stream()
     farms_list = []
-    
-    for farm_doc in farm_docs:
+    for index, (farm_doc, crop_ref) in enumerate(zip(farm_docs, crop_refs)):
+        soil_docs, log_docs, chat_docs = farm_children[index * 3:index * 3 + 3]
+        crop_doc = crop_docs.get(crop_ref.path)
         farm_data = {"id": farm_doc.id, **farm_doc.to_dict()}
-        farm_id = farm_doc.id
-        
-        # 4. For each farm, fetch all its related data
-        # One-to-one profiles
-        farm_data['crop_profile'] = db.collection('crops').document(farm_id).get().to_dict()
-        farm_data['resource_profile'] = db.collection('resources').document(farm_id).get().to_dict()
-        farm_data['challenge_profile'] = db.collection('challenges').document(farm_id).get().to_dict()
-
-        # One-to-many profiles
-        soil_docs = db.collection('soilProfiles').where(filter=FieldFilter("farmId", "==", farm_id)).stream()
-        farm_data['soil_profiles'] = [{"id": doc.id, **doc.to_dict()} for doc in soil_docs]
-
-        log_docs = db.collection('logs').where(filter=FieldFilter("farmId", "==", farm_id)).stream()
-        farm_data['activity_logs'] = [{"id": doc.id, **doc.to_dict()} for doc in log_docs]
-        
-        chat_docs = db.collection('chats').where(filter=FieldFilter("farmId", "==", farm_id)).stream()
-        farm_data['chat_history'] = [{"id": doc.id, **doc.to_dict()} for doc in chat_docs]
-
+        farm_data['crop_profile'] = crop_doc.to_dict() if crop_doc else None
+        farm_data['resource_profile'] = resource_doc.to_dict() if resource_doc else None
+        farm_data['challenge_profile'] = challenge_doc.to_dict() if challenge_doc else None
+        farm_data['soil_profiles'] = as_dicts(soil_docs)
+        farm_data['activity_logs'] = as_dicts(log_docs)
+        farm_data['chat_history'] = as_dicts(chat_docs)
         farms_list.append(farm_data)
 
     full_profile['farms'] = farms_list
-    
-    return full_profile
\ No newline at end of file
+
+    return full_profile
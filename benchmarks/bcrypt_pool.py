@@ -0,0 +1,60 @@
+"""
+Measures password verification throughput through the process pool in core.security.
+
+    python -m benchmarks.bcrypt_pool --rounds 12 --seconds 5
+
+For each pool size it keeps the pool saturated for a fixed time and reports
+logins/sec overall and per core, which is the number to size login capacity with.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from core import security
+from core.config import settings
+
+
+async def _measure(workers: int, seconds: float, hashed: str) -> dict:
+    settings.PASSWORD_HASH_WORKERS = workers
+    security.shutdown_password_pool()
+    await security.verify_password("warm-up", hashed)  # spawn the worker processes
+
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def login_loop():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            await security.verify_password("correct horse", hashed)
+            done += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login_loop() for _ in range(workers * 2)))
+    elapsed = time.perf_counter() - started
+    security.shutdown_password_pool()
+    return {
+        "workers": workers,
+        "logins": done,
+        "logins_per_sec": round(done / elapsed, 2),
+        "logins_per_sec_per_core": round(done / elapsed / workers, 2),
+    }
+
+
+async def main(rounds: int, seconds: float, max_workers: int) -> list:
+    settings.BCRYPT_ROUNDS = rounds
+    settings.PASSWORD_QUEUE_LIMIT = max_workers * 2
+    settings.PASSWORD_HASH_WORKERS = 1
+    hashed = await security.hash_password("correct horse")
+    sizes = sorted({1, max(1, max_workers // 2), max_workers})
+    return [await _measure(workers, seconds, hashed) for workers in sizes]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=settings.BCRYPT_ROUNDS, help="bcrypt cost factor")
+    parser.add_argument("--seconds", type=float, default=5.0, help="measurement time per pool size")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    results = asyncio.run(main(args.rounds, args.seconds, args.max_workers))
+    print(json.dumps({"rounds": args.rounds, "results": results}, indent=2))
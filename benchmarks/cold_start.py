@@ -0,0 +1,69 @@
+"""
+Cold start benchmark: time from process start to the first answered request.
+
+    python -m benchmarks.cold_start --runs 5
+
+Each run starts a fresh interpreter. It imports the app, runs its lifespan and
+sends one list request, against a throwaway SQLite database. It reports the
+medians of:
+- the startup phases from core/startup.py (imports, app, ready);
+- the first request's own latency;
+- first_response, the time from process start until that request is
+  answered.
+
+Runs are repeated with STARTUP_WARMUP on and off. Against Firestore, set
+STORAGE_BACKEND and credentials in the environment and pass --firestore so the
+backend is left alone.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import asyncio, json, time
+from core import startup
+import main
+import httpx
+
+async def first_request():
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://cold") as client:
+            started = time.perf_counter()
+            response = await client.get("/api/users/?limit=1")
+            finished = time.perf_counter()
+        assert response.status_code == 200, response.text
+        return finished - started, finished - startup.PROCESS_START
+
+request, first_response = asyncio.run(first_request())
+phases = {name: seconds for name, seconds in startup.phases().items() if not name.startswith("warmup.")}
+print(json.dumps({**phases, "first_request": request, "first_response": first_response}))
+"""
+
+
+def run_once(warmup: bool, firestore: bool) -> dict:
+    env = dict(os.environ, STARTUP_WARMUP=str(warmup).lower())
+    if not firestore:
+        env.update(STORAGE_BACKEND="sqlite", SQLITE_PATH=os.path.join(tempfile.mkdtemp(), "cold.db"))
+    output = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs: list) -> dict:
+    return {key: round(statistics.median(run[key] for run in runs) * 1000, 1) for key in runs[0]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="interpreters started per setting")
+    parser.add_argument("--firestore", action="store_true", help="use the storage backend configured in the environment")
+    args = parser.parse_args()
+    report = {
+        f"warmup_{'on' if warmup else 'off'}_ms": summarize([run_once(warmup, args.firestore) for _ in range(args.runs)])
+        for warmup in (True, False)
+    }
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,80 @@
+"""
+Bytes on the wire and CPU cost per response encoding.
+
+    python -m benchmarks.encodings --rows 200 --repeat 20
+
+Bodies are encoded the way the app sends them. Log and Chat pages go through
+their response models. The deep profile goes through a Dict[str, Any] model.
+Each body is then run through the same steps as core/encoding.py, for each of
+identity, gzip, br, msgpack, msgpack+gzip and msgpack+br. The report gives:
+- bytes, the encoded size;
+- ratio, that size against plain JSON;
+- cpu_ms, the best of --repeat runs of process time spent encoding.
+
+Decoding is left out: it happens on the client.
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+from pydantic import TypeAdapter
+from benchmarks.serialization import documents
+from core import encoding
+from core.serialization import document_dict
+
+
+def bodies(rows: int) -> Dict[str, bytes]:
+    all_docs = documents(rows)
+    payloads = {}
+    for name in ("Log", "Chat"):
+        model, docs = all_docs[name]
+        adapter = TypeAdapter(List[model])
+        payloads[f"{name} page"] = adapter.dump_json(adapter.validate_python([document_dict(d) for d in docs]))
+    profile = {
+        "profile": {"id": "user1", "fullName": "A. Farmer"},
+        "farms": [{**document_dict(farm), "activity_logs": [document_dict(log) for log in all_docs["Log"][1][:rows // 10]]}
+                  for farm in all_docs["Farm"][1][:10]],
+    }
+    payloads["deep profile"] = TypeAdapter(Dict[str, Any]).dump_json(profile)
+    return payloads
+
+
+def encoders() -> Dict[str, Any]:
+    available = {"identity": lambda body: body}
+    for coding in encoding.available_codings():
+        available[coding] = lambda body, coding=coding: encoding.compress(body, coding)
+    if encoding.msgpack is not None:
+        available["msgpack"] = encoding.json_to_msgpack
+        for coding in encoding.available_codings():
+            available[f"msgpack+{coding}"] = lambda body, coding=coding: encoding.compress(encoding.json_to_msgpack(body), coding)
+    return available
+
+
+def _best_cpu(fn, repeat: int) -> float:
+    fn()  # warm up
+    times = []
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        times.append(time.process_time() - started)
+    return min(times) * 1000
+
+
+def run(rows: int, repeat: int) -> list:
+    report = []
+    for name, body in bodies(rows).items():
+        for label, encoder in encoders().items():
+            size = len(encoder(body))
+            report.append({
+                "body": name, "encoding": label, "bytes": size, "ratio": round(size / len(body), 3),
+                "cpu_ms": round(_best_cpu(lambda: encoder(body), repeat), 3),
+            })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200, help="documents per list")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per case; the best is reported")
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.repeat), indent=2))
@@ -0,0 +1,259 @@
+"""
+Load and latency benchmark for the API endpoints.
+
+    python -m benchmarks.endpoints --users 20 --farms 3 --logs 200 --requests 200 --output bench.json
+
+Drives the FastAPI app in-process against a throwaway SQLite database (see
+db/sqlite_client.py) seeded with users, farms and their sub-collections, and a
+stand-in TTS client with a fixed upstream latency. Routes are measured one at
+a time with a fixed number of concurrent callers, and each reports throughput,
+p50/p95/p99 latency and the backend calls (document reads, query pages and
+commits) made per request.
+
+With --baseline, p95 latencies are compared against an earlier --output file
+and the command exits non-zero when any route regressed by more than
+--max-regression, so CI can gate on it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import httpx
+from core import security
+from core.config import settings
+from core.tts_cache import TTSCache
+from db import firestore_client
+from db.phone_index import index_ref
+from db.sqlite_client import SQLiteClient
+
+PASSWORD = "correct horse"
+ACTIVITIES = ["sowing", "irrigation", "fertilizer", "pesticide", "weeding", "harvest"]
+DISTRICTS = ["Palakkad", "Thrissur", "Wayanad", "Nashik", "Pune", "Varanasi"]
+
+
+class CountingClient(SQLiteClient):
+    """SQLite backend that counts the calls a Firestore deployment would make."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.calls = Counter()
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        self.calls["reads"] += 1
+        return super().get_all(references, field_paths, transaction)
+
+    def _query(self, *args, **kwargs):
+        self.calls["queries"] += 1
+        return super()._query(*args, **kwargs)
+
+    def _aggregate(self, *args, **kwargs):
+        self.calls["queries"] += 1
+        return super()._aggregate(*args, **kwargs)
+
+    def _commit(self, operations):
+        self.calls["commits"] += 1
+        return super()._commit(operations)
+
+
+class FakeTTS:
+    """Stands in for texttospeech.TextToSpeechClient with a fixed upstream latency."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def synthesize_speech(self, input, voice, audio_config):
+        time.sleep(self.latency)
+        return type("Response", (), {"audio_content": os.urandom(4096)})()
+
+
+def seed(db: SQLiteClient, users: int, farms: int, logs: int, hashed: str) -> list:
+    """Creates the data set and returns [(user_id, phone, [farm_ids])]."""
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    writer = db.bulk_writer()
+    seeded = []
+    for u in range(users):
+        phone = f"+9190000{u:05d}"
+        user_ref = db.collection("users").document()
+        writer.create(user_ref, {
+            "fullName": f"Farmer {u}", "phone": phone, "preferredLanguage": "Malayalam",
+            "hashed_password": hashed, "createdAt": now, "lastLogin": now,
+        })
+        writer.create(index_ref(db, phone), {"userId": user_ref.id})
+        writer.set(db.collection("resources").document(user_ref.id), {"userId": user_ref.id, "machinery": ["tractor"]})
+        writer.set(db.collection("challenges").document(user_ref.id), {"userId": user_ref.id, "pastPests": ["aphids"]})
+        writer.create(db.collection("finance").document(), {"userId": user_ref.id, "loanStatus": "none"})
+        for a in range(5):
+            writer.create(db.collection("alerts").document(), {
+                "userId": user_ref.id, "alertType": "weather", "message": f"Alert {a}",
+                "status": "unread", "priority": rng.randint(1, 3), "createdAt": now - timedelta(hours=a),
+            })
+        farm_ids = []
+        for f in range(farms):
+            farm_ref = db.collection("farms").document()
+            farm_ids.append(farm_ref.id)
+            writer.create(farm_ref, {
+                "userId": user_ref.id, "village": f"Village {f}", "district": rng.choice(DISTRICTS),
+                "totalFarmArea": round(rng.uniform(0.5, 10), 2), "yieldScore": rng.random(), "lastUpdated": now,
+            })
+            writer.set(db.collection("crops").document(farm_ref.id), {
+                "farmId": farm_ref.id, "currentCrop": "rice", "season": "kharif", "createdAt": now,
+            })
+            writer.create(db.collection("soilProfiles").document(), {
+                "farmId": farm_ref.id, "soilPH": round(rng.uniform(5, 8), 1), "lastTestedAt": now,
+            })
+            for i in range(logs):
+                writer.create(db.collection("logs").document(), {
+                    "farmId": farm_ref.id, "activityType": rng.choice(ACTIVITIES),
+                    "description": f"Log entry {i}", "timestamp": now - timedelta(minutes=i),
+                })
+            for i in range(20):
+                writer.create(db.collection("chats").document(), {
+                    "farmId": farm_ref.id, "messageType": "user" if i % 2 else "bot",
+                    "messageText": f"Message {i}", "timestamp": now - timedelta(minutes=i),
+                })
+        seeded.append((user_ref.id, phone, farm_ids))
+    writer.close()
+    return seeded
+
+
+def routes(seeded: list) -> list:
+    """(name, method, url(i), json(i)) for every measured route."""
+    def user(i):
+        return seeded[i % len(seeded)]
+
+    def farm(i):
+        user_id, _, farm_ids = user(i)
+        return farm_ids[i % len(farm_ids)]
+
+    return [
+        ("login", "POST", lambda i: "/api/users/login", lambda i: {"phone": user(i)[1], "password": PASSWORD}),
+        ("profile_deep", "GET", lambda i: f"/api/users/{user(i)[0]}/profile/deep", None),
+        ("get_farm", "GET", lambda i: f"/api/farms/{farm(i)}", None),
+        ("list_farms", "GET", lambda i: f"/api/users/{user(i)[0]}/farms/", None),
+        ("list_alerts", "GET", lambda i: f"/api/users/{user(i)[0]}/alerts/", None),
+        ("alert_summary", "GET", lambda i: f"/api/users/{user(i)[0]}/alerts/summary", None),
+        ("list_logs", "GET", lambda i: f"/api/farms/{farm(i)}/logs/", None),
+        ("list_logs_projected", "GET", lambda i: f"/api/farms/{farm(i)}/logs/?fields=activityType", None),
+        ("list_chats", "GET", lambda i: f"/api/farms/{farm(i)}/chats/", None),
+        ("get_crop", "GET", lambda i: f"/api/farms/{farm(i)}/crops/", None),
+        ("tts_cached", "POST", lambda i: "/api/tts/synthesize",
+         lambda i: {"text": "Irrigate the paddy field tomorrow morning.", "language": "english"}),
+        ("tts_uncached", "POST", lambda i: "/api/tts/synthesize",
+         lambda i: {"text": f"Apply fertilizer to plot {i} before the rain.", "language": "english"}),
+    ]
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def measure(client: httpx.AsyncClient, db: CountingClient, route: tuple, requests: int, concurrency: int) -> dict:
+    name, method, url, body = route
+    # One untimed pass per route warms caches the way steady traffic would
+    await client.request(method, url(0), json=body(0) if body else None)
+
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+    db.calls.clear()
+
+    async def caller():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            response = await client.request(method, url(i), json=body(i) if body else None)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    calls = {kind: round(db.calls[kind] / requests, 2) for kind in ("reads", "queries", "commits")}
+    calls["total"] = round(sum(db.calls.values()) / requests, 2)
+    return {
+        "route": name,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "backend_calls_per_request": calls,
+    }
+
+
+async def main(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="farmvichar-bench-")
+    settings.STORAGE_BACKEND = "sqlite"
+    settings.BCRYPT_ROUNDS = args.rounds
+
+    import main as app_module
+    from api import tts
+
+    db = CountingClient(os.path.join(workdir, "bench.db"))
+    firestore_client.db = db
+    tts.tts_client = FakeTTS(args.tts_latency)
+    tts.tts_cache = TTSCache(os.path.join(workdir, "tts"), settings.TTS_CACHE_MEMORY_BYTES, settings.TTS_CACHE_DISK_BYTES)
+
+    hashed = await security.hash_password(PASSWORD)
+    seeded = seed(db, args.users, args.farms, args.logs, hashed)
+
+    results = []
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for route in routes(seeded):
+            if args.only and route[0] not in args.only:
+                continue
+            results.append(await measure(client, db, route, args.requests, args.concurrency))
+    security.shutdown_password_pool()
+    db.close()
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "results": results,
+    }
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    before = {r["route"]: r for r in baseline["results"]}
+    failed = []
+    for result in report["results"]:
+        old = before.get(result["route"])
+        if old and result["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            failed.append(f"{result['route']}: p95 {old['p95_ms']}ms -> {result['p95_ms']}ms")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--farms", type=int, default=3, help="farms per user")
+    parser.add_argument("--logs", type=int, default=200, help="activity logs per farm")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=settings.BCRYPT_ROUNDS, help="bcrypt cost factor for seeded users")
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="simulated TTS upstream seconds")
+    parser.add_argument("--only", nargs="*", help="route names to run")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier report to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative p95 increase")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed = regressions(report, json.load(f), args.max_regression)
+        for line in failed:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,123 @@
+"""
+Microbenchmark for response serialization, old path against new.
+
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+
+- Log, Chat and Farm lists: a model built per document and then validated and
+  encoded against the response model the way FastAPI does it
+  (TypeAdapter.validate_python plus dump_json), against plain document dicts
+  through the same response model, as paginate returns them now.
+- A projected page: jsonable_encoder plus json.dumps, against orjson.
+- A deep-profile shaped dict: a Dict[str, Any] response model, against
+  orjson. The deep profile stays on its response model: Firestore timestamps
+  fall back to Python in orjson, which cancels out its lead.
+
+Documents carry Firestore's DatetimeWithNanoseconds timestamps and a stored
+field the models do not declare, like the real ones. Each case reports the
+best of --repeat runs.
+"""
+import argparse
+import json
+import time
+from datetime import timedelta, timezone
+from typing import Any, Dict, List
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from pydantic import TypeAdapter
+from fastapi.encoders import jsonable_encoder
+from core.serialization import document_dict, dumps
+from schemas import chat as chat_schema
+from schemas import farm as farm_schema
+from schemas import log as log_schema
+
+START = DatetimeWithNanoseconds(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class _Doc:
+    """The two members of a Firestore snapshot the serializers use."""
+
+    def __init__(self, doc_id: str, data: dict):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self) -> dict:
+        return dict(self._data)
+
+
+def _time(i: int):
+    return START + timedelta(seconds=i)
+
+
+def documents(rows: int) -> Dict[str, tuple]:
+    logs = [_Doc(f"log{i}", {
+        "farmId": "farm1", "activityType": "irrigation", "description": "Irrigated the east plot for two hours",
+        "geoLocation": {"lat": 10.77 + i * 1e-5, "lng": 76.65}, "geohash": "t9y5k8h3q", "timestamp": _time(i),
+    }) for i in range(rows)]
+    chats = [_Doc(f"chat{i}", {
+        "farmId": "farm1", "messageType": "user" if i % 2 else "bot",
+        "messageText": "When should I apply the second dose of urea?", "timestamp": _time(i),
+    }) for i in range(rows)]
+    farms = [_Doc(f"farm{i}", {
+        "userId": "user1", "village": "Alathur", "taluka": "Alathur", "district": "Palakkad", "state": "Kerala",
+        "totalFarmArea": 2.5, "irrigationMethod": "Drip", "soilType": "Laterite", "qualityScore": 71.2,
+        "lastUpdated": _time(i), "scoredAt": _time(i),
+    }) for i in range(rows)]
+    return {
+        "Log": (log_schema.Log, logs),
+        "Chat": (chat_schema.Chat, chats),
+        "Farm": (farm_schema.Farm, farms),
+    }
+
+
+def _best(fn, repeat: int) -> float:
+    fn()  # warm up
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000
+
+
+def _case(name: str, old_ms: float, new_ms: float) -> dict:
+    return {"case": name, "old_ms": round(old_ms, 2), "new_ms": round(new_ms, 2), "speedup": round(old_ms / new_ms, 2)}
+
+
+def run(rows: int, repeat: int) -> list:
+    all_docs = documents(rows)
+    report = []
+    for name, (model, docs) in all_docs.items():
+        adapter = TypeAdapter(List[model])
+        report.append(_case(
+            f"{name} list",
+            _best(lambda: adapter.dump_json(adapter.validate_python([model(id=d.id, **d.to_dict()) for d in docs])), repeat),
+            _best(lambda: adapter.dump_json(adapter.validate_python([document_dict(d) for d in docs])), repeat),
+        ))
+
+    projected = [{"id": d.id, "activityType": d.to_dict()["activityType"], "timestamp": d.to_dict()["timestamp"]}
+                 for d in all_docs["Log"][1]]
+    report.append(_case(
+        "projected Log page",
+        _best(lambda: json.dumps(jsonable_encoder(projected)).encode(), repeat),
+        _best(lambda: dumps(projected), repeat),
+    ))
+
+    profile = {
+        "profile": {"id": "user1", "fullName": "A. Farmer", "createdAt": START},
+        "farms": [{**document_dict(farm), "activity_logs": [document_dict(log) for log in all_docs["Log"][1][:rows // 10]]}
+                  for farm in all_docs["Farm"][1][:10]],
+    }
+    adapter = TypeAdapter(Dict[str, Any])
+    report.append(_case(
+        "deep profile",
+        _best(lambda: adapter.dump_json(adapter.validate_python(profile)), repeat),
+        _best(lambda: dumps(profile), repeat),
+    ))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="documents per list")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per case; the best is reported")
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.repeat), indent=2))
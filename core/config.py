@@ -1,10 +1,116 @@
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     APP_NAME: str = "Krishi Sakhi POC"
 
+    # "async" uses the Firestore AsyncClient, "sync" the blocking Client on the threadpool
+    FIRESTORE_CLIENT: str = "async"
+
+    # Max Firestore calls a single deep profile fetch keeps in flight at once
+    DEEP_FETCH_CONCURRENCY: int = 8
+
+    # List endpoints return at most PAGE_SIZE_MAX documents per page
+    PAGE_SIZE_DEFAULT: int = 100
+    PAGE_SIZE_MAX: int = 500
+
+    # Synthesized audio cache: per-worker memory tier and on-disk tier shared by all workers
+    TTS_CACHE_DIR: str = ".cache/tts"
+    TTS_CACHE_MEMORY_BYTES: int = 32 * 1024 * 1024
+    TTS_CACHE_DISK_BYTES: int = 512 * 1024 * 1024
+
+    # Streaming TTS: max UTF-8 bytes per synthesized chunk (upstream limit is 5000) and chunks in flight
+    TTS_CHUNK_MAX_BYTES: int = 1500
+    TTS_STREAM_WINDOW: int = 4
+
+    # bcrypt work factor; logins transparently rehash passwords stored with a different cost
+    BCRYPT_ROUNDS: int = 12
+    # Processes hashing passwords (0 = one per CPU) and calls allowed to wait before shedding with 503
+    PASSWORD_HASH_WORKERS: int = 0
+    PASSWORD_QUEUE_LIMIT: int = 64
+
+    # Profile read-through cache: "ttl", "listener" (TTL plus snapshot listeners) or "off"
+    PROFILE_CACHE_MODE: str = "ttl"
+    PROFILE_CACHE_MAX_ENTRIES: int = 10000
+    PROFILE_CACHE_TTLS: Dict[str, float] = {"crops": 300, "resources": 600, "challenges": 600}
+    # Seconds a missing profile stays cached, kept short since other workers may create it
+    PROFILE_CACHE_MISS_TTL: float = 5.0
+
+    # Most items accepted by one bulk ingestion request
+    BATCH_MAX_ITEMS: int = 5000
+
+    # Storage backend: "firestore", or "sqlite" for an embedded database file
+    STORAGE_BACKEND: str = "firestore"
+
+    # Database file for the sqlite backend (":memory:" is not shared across threads)
+    SQLITE_PATH: str = "farmvichar.db"
+
+    # Per-route latency and backend call histograms, exposed on /metrics
+    METRICS_ENABLED: bool = True
+
+    # Also send each request's timing breakdown to the client in a Server-Timing header
+    SERVER_TIMING: bool = False
+
+    # Threads running cascading farm/user deletion jobs
+    DELETION_WORKERS: int = 2
+
+    # Child documents deleted per page (and per checkpoint) by a deletion job
+    DELETION_PAGE_SIZE: int = 500
+
+    # Upper bound on deletes per second for each deletion job
+    DELETION_OPS_PER_SECOND: int = 500
+
+    # How long a claimed job stays reserved for its worker without a checkpoint
+    DELETION_LEASE_SECONDS: int = 120
+
+    # Events buffered per live chat subscriber before it is cut off to resync
+    CHAT_STREAM_QUEUE: int = 256
+
+    # Seconds between keep-alive comments on an idle chat stream
+    CHAT_STREAM_HEARTBEAT: float = 15.0
+
+    # Seconds a dashboard aggregate (alert counts, log stats, farm scores) is served from memory
+    AGGREGATE_CACHE_TTL: float = 30.0
+    AGGREGATE_CACHE_MAX_ENTRIES: int = 10000
+
+    # Activity types counted by the log summary when the request names none
+    LOG_ACTIVITY_TYPES: List[str] = ["sowing", "irrigation", "fertilizer", "pesticide", "weeding", "harvest"]
+    # Most distinct activity types one log summary request may name; each costs a count query
+    LOG_SUMMARY_MAX_TYPES: int = 20
+
+    # Largest radius (or bounding box half-diagonal) a nearby-logs query may ask for, in km
+    GEO_MAX_RADIUS_KM: float = 100.0
+    # Geohash prefixes, and so concurrent range queries, used to cover the query area
+    GEO_COVER_CELLS: int = 16
+    # Logs a nearby query reads per geohash cell at most; hitting it marks the result truncated
+    GEO_MAX_SCAN: int = 5000
+
+    # Open the Firestore and TTS connections in the background right after startup,
+    # so the first requests do not pay for them
+    STARTUP_WARMUP: bool = True
+
+    # Responses smaller than this are sent uncompressed
+    COMPRESSION_MIN_BYTES: int = 1024
+    # Bodies at least this large are compressed in the threadpool, off the event loop
+    COMPRESSION_OFFLOAD_BYTES: int = 64 * 1024
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5
+    # Answer "Accept: application/msgpack" with MessagePack instead of JSON
+    MSGPACK_ENABLED: bool = True
+
+    # Keep the regionRollups documents up to date from the write handlers (see db/rollups.py)
+    REGION_ROLLUPS_ENABLED: bool = True
+
+    # Keep a userSnapshots document per user up to date from the write handlers (see db/snapshots.py)
+    USER_SNAPSHOTS_ENABLED: bool = False
+    # Newest activity logs and chat messages a user snapshot keeps per farm
+    SNAPSHOT_RECENT_ITEMS: int = 5
+
+    # Seconds an incremental scoring run reaches back before the previous run's start (see db/scoring.py)
+    SCORING_WATERMARK_OVERLAP: float = 300.0
+
     class Config:
         env_file = ".env"
         extra = 'ignore'
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
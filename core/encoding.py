@@ -0,0 +1,170 @@
+"""
+Negotiated response encodings: MessagePack bodies and gzip/brotli compression.
+
+Deep profiles and long list pages are large, repetitive JSON, and many
+clients are on 2G/3G links. EncodingMiddleware rewrites finished responses
+for every router:
+- A client whose Accept names application/msgpack (or application/x-msgpack)
+  gets JSON bodies re-encoded as MessagePack.
+- Bodies of at least COMPRESSION_MIN_BYTES are compressed with the best
+  coding the client's Accept-Encoding allows: brotli, then gzip. Smaller
+  ones are not worth the CPU.
+- Compressing more than COMPRESSION_OFFLOAD_BYTES runs in the threadpool,
+  so a large profile does not stall other requests on the event loop.
+
+Streamed responses (exports, TTS audio, server-sent events), bodies that
+already carry a Content-Encoding and non-text media types pass through
+untouched. A rewritten body keeps its ETag as a weak validator, which
+etag_matches already accepts.
+
+brotli and msgpack are optional: without them only gzip and JSON are offered.
+"""
+import gzip
+import json
+from typing import List, Optional
+from core import metrics
+from core.config import settings
+from core.metrics import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "text/plain", "text/html", "text/csv")
+
+
+def _qualities(header: str) -> dict:
+    """{value: q} for a comma-separated Accept-style header."""
+    qualities = {}
+    for part in header.split(","):
+        value, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if value:
+            qualities[value.lower()] = q
+    return qualities
+
+
+def available_codings() -> List[str]:
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def choose_coding(accept_encoding: str) -> Optional[str]:
+    """The preferred content coding the client accepts, or None for identity."""
+    accepted = _qualities(accept_encoding or "")
+    best, best_q = None, 0.0
+    for coding in available_codings():
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def wants_msgpack(accept: str) -> bool:
+    if msgpack is None or not settings.MSGPACK_ENABLED:
+        return False
+    accepted = _qualities(accept or "")
+    return any(accepted.get(media_type, 0.0) > 0 for media_type in MSGPACK_TYPES)
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=settings.BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.GZIP_LEVEL, mtime=0)
+
+
+def json_to_msgpack(body: bytes) -> bytes:
+    return msgpack.packb(json.loads(body), use_bin_type=True)
+
+
+def _header(headers: list, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _replace_headers(headers: list, updates: dict) -> list:
+    kept = [(k, v) for k, v in headers if k.lower() not in updates]
+    return kept + [(k, v) for k, v in updates.items() if v is not None]
+
+
+def _vary(headers: list, *names: str) -> bytes:
+    current = _header(headers, b"vary")
+    values = [v.strip() for v in current.decode("latin-1").split(",")] if current else []
+    values += [name for name in names if name.lower() not in {v.lower() for v in values}]
+    return ", ".join(values).encode("latin-1")
+
+
+class EncodingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        request_headers = dict(scope.get("headers", []))
+        coding = choose_coding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        msgpack_out = wants_msgpack(request_headers.get(b"accept", b"").decode("latin-1"))
+        if coding is None and not msgpack_out:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_encoded(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            headers = list(start.get("headers", []))
+            media_type = (_header(headers, b"content-type") or b"").split(b";")[0].strip().decode("latin-1")
+            if (message.get("more_body", False) or _header(headers, b"content-encoding") is not None
+                    or media_type not in COMPRESSIBLE_TYPES):
+                # Streamed, already encoded or binary: send it as the app produced it
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            body = message.get("body", b"")
+            negotiated = ["Accept-Encoding"] + (["Accept"] if msgpack is not None and settings.MSGPACK_ENABLED else [])
+            updates = {b"vary": _vary(headers, *negotiated)}
+            if msgpack_out and media_type == "application/json" and body:
+                body = await self._encode(json_to_msgpack, body)
+                updates[b"content-type"] = b"application/msgpack"
+            if coding is not None and len(body) >= settings.COMPRESSION_MIN_BYTES:
+                body = await self._encode(compress, body, coding)
+                updates[b"content-encoding"] = coding.encode()
+            if body is not message.get("body", b""):
+                etag = _header(headers, b"etag")
+                if etag is not None and not etag.startswith(b"W/"):
+                    updates[b"etag"] = b"W/" + etag
+            updates[b"content-length"] = str(len(body)).encode()
+            await send({**start, "headers": _replace_headers(headers, updates)})
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, send_encoded)
+
+    @staticmethod
+    async def _encode(encoder, body: bytes, *args) -> bytes:
+        with metrics.timer("encoding"):
+            if len(body) >= settings.COMPRESSION_OFFLOAD_BYTES:
+                return await run_in_threadpool(encoder, body, *args)
+            return encoder(body, *args)
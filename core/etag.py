@@ -0,0 +1,48 @@
+"""
+Entity tags derived from Firestore update times.
+
+A document's update_time changes on every write, so it is a strong validator on
+its own. Collections use the latest update time plus the document count, because
+a deletion does not move the maximum but does change the count.
+"""
+import hashlib
+from typing import Iterable, Optional
+from fastapi import Request, Response
+
+
+def _stamp(update_time) -> str:
+    if hasattr(update_time, "timestamp_pb"):
+        ts = update_time.timestamp_pb()
+        return f"{ts.seconds}.{ts.nanos:09d}"
+    return f"{int(update_time.timestamp())}.{update_time.microsecond * 1000:09d}"
+
+
+def document_etag(snapshot) -> str:
+    return f'"{_stamp(snapshot.update_time)}"'
+
+
+def collection_etag(snapshots: Iterable) -> str:
+    times = [snap.update_time for snap in snapshots if snap.update_time is not None]
+    latest = _stamp(max(times)) if times else "0"
+    return f'"{len(times)}-{latest}"'
+
+
+def variant_etag(etag: str, variant: str) -> str:
+    """`etag` for another representation of the same documents, e.g. a field projection."""
+    return f'{etag[:-1]}-{hashlib.sha1(variant.encode()).hexdigest()[:12]}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match / If-Match header value, which may list several tags or be "*"."""
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def conditional_get(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Sets the ETag on the response and returns a 304 when the client already has this version."""
+    response.headers["ETag"] = etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
@@ -0,0 +1,110 @@
+"""
+Geohash encoding and cell covers for proximity queries.
+
+A geohash interleaves longitude and latitude bits into a base32 string, so
+every point inside a cell shares the cell's hash as a prefix. A range query
+[prefix, prefix + "~") over a stored geohash then finds every document in the
+cell. An area is covered by a handful of such cells, and the results are
+filtered exactly afterwards, because cells overhang the area.
+"""
+import math
+from typing import List, Optional, Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 9  # ~5 m cells, finer than any GPS fix from a phone
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# (min_lat, min_lng, max_lat, max_lng)
+BBox = Tuple[float, float, float, float]
+
+
+def coordinates(location: Optional[dict]) -> Optional[Tuple[float, float]]:
+    """(lat, lng) from a geoLocation map using lat/lng or latitude/longitude keys, None if incomplete."""
+    if not location:
+        return None
+    lat = location.get("lat", location.get("latitude"))
+    lng = location.get("lng", location.get("lon", location.get("longitude")))
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return float(lat), float(lng)
+
+
+def encode(lat: float, lng: float, precision: int = PRECISION) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        span, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        mid = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            span[0] = mid
+        else:
+            span[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) of a cell in degrees."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def radius_bbox(lat: float, lng: float, radius_km: float) -> BBox:
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return max(lat - dlat, -90.0), max(lng - dlng, -180.0), min(lat + dlat, 90.0), min(lng + dlng, 180.0)
+
+
+def _cells(bbox: BBox, precision: int) -> List[str]:
+    min_lat, min_lng, max_lat, max_lng = bbox
+    height, width = cell_size(precision)
+    # Step from cell to cell, snapping to each cell's lower edge so none is skipped
+    cells = set()
+    lat = math.floor(min_lat / height) * height
+    while lat <= max_lat:
+        lng = math.floor(min_lng / width) * width
+        while lng <= max_lng:
+            cells.add(encode(min(lat + height / 2, 90.0), min(lng + width / 2, 180.0), precision))
+            lng += width
+        lat += height
+    return sorted(cells)
+
+
+def cover(bbox: BBox, max_cells: int = 16) -> List[str]:
+    """The finest set of at most `max_cells` geohash prefixes that covers `bbox`."""
+    best = [""]
+    for precision in range(1, PRECISION + 1):
+        height, width = cell_size(precision)
+        estimate = (math.ceil((bbox[2] - bbox[0]) / height) + 1) * (math.ceil((bbox[3] - bbox[1]) / width) + 1)
+        if estimate > max_cells * 4:
+            break
+        cells = _cells(bbox, precision)
+        if len(cells) > max_cells:
+            break
+        best = cells
+    return best
+
+
+def prefix_range(prefix: str) -> Tuple[str, str]:
+    """Bounds [start, end) of the geohashes that start with `prefix`."""
+    return prefix, prefix + "~"  # "~" sorts after every base32 character
+
+
+def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle (haversine) distance."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def in_bbox(lat: float, lng: float, bbox: BBox) -> bool:
+    return bbox[0] <= lat <= bbox[2] and bbox[1] <= lng <= bbox[3]
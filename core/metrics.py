@@ -0,0 +1,180 @@
+"""
+Request-level instrumentation exposed in Prometheus text format on /metrics.
+
+MetricsMiddleware opens a timing context for each request. While the request
+runs, the storage helpers (db.aio), the bcrypt pool, the TTS upstream call and
+the request threadpool report the time they spend through `timer()` and
+`run_in_threadpool()`. When the request finishes, those timings go into
+histograms labelled with the route template, so a slow route can be split
+into time spent in Firestore reads, queries and writes, threadpool queueing,
+bcrypt and TTS. The number of backend calls per request is recorded as well.
+
+With SERVER_TIMING enabled, the same breakdown is also sent to the client in a
+Server-Timing header. Metrics live in process memory, so each worker exposes
+its own and Prometheus sums them across targets.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+from core.config import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Stages whose calls count as storage backend RPCs
+BACKEND_STAGES = ("firestore_read", "firestore_query", "firestore_write")
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts, then +Inf, then the running sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for label_values, series in sorted(items):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status")
+)
+STAGE_LATENCY = Histogram(
+    "app_stage_duration_seconds",
+    "Latency of each backend read, query or write, threadpool wait, bcrypt call, TTS upstream call and response encoding, by route.",
+    ("route", "stage"),
+)
+BACKEND_CALLS = Histogram(
+    "app_backend_calls_per_request", "Storage backend calls made by one request, by route.",
+    ("route",), buckets=COUNT_BUCKETS,
+)
+REGISTRY = [REQUEST_LATENCY, STAGE_LATENCY, BACKEND_CALLS]
+
+
+class _RequestTimings:
+    __slots__ = ("observations",)
+
+    def __init__(self):
+        self.observations = []
+
+
+_current: ContextVar[Optional[_RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record(stage: str, seconds: float):
+    """Attributes `seconds` spent in `stage` to the current request, if any."""
+    timings = _current.get()
+    if timings is not None:
+        timings.observations.append((stage, seconds))
+
+
+@contextmanager
+def timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+async def run_in_threadpool(fn, *args, **kwargs):
+    """fastapi.concurrency.run_in_threadpool that also records how long the call waited for a thread."""
+    queued = time.perf_counter()
+    started = None
+
+    def call():
+        nonlocal started
+        started = time.perf_counter()
+        return fn(*args, **kwargs)
+
+    try:
+        return await _run_in_threadpool(call)
+    finally:
+        if started is not None:
+            record("threadpool_wait", started - queued)
+
+
+def render() -> str:
+    lines = []
+    for histogram in REGISTRY:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+def _server_timing(observations: list, total: float) -> str:
+    totals: Dict[str, list] = {}
+    for stage, seconds in observations:
+        entry = totals.setdefault(stage, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+    parts = [f'{stage};desc="{count} calls";dur={seconds * 1000:.1f}' for stage, (count, seconds) in totals.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        timings = _RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.SERVER_TIMING:
+                    header = _server_timing(timings.observations, time.perf_counter() - started)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up the series count
+            route = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.observe((scope["method"], route, str(status)), elapsed)
+            calls = 0
+            for stage, seconds in timings.observations:
+                STAGE_LATENCY.observe((route, stage), seconds)
+                calls += stage in BACKEND_STAGES
+            BACKEND_CALLS.observe((route,), calls)
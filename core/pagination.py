@@ -0,0 +1,101 @@
+"""
+Cursor pagination, limits and field projection for the list endpoints.
+
+A page is ordered by the endpoint's sort field with the document id as a tie
+breaker, so the opaque `start_after` cursor only has to carry those values and
+page N costs the same single query as page 1. The cursor for the next page is
+returned in the X-Next-Cursor header, which keeps list bodies unchanged. Each
+page carries a collection ETag, so an unchanged page can be answered with 304;
+a projected page's ETag also depends on its fields.
+Full pages are handed to the endpoint's response model as plain dicts, so each
+document is validated once (see core/serialization.py).
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional
+from fastapi import HTTPException, Query, Request, Response
+from google.cloud.firestore_v1.field_path import FieldPath
+from core.config import settings
+from core.etag import collection_etag, etag_matches, variant_etag
+from core.serialization import ORJSONResponse, document_dict
+from db import aio
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """Query parameters shared by every list endpoint, used as `page: PageParams = Depends()`."""
+
+    def __init__(
+        self,
+        request: Request,
+        start_after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page."),
+        limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, description=f"Page size, capped at {settings.PAGE_SIZE_MAX}."),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return; the id is always included."),
+    ):
+        self.if_none_match = request.headers.get("if-none-match")
+        self.start_after = start_after
+        self.limit = min(limit, settings.PAGE_SIZE_MAX)
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
+def encode_cursor(values: list) -> str:
+    encoded = [{"$dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(encoded, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> list:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(raw, list) or not raw:
+            raise ValueError("a cursor is a non-empty list")
+        return [datetime.fromisoformat(v["$dt"]) if isinstance(v, dict) else v for v in raw]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid start_after cursor.")
+
+
+async def paginate(query, page: PageParams, response: Response, model, order_by: str = None, direction: str = "ASCENDING"):
+    """
+    Runs one page of `query` and returns its documents for the `model` response
+    model, setting the X-Next-Cursor header when more documents follow. Projected
+    pages are partial documents, so they are returned as plain JSON rather than
+    through the model.
+    """
+    if page.fields:
+        # Only the model's own fields can be projected, so stored secrets never leak
+        unknown = {field.split(".")[0] for field in page.fields} - set(model.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    order_fields = [order_by] if order_by else []
+    for field in order_fields:
+        query = query.order_by(field, direction=direction)
+    query = query.order_by(FieldPath.document_id(), direction=direction)
+    if page.start_after:
+        query = query.start_after(decode_cursor(page.start_after))
+    if page.fields:
+        query = query.select(sorted(set(page.fields) | set(order_fields)))
+
+    # One extra document tells us whether another page exists
+    docs = await aio.stream(query.limit(page.limit + 1))
+    headers = {}
+    if len(docs) > page.limit:
+        docs = docs[:page.limit]
+        last = docs[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor([last.get(field) for field in order_fields] + [last.id])
+
+    headers["ETag"] = collection_etag(docs)
+    if page.fields:
+        # A projection is a different representation, so it must not revalidate the full page or another projection
+        headers["ETag"] = variant_etag(headers["ETag"], ",".join(sorted(set(page.fields))))
+    if etag_matches(page.if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if page.fields:
+        keep = {field.split(".")[0] for field in page.fields}
+        rows = [{"id": doc.id, **{k: v for k, v in doc.to_dict().items() if k in keep}} for doc in docs]
+        return ORJSONResponse(rows, headers=headers)
+
+    response.headers.update(headers)
+    return [document_dict(doc) for doc in docs]
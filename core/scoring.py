@@ -0,0 +1,171 @@
+"""
+Vectorized farm scoring.
+
+Every input is held as one NumPy column across all farms, so scoring 100k
+farms is a handful of array operations rather than a Python loop per farm.
+Scores are on a 0-100 scale. Missing inputs are left out of the weighted
+means instead of counting as zero. A score with no inputs at all is NaN, and
+the caller leaves the stored value alone.
+
+Each farm's score depends only on its own inputs, never on the rest of the
+batch, so scoring a changed subset gives the same numbers as a full run.
+
+- soilScore: pH distance from a slightly acidic 6.5 and N/P/K/organic carbon
+  against soil health card "medium" levels.
+- yieldScore: the latest season against the farm's best, and year-to-year
+  stability (needs at least two seasons of yieldHistory). Seasons are put in
+  calendar order by season_key, not by their labels.
+- storageScore: the storage access recorded in the owner's resource profile.
+- sustainabilityScore: organic carbon, crop rotation diversity and irrigation
+  efficiency.
+- qualityScore: weighted blend of the four above.
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+SCORES = ["yieldScore", "soilScore", "storageScore", "sustainabilityScore", "qualityScore"]
+
+IDEAL_PH = 6.5
+PH_TOLERANCE = 2.0  # pH units from ideal at which the pH part reaches zero
+# Soil health card "medium" levels: kg/ha for N, P and K, percent for organic carbon
+NUTRIENT_TARGETS = {"nitrogen": 280.0, "phosphorus": 25.0, "potassium": 280.0, "organicCarbon": 0.75}
+ROTATION_TARGET = 3  # distinct crops in the rotation history for full marks
+
+# Matched as lowercase substrings of the free-text fields, first match wins
+IRRIGATION_EFFICIENCY = [("drip", 1.0), ("sprinkler", 0.8), ("furrow", 0.5), ("rain", 0.5), ("flood", 0.3)]
+STORAGE_LEVELS = [("cold", 1.0), ("warehouse", 0.8), ("own", 0.6), ("home", 0.6),
+                  ("shared", 0.5), ("community", 0.5), ("none", 0.0), ("no ", 0.0)]
+
+# Order of the cropping seasons within an agricultural year, which starts with kharif
+SEASON_RANKS = [("kharif", 0), ("rabi", 1), ("zaid", 2), ("summer", 2)]
+_YEAR = re.compile(r"(?<!\d)(\d{4})(?!\d)")
+
+QUALITY_WEIGHTS = {"yieldScore": 0.35, "soilScore": 0.3, "storageScore": 0.15, "sustainabilityScore": 0.2}
+
+
+def keyword_level(text: Optional[str], levels: Sequence[tuple]) -> float:
+    """Maps a free-text field to a 0-1 level by keyword, NaN when it is empty or unrecognised."""
+    if not text:
+        return np.nan
+    text = text.lower()
+    for keyword, level in levels:
+        if keyword in text:
+            return level
+    return np.nan
+
+
+def season_key(label: str) -> tuple:
+    """
+    Sort key that puts yieldHistory season labels in calendar order, e.g.
+    "Kharif 2023" < "Rabi 2023-24" < "Zaid 2024" < "Kharif 2024", and
+    "2022-23" < "2023-24". A zaid season closes the agricultural year before
+    the one its calendar year starts. Labels without a year sort last.
+    """
+    text = str(label).lower()
+    year = _YEAR.search(text)
+    rank = next((r for keyword, r in SEASON_RANKS if keyword in text), 0)
+    if year is None:
+        return (1, 0, 0, text)
+    agricultural_year = int(year.group(1)) - (1 if rank == 2 else 0)
+    return (0, agricultural_year, rank, text)
+
+
+@dataclass
+class FarmColumns:
+    farm_ids: List[str]
+    soil_ph: np.ndarray
+    nitrogen: np.ndarray
+    phosphorus: np.ndarray
+    potassium: np.ndarray
+    organic_carbon: np.ndarray
+    # Every farm's yieldHistory values in season order, back to back; farm i owns
+    # yield_values[yield_offsets[i]:yield_offsets[i + 1]]
+    yield_values: np.ndarray
+    yield_offsets: np.ndarray
+    rotation_crops: np.ndarray  # distinct crops in cropRotationHistory
+    irrigation: np.ndarray  # 0-1 efficiency
+    storage: np.ndarray  # 0-1 access level
+
+    def take(self, mask: np.ndarray) -> "FarmColumns":
+        """The columns of the farms selected by a boolean mask."""
+        index = np.flatnonzero(mask)
+        starts, ends = self.yield_offsets[index], self.yield_offsets[index + 1]
+        lengths = ends - starts
+        # Gather each selected farm's yield values, keeping them contiguous
+        positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        return FarmColumns(
+            farm_ids=[self.farm_ids[i] for i in index],
+            soil_ph=self.soil_ph[index], nitrogen=self.nitrogen[index], phosphorus=self.phosphorus[index],
+            potassium=self.potassium[index], organic_carbon=self.organic_carbon[index],
+            yield_values=self.yield_values[positions], yield_offsets=np.r_[0, np.cumsum(lengths)],
+            rotation_crops=self.rotation_crops[index], irrigation=self.irrigation[index], storage=self.storage[index],
+        )
+
+
+def _weighted_nanmean(parts: Sequence[np.ndarray], weights: Optional[Sequence[float]] = None) -> np.ndarray:
+    """Row-wise weighted mean that skips NaNs; NaN where every part is NaN."""
+    stack = np.vstack(parts)
+    w = np.ones(len(parts)) if weights is None else np.asarray(weights, dtype=float)
+    present = ~np.isnan(stack)
+    total = (np.where(present, stack, 0.0) * w[:, None]).sum(axis=0)
+    weight = (present * w[:, None]).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / weight
+
+
+def _ratio(values: np.ndarray, target: float) -> np.ndarray:
+    return np.clip(values / target, 0.0, 1.0)
+
+
+def _yield_parts(values: np.ndarray, offsets: np.ndarray) -> tuple:
+    """Per-farm (latest / best season, 1 - coefficient of variation), NaN below two seasons."""
+    counts = np.diff(offsets)
+    sums = np.r_[0.0, np.cumsum(values)]
+    squares = np.r_[0.0, np.cumsum(values ** 2)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sums[offsets[1:]] - sums[offsets[:-1]]) / counts
+        variance = (squares[offsets[1:]] - squares[offsets[:-1]]) / counts - mean ** 2
+        cv = np.sqrt(np.maximum(variance, 0.0)) / mean
+
+    best = np.full(len(counts), np.nan)
+    latest = np.full(len(counts), np.nan)
+    has_values = counts > 0
+    if has_values.any():
+        best[has_values] = np.maximum.reduceat(values, offsets[:-1][has_values])
+        latest[has_values] = values[offsets[1:][has_values] - 1]
+
+    enough = counts >= 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        level = np.where(enough & (best > 0), np.clip(latest / best, 0.0, 1.0), np.nan)
+    stability = np.where(enough & (mean > 0), 1.0 - np.clip(cv, 0.0, 1.0), np.nan)
+    return level, stability
+
+
+def score(columns: FarmColumns) -> Dict[str, np.ndarray]:
+    """Scores every farm in `columns`; returns one 0-100 array per score field."""
+    ph = np.clip(1.0 - np.abs(columns.soil_ph - IDEAL_PH) / PH_TOLERANCE, 0.0, 1.0)
+    carbon = _ratio(columns.organic_carbon, NUTRIENT_TARGETS["organicCarbon"])
+    soil = _weighted_nanmean([
+        ph,
+        _ratio(columns.nitrogen, NUTRIENT_TARGETS["nitrogen"]),
+        _ratio(columns.phosphorus, NUTRIENT_TARGETS["phosphorus"]),
+        _ratio(columns.potassium, NUTRIENT_TARGETS["potassium"]),
+        carbon,
+    ])
+
+    level, stability = _yield_parts(columns.yield_values, columns.yield_offsets)
+    yield_ = _weighted_nanmean([level, stability], [0.6, 0.4])
+
+    rotation = np.where(columns.rotation_crops > 0, _ratio(columns.rotation_crops, ROTATION_TARGET), np.nan)
+    sustainability = _weighted_nanmean([carbon, rotation, columns.irrigation])
+
+    scores = {
+        "yieldScore": yield_ * 100,
+        "soilScore": soil * 100,
+        "storageScore": columns.storage * 100,
+        "sustainabilityScore": sustainability * 100,
+    }
+    scores["qualityScore"] = _weighted_nanmean([scores[k] for k in QUALITY_WEIGHTS], list(QUALITY_WEIGHTS.values()))
+    return {name: np.round(values, 2) for name, values in scores.items()}
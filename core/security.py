@@ -0,0 +1,79 @@
+"""
+Password hashing on a dedicated process pool.
+
+bcrypt is pure CPU, about 250ms per call at cost 12. Running it in the request
+threadpool lets a login spike starve every other endpoint, so hashes run in a
+small pool of worker processes instead. When more than PASSWORD_QUEUE_LIMIT
+calls are already waiting, new ones are shed with a 503 rather than queued.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from fastapi import HTTPException
+from core import metrics
+from core.config import settings
+
+_executor = None
+_in_flight = 0
+
+
+def _pool_size() -> int:
+    return settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=_pool_size())
+    return _executor
+
+
+def shutdown_password_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+async def _run(fn, *args):
+    global _in_flight
+    if _in_flight >= _pool_size() + settings.PASSWORD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many sign-ins in progress, please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
+    _in_flight += 1
+    try:
+        with metrics.timer("bcrypt"):
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _in_flight -= 1
+
+
+async def hash_password(password: str) -> str:
+    hashed = await _run(_hash, password.encode("utf-8"), settings.BCRYPT_ROUNDS)
+    return hashed.decode("utf-8")
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    if not hashed:
+        return False
+    return await _run(_check, password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True when a stored hash ($2b$<cost>$...) was made with a different cost than BCRYPT_ROUNDS."""
+    try:
+        return int(hashed.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
@@ -0,0 +1,62 @@
+"""
+Sentence splitting for chunked speech synthesis.
+
+Sentences end at a run of terminal punctuation followed by whitespace, so
+decimals like "2.5" stay intact. Besides . ! ? this covers the Devanagari danda
+and double danda used in Hindi and Marathi; Malayalam uses the Latin full stop.
+Chunks are sized in UTF-8 bytes, because that is how the upstream input limit
+is measured and Indic scripts take three bytes per character.
+"""
+import re
+from typing import List
+
+TERMINATORS = ".!?।॥"  # ., !, ?, । (danda), ॥ (double danda)
+CLOSERS = "\"'”’)]"
+
+_SENTENCE = re.compile(rf"\S.*?(?:[{re.escape(TERMINATORS)}]+[{re.escape(CLOSERS)}]*(?=\s|$)|$)", re.S)
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def split_sentences(text: str) -> List[str]:
+    return [m.group().strip() for m in _SENTENCE.finditer(text) if m.group().strip()]
+
+
+def _split_long(sentence: str, max_bytes: int) -> List[str]:
+    """Breaks a sentence that alone exceeds max_bytes at word boundaries."""
+    parts, current = [], ""
+    for word in sentence.split():
+        candidate = f"{current} {word}" if current else word
+        if _size(candidate) <= max_bytes:
+            current = candidate
+            continue
+        if current:
+            parts.append(current)
+        while _size(word) > max_bytes:  # a single unbroken run, cut by characters
+            cut = len(word.encode("utf-8")[:max_bytes].decode("utf-8", "ignore"))
+            parts.append(word[:cut])
+            word = word[cut:]
+        current = word
+    if current:
+        parts.append(current)
+    return parts
+
+
+def chunk_text(text: str, max_bytes: int) -> List[str]:
+    """
+    Groups sentences into chunks of at most max_bytes. The first sentence is
+    always its own chunk so the first audio can be synthesized as early as possible.
+    """
+    pieces = []
+    for sentence in split_sentences(text):
+        pieces.extend(_split_long(sentence, max_bytes) if _size(sentence) > max_bytes else [sentence])
+
+    chunks = pieces[:1]
+    for piece in pieces[1:]:
+        if len(chunks) > 1 and _size(chunks[-1]) + 1 + _size(piece) <= max_bytes:
+            chunks[-1] = f"{chunks[-1]} {piece}"
+        else:
+            chunks.append(piece)
+    return chunks
@@ -0,0 +1,48 @@
+"""
+JSON encoding for responses that bypass FastAPI's response models.
+
+With a response_model, FastAPI validates a handler's return value and encodes
+it in pydantic's Rust core in one go, so list handlers hand it stored
+documents as plain dicts rather than building a model per document first;
+each document is then validated exactly once. Projected pages and the chat
+event stream have no model to go through and used jsonable_encoder, which
+walks every value in Python; they are encoded with orjson instead.
+
+ORJSONResponse is not the app's default response class on purpose: setting
+one turns off FastAPI's Rust encoding path for every response_model endpoint.
+See benchmarks/serialization.py for the numbers.
+"""
+from datetime import datetime
+from typing import Any
+import orjson
+from pydantic import BaseModel
+from starlette.responses import Response
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any):
+    # Firestore timestamps are a datetime subclass, which orjson does not take natively
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def document_dict(doc) -> dict:
+    """A stored document as a dict for a response model to validate, id included."""
+    data = doc.to_dict()
+    data["id"] = doc.id
+    return data
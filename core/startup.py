@@ -0,0 +1,59 @@
+"""
+Startup phase timings.
+
+main.py imports this module first, so its load time stands in for process
+start. Each phase of startup is timed with `phase(name)`. `report()` prints
+them once the app can serve, and /metrics exposes them as
+app_startup_seconds{phase=...}, so a cold-start regression shows up on the
+dashboards without attaching a profiler to a container.
+
+Phases named "warmup.*" run in the background after the app is already
+serving, so they are not counted in the time to ready.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+PROCESS_START = time.perf_counter()
+
+_phases: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def record(name: str, seconds: float):
+    with _lock:
+        _phases[name] = seconds
+
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def mark_ready():
+    record("ready", time.perf_counter() - PROCESS_START)
+
+
+def phases() -> Dict[str, float]:
+    with _lock:
+        return dict(_phases)
+
+
+def report() -> str:
+    line = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in phases().items())
+    print(f"Startup: {line}")
+    return line
+
+
+def render() -> str:
+    lines = [
+        "# HELP app_startup_seconds Duration of each startup phase; ready is the time from process start to serving.",
+        "# TYPE app_startup_seconds gauge",
+    ]
+    lines += [f'app_startup_seconds{{phase="{name}"}} {seconds}' for name, seconds in phases().items()]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,177 @@
+"""
+Content-addressed cache for synthesized speech.
+
+Audio is keyed by a hash of the normalized text, language, voice and audio
+config, and kept in two tiers: a bounded in-memory LRU per worker, and a
+size-capped directory on disk shared by every uvicorn worker on the host.
+Concurrent misses for the same key are collapsed into one upstream call,
+which runs in its own task: a request that disconnects does not cancel the
+synthesis other requests are waiting on.
+
+A disk hit is read in the threadpool, so the event loop never waits on the
+disk, and promoted to memory. Every entry is a short clip, so it is served
+from those bytes, not from the file, which another worker's eviction could
+delete before the response is sent. A file that disappears between lookup and
+read is just a miss.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from core.metrics import run_in_threadpool
+
+# Disk eviction frees space down to this fraction of the cap
+DISK_LOW_WATERMARK = 0.9
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+class TTSCache:
+    def __init__(self, directory: str, memory_bytes: int, disk_bytes: int):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._inflight: dict = {}
+        self._disk_used: Optional[int] = None  # as of the last scan, plus this worker's writes since
+        self._disk_lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "deduplicated": 0,
+            "memory_evictions": 0, "disk_evictions": 0, "bytes_served": 0,
+        }
+
+    @staticmethod
+    def key(text: str, language_code: str, voice_name: str, audio_encoding: str) -> str:
+        payload = json.dumps([text, language_code, voice_name, audio_encoding], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get_or_create(self, key: str, synthesize: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Returns cached audio for `key`, calling `synthesize` at most once per key across concurrent requests."""
+        content = self._lookup_memory(key)
+        if content is None:
+            content = await run_in_threadpool(self._read_disk, key)
+            if content is not None:
+                self.stats["disk_hits"] += 1
+                self._remember(key, content)
+        if content is None:
+            content = await self._single_flight(key, synthesize)
+        self.stats["bytes_served"] += len(content)
+        return content
+
+    def snapshot(self) -> dict:
+        # Requests that joined an in-flight synthesis were served without an upstream call too
+        requests = sum(self.stats[k] for k in ("memory_hits", "disk_hits", "misses", "deduplicated"))
+        return {
+            **self.stats,
+            "hit_rate": 1 - self.stats["misses"] / requests if requests else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+        }
+
+    def _lookup_memory(self, key: str) -> Optional[bytes]:
+        content = self._memory.get(key)
+        if content is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+        return content
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        """The file's bytes, or None if there is none or it was evicted meanwhile. Blocking."""
+        path = self._path(key)
+        try:
+            os.utime(path)  # mark as recently used for disk eviction
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def _single_flight(self, key: str, synthesize: Callable[[], Awaitable[bytes]]) -> bytes:
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["deduplicated"] += 1
+        else:
+            self.stats["misses"] += 1
+            # Its own task, so a caller that disconnects does not cancel it for everyone else
+            inflight = asyncio.ensure_future(self._fill(key, synthesize))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda task: self._finished(key, task))
+        return await asyncio.shield(inflight)
+
+    def _finished(self, key: str, task: asyncio.Future):
+        del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every waiter has gone
+
+    async def _fill(self, key: str, synthesize: Callable[[], Awaitable[bytes]]) -> bytes:
+        content = await synthesize()
+        self._remember(key, content)
+        try:
+            await run_in_threadpool(self._store, key, content)
+        except Exception as e:
+            # The audio is still served; only the disk copy is lost
+            print(f"TTS cache write failed: {e}")
+        return content
+
+    def _remember(self, key: str, content: bytes):
+        if len(content) > self.memory_bytes:
+            return
+        self._memory[key] = content
+        self._memory_used += len(content)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def _store(self, key: str, content: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so other workers never serve a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        with self._disk_lock:
+            if self._disk_used is not None and self._disk_used + len(content) <= self.disk_bytes:
+                self._disk_used += len(content)
+            else:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """
+        Rescans the directory, which also counts other workers' files, and
+        evicts the least recently used files down to DISK_LOW_WATERMARK of the
+        cap. The running count then absorbs new files until the cap is reached
+        again, so the scan runs once per that much new audio, not on every miss.
+        """
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".mp3"):
+                    try:
+                        st = os.stat(os.path.join(root, name))
+                    except FileNotFoundError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+        used = sum(size for _, size, _ in files)
+        if used > self.disk_bytes:
+            for _, size, path in sorted(files):
+                if used <= self.disk_bytes * DISK_LOW_WATERMARK:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # another worker evicted it first
+                used -= size
+                self.stats["disk_evictions"] += 1
+        self._disk_used = used
@@ -0,0 +1,140 @@
+"""
+Dashboard numbers computed with Firestore aggregation queries.
+
+Counts, sums and averages are evaluated by the backend, so an "N unread"
+badge costs one aggregation read instead of a download of every alert.
+Results are kept in memory for AGGREGATE_CACHE_TTL seconds. The write
+handlers for alerts, logs and farms call `aggregate_cache.invalidate` for
+the owner they touched, so a worker's own writes show up at once and writes
+made by other workers show up within the TTL. A result whose owner was
+invalidated while it was being computed may predate the write, so it is
+returned but not cached.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from google.cloud.firestore_v1.base_query import FieldFilter
+from core.config import settings
+from db import aio
+
+# Firestore allows at most this many aggregations in one query
+MAX_AGGREGATIONS = 5
+
+ALERT_PRIORITIES = (1, 2, 3)
+FARM_SCORES = ["yieldScore", "soilScore", "storageScore", "sustainabilityScore", "qualityScore"]
+
+
+class AggregateCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (scope, owner_id) -> {variant: (expires_at, value)}
+        self._entries: "OrderedDict[tuple, Dict[tuple, tuple]]" = OrderedDict()
+        # Per key with computes in flight: (computes, generation); invalidate bumps the generation
+        self._computing: Dict[tuple, List[int]] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, scope: str, owner_id: str, compute: Callable[[], Awaitable[dict]], variant: tuple = ()) -> dict:
+        key = (scope, owner_id)
+        with self._lock:
+            cached = self._entries.get(key, {}).get(variant)
+            if cached is not None and cached[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                return cached[1]
+            computing = self._computing.setdefault(key, [0, 0])
+            computing[0] += 1
+            generation = computing[1]
+        try:
+            value = await compute()
+        finally:
+            with self._lock:
+                computing[0] -= 1
+                if not computing[0]:
+                    del self._computing[key]
+        with self._lock:
+            if computing[1] != generation:
+                return value  # invalidated while computing; the value may predate the write
+            self._entries.setdefault(key, {})[variant] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, scope: str, owner_id: Optional[str]):
+        key = (scope, owner_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            if key in self._computing:
+                self._computing[key][1] += 1
+
+
+aggregate_cache = AggregateCache(settings.AGGREGATE_CACHE_TTL, settings.AGGREGATE_CACHE_MAX_ENTRIES)
+
+
+async def aggregate(query, specs: List[Tuple[str, str, Optional[str]]]) -> dict:
+    """
+    Evaluates (alias, "count" | "sum" | "avg", field) specs over `query`, split
+    into as few aggregation queries as Firestore's per-query limit allows.
+    """
+    async def run(chunk):
+        aggregation = query
+        for alias, kind, field in chunk:
+            aggregation = aggregation.count(alias=alias) if kind == "count" else getattr(aggregation, kind)(field, alias=alias)
+        return await aio.aggregate(aggregation)
+
+    chunks = [specs[i:i + MAX_AGGREGATIONS] for i in range(0, len(specs), MAX_AGGREGATIONS)]
+    values = {}
+    for result in await asyncio.gather(*(run(chunk) for chunk in chunks)):
+        values.update(result)
+    return values
+
+
+def _count(query) -> Awaitable[dict]:
+    return aggregate(query, [("count", "count", None)])
+
+
+async def alert_summary(db, user_id: str) -> dict:
+    async def compute():
+        alerts = db.collection('alerts').where(filter=FieldFilter("userId", "==", user_id))
+        unread = alerts.where(filter=FieldFilter("status", "==", "unread"))
+        total, unread_total, *by_priority = await asyncio.gather(
+            _count(alerts),
+            _count(unread),
+            *(_count(unread.where(filter=FieldFilter("priority", "==", p))) for p in ALERT_PRIORITIES),
+        )
+        return {
+            "total": total["count"],
+            "unread": unread_total["count"],
+            "unreadByPriority": {str(p): r["count"] for p, r in zip(ALERT_PRIORITIES, by_priority)},
+        }
+
+    return await aggregate_cache.get("alerts", user_id, compute)
+
+
+async def log_summary(db, farm_id: str, activity_types: List[str]) -> dict:
+    async def compute():
+        logs = db.collection('logs').where(filter=FieldFilter("farmId", "==", farm_id))
+        total, *by_type = await asyncio.gather(
+            _count(logs),
+            *(_count(logs.where(filter=FieldFilter("activityType", "==", t))) for t in activity_types),
+        )
+        return {"total": total["count"], "byActivityType": {t: r["count"] for t, r in zip(activity_types, by_type)}}
+
+    return await aggregate_cache.get("logs", farm_id, compute, variant=tuple(activity_types))
+
+
+async def farm_summary(db, user_id: str) -> dict:
+    async def compute():
+        farms = db.collection('farms').where(filter=FieldFilter("userId", "==", user_id))
+        specs = [("farms", "count", None), ("totalFarmArea", "sum", "totalFarmArea")]
+        specs += [(score, "avg", score) for score in FARM_SCORES]
+        values = await aggregate(farms, specs)
+        return {
+            "farms": values["farms"],
+            "totalFarmArea": values["totalFarmArea"],
+            "averageScores": {score: values[score] for score in FARM_SCORES},
+        }
+
+    return await aggregate_cache.get("farms", user_id, compute)
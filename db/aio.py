@@ -0,0 +1,77 @@
+"""
+Awaitable wrappers around Firestore calls.
+
+Every router is async and goes through these helpers, so the same handler code
+runs on either client selected by FIRESTORE_CLIENT: calls on the AsyncClient are
+awaited directly, while calls on the blocking Client are moved to the threadpool
+so they never stall the event loop.
+
+Each call is timed as a read, query or write of the current request, which is
+where the per-route backend metrics in core.metrics come from.
+"""
+import itertools
+from core import metrics
+from core.metrics import run_in_threadpool
+from db.firestore_client import is_async
+
+
+async def run(fn, *args, **kwargs):
+    if is_async():
+        return await fn(*args, **kwargs)
+    return await run_in_threadpool(fn, *args, **kwargs)
+
+
+async def get(ref, **kwargs):
+    """Reads a single document."""
+    with metrics.timer("firestore_read"):
+        return await run(ref.get, **kwargs)
+
+
+async def get_all(db, refs):
+    """Reads several documents in one multi-get RPC."""
+    with metrics.timer("firestore_read"):
+        if is_async():
+            return [doc async for doc in db.get_all(refs)]
+        return await run_in_threadpool(lambda: list(db.get_all(refs)))
+
+
+async def stream(query):
+    """Runs a query and collects every matching document."""
+    with metrics.timer("firestore_query"):
+        if is_async():
+            return [doc async for doc in query.stream()]
+        return await run_in_threadpool(lambda: list(query.stream()))
+
+
+async def aggregate(aggregation_query) -> dict:
+    """Runs a count/sum/avg aggregation query and returns its values by alias."""
+    with metrics.timer("firestore_query"):
+        results = await run(aggregation_query.get)
+    return {result.alias: result.value for row in results for result in row}
+
+
+async def iterate(query, chunk_size: int = 100):
+    """
+    Yields a query's documents as they arrive instead of collecting them, so the
+    caller's consumption rate paces the stream. In sync mode documents are pulled
+    from the blocking iterator chunk_size at a time on the threadpool.
+    """
+    if is_async():
+        async for doc in query.stream():
+            yield doc
+        return
+    docs = await run_in_threadpool(query.stream)
+    while True:
+        # Each chunk is timed on its own; the time the consumer holds a chunk is not backend time
+        with metrics.timer("firestore_query"):
+            chunk = await run_in_threadpool(lambda: list(itertools.islice(docs, chunk_size)))
+        if not chunk:
+            return
+        for doc in chunk:
+            yield doc
+
+
+async def write(fn, *args, **kwargs):
+    """Performs a write such as ref.set, ref.update, collection.add or batch.commit."""
+    with metrics.timer("firestore_write"):
+        return await run(fn, *args, **kwargs)
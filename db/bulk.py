@@ -0,0 +1,110 @@
+"""
+Bulk ingestion through Firestore's BulkWriter.
+
+BulkWriter batches, parallelises and rate-limits writes by itself, but it is a
+blocking API, so it runs on the threadpool with the sync client. Every item gets
+its own outcome. An item that carries an idempotency key is written under an id
+derived from that key with a create precondition, so re-sending it reports a
+duplicate instead of writing a second copy.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Tuple
+from fastapi import HTTPException
+from pydantic import ValidationError
+from core import metrics
+from core.config import settings
+from core.metrics import run_in_threadpool
+from db.firestore_client import get_sync_db
+from schemas import batch as batch_schema
+
+ALREADY_EXISTS = 6  # gRPC status code
+MAX_ATTEMPTS = 5
+
+
+def _create_all(db, collection: str, items: List[Tuple[Optional[str], dict]]) -> List[Tuple[str, str, Optional[str]]]:
+    writer = db.bulk_writer()
+    outcomes = {}
+
+    def on_result(reference, result, _):
+        outcomes[reference.path] = ("created", None)
+
+    def on_error(failure, _):
+        path = failure.operation.reference.path
+        if failure.code == ALREADY_EXISTS:
+            outcomes[path] = ("duplicate", None)
+            return False
+        if failure.attempts < MAX_ATTEMPTS:
+            return True
+        outcomes[path] = ("failed", failure.message)
+        return False
+
+    writer.on_write_result(on_result)
+    writer.on_write_error(on_error)
+    refs = []
+    for doc_id, data in items:
+        ref = db.collection(collection).document(doc_id)
+        writer.create(ref, data)
+        refs.append(ref)
+    writer.close()
+    return [(ref.id, *outcomes.get(ref.path, ("failed", "No write result"))) for ref in refs]
+
+
+async def create_documents(collection: str, items: List[Tuple[Optional[str], dict]]):
+    """Creates (doc_id or None, data) pairs and returns (id, status, error) per item, in order."""
+    with metrics.timer("firestore_write"):
+        return await run_in_threadpool(_create_all, get_sync_db(), collection, items)
+
+
+def idempotent_id(scope: str, key: str) -> str:
+    return hashlib.sha256(f"{scope}:{key}".encode("utf-8")).hexdigest()[:32]
+
+
+async def ingest_for_farm(collection: str, farm_id: str, items: List[dict], schema, timestamp_field: str,
+                         prepare: Optional[Callable[[dict], dict]] = None) -> batch_schema.BatchResult:
+    """
+    Validates raw items against `schema`, stamps them with `timestamp_field` and
+    bulk-creates the valid ones, passing each through `prepare` first if given.
+    The caller checks the farm exists, once.
+    """
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch can hold at most {settings.BATCH_MAX_ITEMS} items.")
+
+    results = [None] * len(items)
+    pending, positions, seen = [], [], {}
+    now = datetime.now(timezone.utc)
+    for index, raw in enumerate(items):
+        raw = dict(raw)
+        key = raw.pop("idempotencyKey", None)
+        try:
+            item = schema.model_validate(raw)
+        except ValidationError as e:
+            results[index] = batch_schema.BatchItemResult(index=index, status="invalid", error=str(e))
+            continue
+        if item.farmId != farm_id:
+            results[index] = batch_schema.BatchItemResult(index=index, status="invalid", error="Farm ID in path and body do not match.")
+            continue
+        doc_id = idempotent_id(farm_id, str(key)) if key is not None else None
+        if doc_id is not None and doc_id in seen:
+            # Repeated within this batch: the first occurrence is the one written
+            results[index] = batch_schema.BatchItemResult(index=index, status="duplicate", id=doc_id)
+            continue
+        if doc_id is not None:
+            seen[doc_id] = index
+        data = item.model_dump()
+        if prepare is not None:
+            data = prepare(data)
+        # Offset by position so items keep their order when sorted by time
+        data[timestamp_field] = now + timedelta(microseconds=index)
+        pending.append((doc_id, data))
+        positions.append(index)
+
+    for index, (doc_id, status, error) in zip(positions, await create_documents(collection, pending)):
+        results[index] = batch_schema.BatchItemResult(index=index, status=status, id=doc_id, error=error)
+
+    return batch_schema.BatchResult(
+        created=sum(r.status == "created" for r in results),
+        duplicates=sum(r.status == "duplicate" for r in results),
+        errors=sum(r.status in ("invalid", "failed") for r in results),
+        results=results,
+    )
@@ -0,0 +1,128 @@
+"""
+Read-through cache for the one-to-one profile documents (crops, resources,
+challenges), which are read far more often than they change.
+
+Entries are kept in a bounded LRU with a per-collection TTL, and write
+handlers invalidate them explicitly. Write handlers only invalidate their own
+worker's entries, though. With several workers in PROFILE_CACHE_MODE=ttl, a
+worker that did not handle a write can serve the old document for up to the
+collection's TTL. Missing documents are cached only for PROFILE_CACHE_MISS_TTL,
+so a profile created on another worker shows up within seconds, not after a
+full TTL of 404s.
+
+With PROFILE_CACHE_MODE=listener, every cached document also gets a Firestore
+snapshot listener, so writes made by other workers update the entry as soon as
+they land. The listener is removed when the entry is evicted.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from google.cloud.firestore_v1.base_document import DocumentSnapshot
+from core.config import settings
+from db import aio
+from db.firestore_client import get_sync_db
+
+
+class _Entry:
+    __slots__ = ("snapshot", "expires_at", "watch")
+
+    def __init__(self, snapshot: DocumentSnapshot, expires_at: float):
+        self.snapshot = snapshot
+        self.expires_at = expires_at
+        self.watch = None
+
+
+class ProfileCache:
+    def __init__(self, mode: str, max_entries: int, ttls: Dict[str, float]):
+        self.mode = mode
+        self.max_entries = max_entries
+        self.ttls = ttls
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        # Listener callbacks arrive on Firestore's watch threads
+        self._lock = threading.Lock()
+
+    async def get(self, db, collection: str, doc_id: str) -> DocumentSnapshot:
+        ref = db.collection(collection).document(doc_id)
+        if self.mode == "off" or collection not in self.ttls:
+            return await aio.get(ref)
+        cached = self._lookup((collection, doc_id))
+        if cached is not None:
+            return cached
+        snapshot = await aio.get(ref)
+        self._store((collection, doc_id), snapshot)
+        return snapshot
+
+    def invalidate(self, collection: str, doc_id: str):
+        with self._lock:
+            entry = self._entries.pop((collection, doc_id), None)
+        if entry is not None:
+            self._unwatch(entry)
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._unwatch(entry)
+
+    def _lookup(self, key: tuple) -> Optional[DocumentSnapshot]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[key]
+            else:
+                self._entries.move_to_end(key)
+                return entry.snapshot
+        self._unwatch(entry)
+        return None
+
+    def _store(self, key: tuple, snapshot: DocumentSnapshot):
+        entry = _Entry(snapshot, time.monotonic() + self._ttl(key[0], snapshot))
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                evicted.append(previous)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for old in evicted:
+            self._unwatch(old)
+        if self.mode == "listener":
+            self._watch(key, entry)
+
+    def _ttl(self, collection: str, snapshot: DocumentSnapshot) -> float:
+        if snapshot.exists:
+            return self.ttls[collection]
+        return min(self.ttls[collection], settings.PROFILE_CACHE_MISS_TTL)
+
+    def _watch(self, key: tuple, entry: _Entry):
+        ref = get_sync_db().collection(key[0]).document(key[1])
+
+        def on_change(docs, changes, read_time):
+            # An empty result means the document is gone; cache that as a miss too
+            snapshot = docs[0] if docs else DocumentSnapshot(
+                ref, None, exists=False, read_time=read_time, create_time=None, update_time=None
+            )
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    entry.snapshot = snapshot
+                    entry.expires_at = time.monotonic() + self._ttl(key[0], snapshot)
+
+        entry.watch = ref.on_snapshot(on_change)
+
+    @staticmethod
+    def _unwatch(entry: _Entry):
+        if entry.watch is not None:
+            entry.watch.unsubscribe()
+            entry.watch = None
+
+
+profile_cache = ProfileCache(
+    mode=settings.PROFILE_CACHE_MODE,
+    max_entries=settings.PROFILE_CACHE_MAX_ENTRIES,
+    ttls=settings.PROFILE_CACHE_TTLS,
+)
@@ -0,0 +1,116 @@
+"""
+Live chat fan-out from one snapshot listener per farm.
+
+The first client to subscribe to a farm's chat stream starts a listener on
+that farm's messages from that moment on. Every later subscriber shares it,
+and it is torn down when the last one leaves, so a busy farm costs one watch
+however many devices are open on it. Listener callbacks arrive on Firestore's
+watch thread and are handed to each subscriber's event loop.
+
+A subscriber that falls CHAT_STREAM_QUEUE events behind is cut off with an
+overflow flag instead of buffering without bound; the client then catches up
+with a `since` fetch and reconnects.
+"""
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.watch import ChangeType
+from core.config import settings
+from db.firestore_client import get_sync_db
+
+EVENT_TYPES = {ChangeType.ADDED: "added", ChangeType.MODIFIED: "modified", ChangeType.REMOVED: "removed"}
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.CHAT_STREAM_QUEUE)
+        self.overflowed = False
+
+    def _deliver(self, event: tuple):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # Wake the reader so it notices the overflow at once
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def next_event(self, timeout: float) -> Optional[tuple]:
+        """The next (type, snapshot) event, or None on timeout or overflow."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class _FarmFeed:
+    __slots__ = ("subscribers", "watch")
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self.watch = None
+
+
+class ChatHub:
+    def __init__(self):
+        self._feeds: Dict[str, _FarmFeed] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, farm_id: str) -> Subscriber:
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            feed = self._feeds.get(farm_id)
+            start = feed is None
+            if start:
+                feed = self._feeds[farm_id] = _FarmFeed()
+            feed.subscribers.add(subscriber)
+        if start:
+            watch = self._watch(farm_id, feed)
+            with self._lock:
+                feed.watch = watch
+                # Everyone may have left while the listener was starting
+                orphaned = self._feeds.get(farm_id) is not feed
+            if orphaned:
+                watch.unsubscribe()
+        return subscriber
+
+    def unsubscribe(self, farm_id: str, subscriber: Subscriber):
+        with self._lock:
+            feed = self._feeds.get(farm_id)
+            if feed is None:
+                return
+            feed.subscribers.discard(subscriber)
+            if feed.subscribers:
+                return
+            del self._feeds[farm_id]
+            watch, feed.watch = feed.watch, None
+        if watch is not None:
+            watch.unsubscribe()
+
+    def listeners(self) -> int:
+        with self._lock:
+            return len(self._feeds)
+
+    def _watch(self, farm_id: str, feed: _FarmFeed):
+        # Only messages from now on: history is fetched with `since`, not replayed by the listener
+        query = (get_sync_db().collection('chats')
+                 .where(filter=FieldFilter("farmId", "==", farm_id))
+                 .where(filter=FieldFilter("timestamp", ">=", datetime.now(timezone.utc))))
+
+        def on_change(docs, changes, read_time):
+            events = [(EVENT_TYPES[change.type], change.document) for change in changes]
+            with self._lock:
+                subscribers = list(feed.subscribers)
+            for subscriber in subscribers:
+                for event in events:
+                    subscriber.loop.call_soon_threadsafe(subscriber._deliver, event)
+
+        return query.on_snapshot(on_change)
+
+
+chat_hub = ChatHub()
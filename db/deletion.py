@@ -0,0 +1,259 @@
+"""
+Cascading deletion of farms and users as resumable background jobs.
+
+The DELETE handlers remove the parent document and create a
+deletionJobs/{job_id} document in the same atomic batch. The parent is deleted
+with a last-update-time precondition and the job is created, never overwritten,
+so of several concurrent or retried DELETEs only one commits: the others fail
+with one of CONFLICTS and find the parent gone. The job lists every
+child query to clear as a step: a farm's crops, soil profiles, logs and chats,
+and for a user also their farms, alerts, finance records and profiles. A
+worker thread deletes each step a page at a time through a BulkWriter. Pages
+are paced to DELETION_OPS_PER_SECOND, and after each page the step and
+document count are saved to the job document.
+
+A job is claimed with a lease, using a conditional write, so only one worker
+runs it. Jobs left pending or running, for example after a crash, are picked up
+again at startup, and their lease stops two workers from running the same job.
+Deleting a document twice is harmless, so a resumed page is simply redone.
+
+Deleted farms leave their regional rollups in the same batch that deletes
+them. Their soil tests and crop profiles leave page by page: each such page is
+deleted in one atomic batch together with its rollup delta, so a crash can
+neither lose the delta nor apply it twice. Those steps carry the farm's region
+because the farm is gone by then, and their pages are kept small enough for
+one batch.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from core.config import settings
+from db import rollups, snapshots
+from db.cache import profile_cache
+from db.firestore_client import get_sync_db
+from db.phone_index import index_ref, normalize_phone
+
+COLLECTION = "deletionJobs"
+FARM_CHILDREN = ["crops", "soilProfiles", "logs", "chats"]
+USER_CHILDREN = ["farms", "alerts", "finance", "resources", "challenges"]
+# A deletion batch fails with these when the parent changed or was deleted since it was read
+CONFLICTS = (AlreadyExists, FailedPrecondition, NotFound)
+BATCH_WRITES = 500  # most writes Firestore accepts in one batch
+
+_executor = None
+_running = set()
+_lock = threading.Lock()
+
+
+class _Leased(Exception):
+    """The job is being run by another worker until `until`."""
+
+    def __init__(self, until: datetime):
+        self.until = until
+
+
+def job_id(kind: str, target_id: str) -> str:
+    return f"{kind}-{target_id}"
+
+
+def farm_steps(farm_id: str, region: Optional[dict] = None) -> List[dict]:
+    steps = [{"collection": c, "field": "farmId", "value": farm_id} for c in FARM_CHILDREN]
+    for step in steps:
+        if region and step["collection"] in rollups.CONTRIBUTIONS:
+            step["region"] = region
+    return steps
+
+
+def _new_job(kind: str, target_id: str, steps: List[dict]) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "kind": kind, "targetId": target_id, "status": "pending", "steps": steps,
+        "step": 0, "cursor": None, "deleted": 0, "error": None,
+        "leaseUntil": None, "createdAt": now, "updatedAt": now,
+    }
+
+
+def farm_deletion(db, farm_doc) -> tuple:
+    """Returns (batch, job_ref, job): a batch that deletes the farm and records its deletion job."""
+    farm = farm_doc.to_dict()
+    region = rollups.region_of(farm)
+    job_ref = db.collection(COLLECTION).document(job_id("farm", farm_doc.id))
+    job = _new_job("farm", farm_doc.id, farm_steps(farm_doc.id, region))
+    batch = db.batch()
+    batch.delete(farm_doc.reference, option=db.write_option(last_update_time=farm_doc.update_time))
+    rollups.write_batch(db, [(region, rollups.combine(rollups.farm_contribution(farm), sign=-1))], batch)
+    batch.create(job_ref, job)
+    return batch, job_ref, job
+
+
+def user_deletion(db, user_doc, farm_docs: list) -> tuple:
+    """
+    Like farm_deletion, for a user, their phone index entry, their snapshot and
+    everything they own. `farm_docs` are the user's farms, read with
+    rollups.FIELDS["farms"].
+    """
+    user_ref, phone = user_doc.reference, user_doc.to_dict().get('phone')
+    job_ref = db.collection(COLLECTION).document(job_id("user", user_ref.id))
+    regions = {doc.id: rollups.region_of(doc.to_dict()) for doc in farm_docs}
+    steps = [step for farm_id, region in regions.items() for step in farm_steps(farm_id, region)]
+    steps += [{"collection": c, "field": "userId", "value": user_ref.id} for c in USER_CHILDREN]
+    job = _new_job("user", user_ref.id, steps)
+    batch = db.batch()
+    batch.delete(user_ref, option=db.write_option(last_update_time=user_doc.update_time))
+    batch.delete(snapshots.snapshot_ref(db, user_ref.id))
+    if phone:
+        batch.delete(index_ref(db, normalize_phone(phone)))
+    batch.create(job_ref, job)
+    # The farms themselves go in a later step, but they leave the rollups now
+    farm_changes = [(regions[doc.id], rollups.combine(rollups.farm_contribution(doc.to_dict()), sign=-1)) for doc in farm_docs]
+    rollups.write_batch(db, farm_changes, batch)
+    return batch, job_ref, job
+
+
+# --- Worker ---
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.DELETION_WORKERS, thread_name_prefix="deletion")
+    return _executor
+
+
+def submit(job_id: str):
+    with _lock:
+        if job_id in _running:
+            return
+        _running.add(job_id)
+    _get_executor().submit(_run_guarded, job_id)
+
+
+def resume_jobs():
+    """Resubmits every job that has not finished; called at startup."""
+    def scan():
+        query = get_sync_db().collection(COLLECTION).where(filter=FieldFilter("status", "in", ["pending", "running"]))
+        for doc in query.select(["status"]).stream():
+            submit(doc.id)
+
+    _get_executor().submit(scan)
+
+
+def shutdown_deletion_workers():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _run_guarded(job_id: str):
+    retry_in = None
+    try:
+        run_job(get_sync_db(), job_id)
+    except _Leased as e:
+        # Check back once the lease runs out, in case its holder died
+        retry_in = max(1.0, (e.until - datetime.now(timezone.utc)).total_seconds())
+    except Exception as e:
+        print(f"Deletion job {job_id} failed: {e}")
+        try:
+            get_sync_db().collection(COLLECTION).document(job_id).update(
+                {"status": "failed", "error": str(e), "leaseUntil": None, "updatedAt": datetime.now(timezone.utc)}
+            )
+        except Exception:
+            pass
+    finally:
+        with _lock:
+            _running.discard(job_id)
+    if retry_in is not None:
+        timer = threading.Timer(retry_in, submit, [job_id])
+        timer.daemon = True
+        timer.start()
+
+
+def _claim(db, job_ref):
+    """Takes the job's lease and returns the job, or None if it is gone or finished."""
+    snapshot = job_ref.get()
+    if not snapshot.exists:
+        return None
+    job = snapshot.to_dict()
+    now = datetime.now(timezone.utc)
+    if job["status"] not in ("pending", "running"):
+        return None
+    if job.get("leaseUntil") and job["leaseUntil"] > now:
+        raise _Leased(job["leaseUntil"])
+    try:
+        job_ref.update(
+            {"status": "running", "leaseUntil": now + timedelta(seconds=settings.DELETION_LEASE_SECONDS), "updatedAt": now},
+            option=db.write_option(last_update_time=snapshot.update_time),
+        )
+    except (FailedPrecondition, NotFound):
+        return None
+    return job
+
+
+def _page_size(step: dict) -> int:
+    if step.get("region"):
+        # The page's deletes and its rollup writes share one batch
+        return min(settings.DELETION_PAGE_SIZE, BATCH_WRITES - len(rollups.LEVELS))
+    return settings.DELETION_PAGE_SIZE
+
+
+def _delete_page(db, step: dict, cursor: Optional[str]) -> List[str]:
+    region = step.get("region")
+    query = (db.collection(step["collection"])
+             .where(filter=FieldFilter(step["field"], "==", step["value"]))
+             .order_by(FieldPath.document_id())
+             .select(rollups.FIELDS[step["collection"]] if region else []))
+    if cursor:
+        query = query.start_after([cursor])
+    docs = list(query.limit(_page_size(step)).stream())
+    if not docs:
+        return []
+    if region:
+        # Atomic with the deletes: a redone page finds nothing left to subtract
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        contribute = rollups.CONTRIBUTIONS[step["collection"]]
+        rollups.write_batch(db, [(region, rollups.combine(*(contribute(doc.to_dict()) for doc in docs), sign=-1))], batch)
+        batch.commit()
+    else:
+        writer = db.bulk_writer()
+        for doc in docs:
+            writer.delete(doc.reference)
+        writer.close()
+    for doc in docs:
+        profile_cache.invalidate(step["collection"], doc.id)
+    return [doc.id for doc in docs]
+
+
+def run_job(db, job_id: str):
+    job_ref = db.collection(COLLECTION).document(job_id)
+    job = _claim(db, job_ref)
+    if job is None:
+        return
+    steps, step, cursor, deleted = job["steps"], job["step"], job.get("cursor"), job["deleted"]
+    while step < len(steps):
+        started = time.monotonic()
+        ids = _delete_page(db, steps[step], cursor)
+        deleted += len(ids)
+        if len(ids) < _page_size(steps[step]):
+            step, cursor = step + 1, None
+        else:
+            cursor = ids[-1]
+        now = datetime.now(timezone.utc)
+        # Checkpoint and renew the lease together, so a resumed job redoes at most one page
+        job_ref.update({
+            "step": step, "cursor": cursor, "deleted": deleted, "updatedAt": now,
+            "leaseUntil": now + timedelta(seconds=settings.DELETION_LEASE_SECONDS),
+        })
+        # Pace pages so a large cascade does not crowd out live traffic
+        pause = len(ids) / settings.DELETION_OPS_PER_SECOND - (time.monotonic() - started)
+        if pause > 0:
+            time.sleep(pause)
+    # The farm and its children have left the rollups; drop the entries that are down to zero
+    rollups.tidy(db, [s["region"] for s in steps if s.get("region")])
+    job_ref.update({"status": "done", "leaseUntil": None, "updatedAt": datetime.now(timezone.utc)})
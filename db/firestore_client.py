@@ -1,14 +1,64 @@
-import firebase_admin
-from firebase_admin import firestore
+import threading
+from typing import Union
+from google.cloud.firestore_v1.async_client import AsyncClient
+from google.cloud.firestore_v1.client import Client
+from core.config import settings
+from db.sqlite_client import SQLiteClient
+
+# Any of these clients can back the API; handlers go through db.aio so they work with all.
+FirestoreClient = Union[AsyncClient, Client, SQLiteClient]
 
 db = None
+sync_db = None
+_lock = threading.Lock()
 
 def initialize_firestore():
     global db
+    # firebase_admin is only imported once a client is actually needed
+    import firebase_admin
+    from firebase_admin import firestore, firestore_async
     if not firebase_admin._apps:
         firebase_admin.initialize_app()
-    db = firestore.client()
-    print("✅ Firestore initialized successfully.")
+    if is_async():
+        db = firestore_async.client()
+    else:
+        db = firestore.client()
+    print(f"✅ Firestore initialized successfully ({settings.FIRESTORE_CLIENT} client).")
+
+def initialize_sqlite():
+    global db
+    db = SQLiteClient(settings.SQLITE_PATH)
+    print(f"✅ SQLite initialized successfully ({settings.SQLITE_PATH}).")
+
+def initialize_storage():
+    if settings.STORAGE_BACKEND == "sqlite":
+        initialize_sqlite()
+    else:
+        initialize_firestore()
 
 def get_db():
-    return db
\ No newline at end of file
+    """The shared client, created on first use (by the startup warm-up, or else the first request)."""
+    if db is None:
+        with _lock:
+            if db is None:
+                initialize_storage()
+    return db
+
+def is_async():
+    return settings.STORAGE_BACKEND != "sqlite" and settings.FIRESTORE_CLIENT == "async"
+
+def get_sync_db():
+    """
+    Blocking client for scripts and background work that the AsyncClient does not
+    cover (bulk writers, snapshot listeners). Shares the async client's app.
+    """
+    global sync_db
+    if not is_async():
+        return get_db()
+    if sync_db is None:
+        get_db()  # initializes the app
+        with _lock:
+            if sync_db is None:
+                from firebase_admin import firestore
+                sync_db = firestore.client()
+    return sync_db
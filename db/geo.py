@@ -0,0 +1,82 @@
+"""
+Proximity queries over activity logs.
+
+Logs with a geoLocation also store its geohash, set by the create, update and
+batch handlers (scripts/backfill_log_geohash.py covers older logs). A nearby
+query covers the search area with at most GEO_COVER_CELLS geohash prefixes,
+runs one range query per prefix concurrently, and keeps only the logs that
+are really inside the radius or box.
+
+Each range query runs newest first, filtered to the time window, and is read
+page by page until it has found `limit` logs inside the area or the window runs
+out. Cells overhang the area, so a cell may have to read past many logs from
+outside it, but it never stops short of logs that are inside. The overall
+newest `limit` are then taken from the merged cells.
+
+Only GEO_MAX_SCAN logs are read per cell, which bounds a query without a time
+window over a busy area. A cell that hits that ceiling first may have more
+matches, so the result is then reported as truncated, and the API sets
+X-Results-Truncated.
+
+The range queries need a composite index on (geohash, timestamp descending).
+Filtering on an activity type needs one on (activityType, geohash, timestamp
+descending) instead.
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+from google.cloud.firestore_v1.base_query import FieldFilter
+from core import geohash
+from core.config import settings
+from db import aio
+
+TRUNCATED_HEADER = "X-Results-Truncated"
+
+# Sort key for a log without a timestamp
+OLDEST = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def with_geohash(data: dict) -> dict:
+    """Adds the geohash of data['geoLocation'] (None when it is missing or unusable), if the key is present."""
+    if "geoLocation" in data:
+        point = geohash.coordinates(data["geoLocation"])
+        data["geohash"] = geohash.encode(*point) if point else None
+    return data
+
+
+async def logs_in_area(db, bbox: geohash.BBox, contains: Callable[[float, float], bool], limit: int,
+                       activity_type: Optional[str] = None, since: Optional[datetime] = None) -> Tuple[list, bool]:
+    """
+    (logs, truncated): the newest `limit` logs inside `bbox` for which
+    contains(lat, lng) holds, newest first, and whether a cell stopped at
+    GEO_MAX_SCAN before it ran out of logs or found `limit`.
+    """
+    base = db.collection('logs')
+    if activity_type:
+        base = base.where(filter=FieldFilter("activityType", "==", activity_type))
+    if since is not None:
+        base = base.where(filter=FieldFilter("timestamp", ">=", since))
+
+    async def newest_in_cell(prefix):
+        start, end = geohash.prefix_range(prefix)
+        query = (base.where(filter=FieldFilter("geohash", ">=", start))
+                 .where(filter=FieldFilter("geohash", "<", end))
+                 .order_by("timestamp", direction="DESCENDING")
+                 .limit(settings.GEO_MAX_SCAN))
+        found, scanned = [], 0
+        async for doc in aio.iterate(query, chunk_size=min(limit, 100)):
+            scanned += 1
+            point = geohash.coordinates(doc.to_dict().get("geoLocation"))
+            if point is not None and contains(*point):
+                found.append(doc)
+                if len(found) == limit:
+                    return found, False
+        return found, scanned == settings.GEO_MAX_SCAN
+
+    cells = await asyncio.gather(*(newest_in_cell(p) for p in geohash.cover(bbox, settings.GEO_COVER_CELLS)))
+    found = {doc.id: doc for cell, _ in cells for doc in cell}
+    return sorted(found.values(), key=_timestamp, reverse=True)[:limit], any(truncated for _, truncated in cells)
+
+
+def _timestamp(doc) -> datetime:
+    return doc.to_dict().get("timestamp") or OLDEST
@@ -0,0 +1,23 @@
+"""
+phoneIndex/{phone} documents map a phone number to its user id.
+
+The index entry is created in the same atomic batch as the user, with a create
+precondition, so a duplicate registration fails instead of racing a query. It
+also lets login look the user up with a direct document get.
+
+Request bodies strip the number (schemas.user.Phone), so new user documents
+store exactly the number their entry is keyed by. Numbers read back from older
+user documents go through normalize_phone first.
+"""
+from urllib.parse import quote
+
+COLLECTION = "phoneIndex"
+
+
+def normalize_phone(phone: str) -> str:
+    return phone.strip()
+
+
+def index_ref(db, phone: str):
+    # Document ids cannot contain "/", so the number is percent-encoded
+    return db.collection(COLLECTION).document(quote(phone, safe="+"))
@@ -0,0 +1,279 @@
+"""
+Regional rollups: running totals per state, district and taluka.
+
+Each region has one regionRollups document, so a regional dashboard is a
+single document read instead of a scan of farms, soil profiles and crops:
+- farms and totalFarmArea;
+- irrigation: farms per irrigation method;
+- soilTests and soil: {field: {sum, count}} per nutrient, over every soil test;
+- crops: farms per current crop.
+
+The farm, soil profile and crop write handlers turn each change into a delta,
+the new document's contribution minus the old one's, and add it to the farm's
+state, district and taluka documents with Increment transforms, so concurrent
+writers never overwrite each other's counts. Crop and irrigation counts are
+exact frequency maps: a region only ever sees a few dozen distinct values, so
+there is nothing to gain from an approximate sketch.
+
+Deltas are written just after the document they describe, not atomically with
+it, so a crash in between leaves a region one change off.
+scripts/rebuild_rollups.py recomputes every rollup from the source
+collections.
+
+An increment cannot tell whether a count reached zero, so a change that lowers
+a crop or irrigation count, or a soil field's count, is followed by a tidy. The
+tidy reads the region's documents and deletes the entries that are down to
+zero. A deletion job tidies its farm's regions when it finishes.
+
+With REGION_ROLLUPS_ENABLED off, nothing here reads or writes, and crop and
+soil writes skip the reads the deltas need.
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from core.config import settings
+from core.metrics import run_in_threadpool
+from db import aio
+from db.firestore_client import get_sync_db
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "regionRollups"
+LEVELS = ("state", "district", "taluka")
+SOIL_FIELDS = ["soilPH", "nitrogen", "phosphorus", "potassium", "organicCarbon"]
+# Frequency maps whose entries are deleted once their count is back to zero
+COUNT_MAPS = ("irrigation", "crops")
+
+# The fields each source collection contributes, for projected reads
+FIELDS = {
+    "farms": [*LEVELS, "totalFarmArea", "irrigationMethod"],
+    "soilProfiles": ["farmId", *SOIL_FIELDS],
+    "crops": ["currentCrop"],
+}
+
+
+def _label(value) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    # Dots would read as field path separators in a map key
+    return " ".join(value.replace(".", " ").split()) or None
+
+
+def region_of(farm: Optional[dict]) -> dict:
+    return {level: _label((farm or {}).get(level)) for level in LEVELS}
+
+
+def region_docs(region: dict) -> List[Tuple[str, dict]]:
+    """(document id, identifying fields) for each level the region is known down to."""
+    docs, path = [], []
+    for level in LEVELS:
+        if not region.get(level):
+            break
+        path.append(region[level])
+        doc_id = f"{level}:" + "|".join(path).lower().replace("/", "-")
+        docs.append((doc_id, {"level": level, **{l: region[l] for l in LEVELS[:len(path)]}}))
+    return docs
+
+
+def rollup_ref(db, region: dict):
+    docs = region_docs(region)
+    return db.collection(COLLECTION).document(docs[-1][0]) if docs else None
+
+
+# --- Contributions ---
+
+def farm_contribution(farm: dict) -> dict:
+    contribution = {"farms": 1, "totalFarmArea": farm.get("totalFarmArea") or 0}
+    method = _label(farm.get("irrigationMethod"))
+    if method:
+        contribution["irrigation"] = {method.lower(): 1}
+    return contribution
+
+
+def soil_contribution(profile: dict) -> dict:
+    soil = {f: {"sum": profile[f], "count": 1} for f in SOIL_FIELDS if profile.get(f) is not None}
+    return {"soilTests": 1, "soil": soil}
+
+
+def crop_contribution(crop: dict) -> dict:
+    crop_name = _label(crop.get("currentCrop"))
+    return {"crops": {crop_name.lower(): 1}} if crop_name else {}
+
+
+CONTRIBUTIONS = {"farms": farm_contribution, "soilProfiles": soil_contribution, "crops": crop_contribution}
+
+
+def combine(*deltas: dict, sign: int = 1) -> dict:
+    """Sums nested count maps, each multiplied by `sign`."""
+    total: dict = {}
+    for delta in deltas:
+        for key, value in delta.items():
+            if isinstance(value, dict):
+                total[key] = combine(total.get(key, {}), combine(value, sign=sign))
+            else:
+                total[key] = total.get(key, 0) + sign * value
+    return total
+
+
+def difference(new: Optional[dict], old: Optional[dict]) -> dict:
+    return combine(new or {}, combine(old or {}, sign=-1))
+
+
+def prune(delta: dict) -> dict:
+    """Drops zero counts and empty maps; an empty result means nothing changed."""
+    pruned = {}
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            value = prune(value)
+        if value:
+            pruned[key] = value
+    return pruned
+
+
+def _increments(delta: dict) -> dict:
+    return {k: _increments(v) if isinstance(v, dict) else transforms.Increment(v) for k, v in delta.items()}
+
+
+# --- Writes ---
+
+def write_batch(db, changes: Iterable[Tuple[dict, dict]], batch=None):
+    """
+    Adds (region, delta) changes to `batch` (a new one if None), one merged
+    write per rollup document. Returns the batch, or None if nothing changed.
+    """
+    if not settings.REGION_ROLLUPS_ENABLED:
+        return batch
+    by_doc: Dict[str, tuple] = {}
+    for region, delta in changes:
+        for doc_id, fields in region_docs(region):
+            _, total = by_doc.get(doc_id, (fields, {}))
+            by_doc[doc_id] = (fields, combine(total, delta))
+    for doc_id, (fields, delta) in by_doc.items():
+        delta = prune(delta)
+        if not delta:
+            continue
+        batch = batch or db.batch()
+        data = {**fields, **_increments(delta), "updatedAt": transforms.SERVER_TIMESTAMP}
+        batch.set(db.collection(COLLECTION).document(doc_id), data, merge=True)
+    return batch
+
+
+async def apply(db, changes: List[Tuple[dict, dict]]):
+    batch = write_batch(db, changes)
+    if batch is None:
+        return
+    try:
+        await aio.write(batch.commit)
+        shrunk = [region for region, delta in changes if _shrinks(delta)]
+        if shrunk:
+            await run_in_threadpool(tidy, get_sync_db(), shrunk)
+    except Exception:
+        # The change itself is saved, so the request still succeeds; a missed delta is repaired by the next rebuild
+        logger.exception("Region rollup update failed")
+
+
+async def farm_region(db, farm_id: str) -> dict:
+    if not settings.REGION_ROLLUPS_ENABLED:
+        return {}
+    return region_of((await aio.get(db.collection('farms').document(farm_id))).to_dict())
+
+
+async def farm_children(db, farm_id: str) -> dict:
+    """The combined contribution of a farm's soil tests and crop profile."""
+    soil_query = db.collection('soilProfiles').where(filter=FieldFilter("farmId", "==", farm_id)).select(SOIL_FIELDS)
+    soil_docs, crop_doc = await asyncio.gather(
+        aio.stream(soil_query),
+        aio.get(db.collection('crops').document(farm_id)),
+    )
+    parts = [soil_contribution(doc.to_dict()) for doc in soil_docs]
+    if crop_doc.exists:
+        parts.append(crop_contribution(crop_doc.to_dict()))
+    return combine(*parts)
+
+
+async def farm_changed(db, farm_id: str, before: Optional[dict], after: Optional[dict]):
+    """Applies a farm create or update; a farm that moves region takes its soil tests and crop with it."""
+    if not settings.REGION_ROLLUPS_ENABLED:
+        return
+    old_region, new_region = region_of(before), region_of(after)
+    old = farm_contribution(before) if before else {}
+    new = farm_contribution(after) if after else {}
+    if old_region == new_region:
+        await apply(db, [(new_region, difference(new, old))])
+        return
+    children = await farm_children(db, farm_id) if before else {}
+    await apply(db, [
+        (old_region, combine(old, children, sign=-1)),
+        (new_region, combine(new, children)),
+    ])
+
+
+# --- Zero entries ---
+
+def _shrinks(delta: dict) -> bool:
+    """Whether `delta` lowers a count-map entry or a soil field's count."""
+    lowered = [count for key in COUNT_MAPS for count in (delta.get(key) or {}).values()]
+    lowered += [totals.get("count", 0) for totals in (delta.get("soil") or {}).values()]
+    return any(count < 0 for count in lowered)
+
+
+def emptied(rollup: dict) -> dict:
+    """DELETE_FIELD updates for a rollup's count-map entries and soil fields that are down to zero."""
+    paths = [FieldPath(key, name) for key in COUNT_MAPS for name, count in (rollup.get(key) or {}).items() if count <= 0]
+    paths += [FieldPath("soil", field) for field, totals in (rollup.get("soil") or {}).items() if totals.get("count", 0) <= 0]
+    return {path.to_api_repr(): transforms.DELETE_FIELD for path in paths}
+
+
+def tidy(db, regions: Iterable[dict]):
+    """Deletes the zero entries from the rollup documents of `regions`. Blocking; takes the sync client."""
+    if not settings.REGION_ROLLUPS_ENABLED:
+        return
+    doc_ids = sorted({doc_id for region in regions for doc_id, _ in region_docs(region)})
+    refs = [db.collection(COLLECTION).document(doc_id) for doc_id in doc_ids]
+    for snapshot in (db.get_all(refs) if refs else []):
+        updates = emptied(snapshot.to_dict()) if snapshot.exists else {}
+        if not updates:
+            continue
+        try:
+            # Only if no increment landed since the read, or a count that went back up would be lost
+            snapshot.reference.update(updates, option=db.write_option(last_update_time=snapshot.update_time))
+        except (FailedPrecondition, NotFound):
+            pass  # changed in the meantime; the next tidy or rebuild deletes it
+
+
+# --- Rebuild ---
+
+def rebuild(db, dry_run: bool = False) -> dict:
+    """Recomputes every rollup document from farms, soilProfiles and crops."""
+    regions, changes = {}, []
+    for doc in db.collection('farms').select(FIELDS["farms"]).stream():
+        farm = doc.to_dict()
+        regions[doc.id] = region_of(farm)
+        changes.append((regions[doc.id], farm_contribution(farm)))
+    for collection in ("soilProfiles", "crops"):
+        for doc in db.collection(collection).select(FIELDS[collection]).stream():
+            # Crop profiles share their farm's id
+            region = regions.get(doc.get("farmId") if collection == "soilProfiles" else doc.id)
+            if region is not None:
+                changes.append((region, CONTRIBUTIONS[collection](doc.to_dict())))
+
+    totals: Dict[str, tuple] = {}
+    for region, delta in changes:
+        for doc_id, fields in region_docs(region):
+            _, total = totals.get(doc_id, (fields, {}))
+            totals[doc_id] = (fields, combine(total, delta))
+    stale = [doc.reference for doc in db.collection(COLLECTION).select([]).stream() if doc.id not in totals]
+
+    if not dry_run:
+        writer = db.bulk_writer()
+        for doc_id, (fields, total) in totals.items():
+            data = {**fields, **total, "updatedAt": transforms.SERVER_TIMESTAMP}
+            writer.set(db.collection(COLLECTION).document(doc_id), data)
+        for ref in stale:
+            writer.delete(ref)
+        writer.close()
+    return {"farms": len(regions), "regions": len(totals), "removed": len(stale)}
@@ -0,0 +1,189 @@
+"""
+Loads farm scoring inputs into columns and writes computed scores back.
+
+A full run reads each input collection with one projected query that streams
+through the whole collection, not one read per farm:
+- farms;
+- soilProfiles (the latest test per farm counts);
+- crops (yield and rotation history);
+- resources (storage access, per owner).
+
+An incremental run only reads what changed since the previous run's
+watermark, kept in jobState/farmScoring:
+- farms whose lastUpdated is newer;
+- soil profiles whose lastTestedAt is newer;
+- crop and resource profiles whose updatedAt is newer.
+Only the farms those changes touch are loaded, in batched multi-gets and `in`
+queries, and only they are scored. The watermark is the previous run's start
+minus SCORING_WATERMARK_OVERLAP, so a write that was still landing while that
+run read is picked up. Rescoring a farm twice is harmless.
+
+Without a watermark, e.g. on the first run, the run is a full one. Records
+written before crop and resource profiles carried updatedAt are covered by
+--full. Scores go back through a BulkWriter without touching lastUpdated, so
+writing them does not mark the farm changed again.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
+import numpy as np
+from google.cloud.firestore_v1.base_query import FieldFilter
+from core import scoring
+from core.config import settings
+
+STATE = ("jobState", "farmScoring")
+FARM_FIELDS = ['userId', 'irrigationMethod']
+SOIL_FIELDS = ['farmId', 'soilPH', 'nitrogen', 'phosphorus', 'potassium', 'organicCarbon', 'lastTestedAt']
+CROP_FIELDS = ['yieldHistory', 'cropRotationHistory']
+RESOURCE_FIELDS = ['storageAccess']
+IN_LIMIT = 30  # values per Firestore `in` filter
+
+
+def _numbers(docs: list, field: str) -> np.ndarray:
+    return np.array([np.nan if d is None or d.get(field) is None else float(d[field]) for d in docs], dtype=float)
+
+
+def _chunks(values: List[str], size: int = IN_LIMIT) -> Iterable[List[str]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _where_in(db, collection: str, field: str, values: Iterable[str], fields: List[str]) -> list:
+    docs = []
+    for chunk in _chunks(sorted(set(values))):
+        docs += db.collection(collection).where(filter=FieldFilter(field, "in", chunk)).select(fields).stream()
+    return docs
+
+
+def _newer(db, collection: str, field: str, since: datetime, fields: List[str]) -> list:
+    return list(db.collection(collection).where(filter=FieldFilter(field, ">", since)).select(fields).stream())
+
+
+def changed_farm_ids(db, since: datetime) -> Set[str]:
+    """Farms whose own record, soil tests, crop profile or owner's resource profile changed after `since`."""
+    farm_ids = {doc.id for doc in _newer(db, 'farms', 'lastUpdated', since, [])}
+    farm_ids |= {doc.get('farmId') for doc in _newer(db, 'soilProfiles', 'lastTestedAt', since, ['farmId'])}
+    farm_ids |= {doc.id for doc in _newer(db, 'crops', 'updatedAt', since, [])}  # crop profiles share their farm's id
+    owners = [doc.id for doc in _newer(db, 'resources', 'updatedAt', since, [])]  # and resources their owner's
+    farm_ids |= {doc.id for doc in _where_in(db, 'farms', 'userId', owners, [])}
+    return farm_ids
+
+
+def _existing(docs) -> list:
+    return [doc for doc in docs if doc.exists]
+
+
+def _read_inputs(db, farm_ids: Optional[Set[str]]) -> tuple:
+    """(farms, soil profiles, crop profiles, resource profiles) for `farm_ids`, or for every farm if None."""
+    if farm_ids is None:
+        farms = list(db.collection('farms').select(FARM_FIELDS).stream())
+        soil = db.collection('soilProfiles').select(SOIL_FIELDS).stream()
+        crops = db.collection('crops').select(CROP_FIELDS).stream()
+        resources = db.collection('resources').select(RESOURCE_FIELDS).stream()
+        return farms, soil, crops, resources
+    ids = sorted(farm_ids)
+
+    def get_all(collection, doc_ids, fields):
+        refs = [db.collection(collection).document(doc_id) for doc_id in doc_ids]
+        return _existing(db.get_all(refs, field_paths=fields)) if refs else []
+
+    farms = get_all('farms', ids, FARM_FIELDS)
+    owners = sorted({doc.get('userId') for doc in farms if doc.get('userId')})
+    return (
+        farms,
+        _where_in(db, 'soilProfiles', 'farmId', [doc.id for doc in farms], SOIL_FIELDS),
+        get_all('crops', [doc.id for doc in farms], CROP_FIELDS),
+        get_all('resources', owners, RESOURCE_FIELDS),
+    )
+
+
+def load(db, farm_ids: Optional[Set[str]] = None) -> scoring.FarmColumns:
+    """The scoring columns of `farm_ids`, or of every farm if None."""
+    farms, soil_docs, crop_docs, resource_docs = _read_inputs(db, farm_ids)
+    farms = sorted(farms, key=lambda doc: doc.id)
+    index = {doc.id: i for i, doc in enumerate(farms)}
+
+    soil = [None] * len(farms)
+    soil_tested = [None] * len(farms)
+    for doc in soil_docs:
+        data = doc.to_dict()
+        i = index.get(data.get('farmId'))
+        if i is None:
+            continue
+        tested = data.get('lastTestedAt')
+        if soil[i] is None or (tested and (soil_tested[i] is None or tested > soil_tested[i])):
+            soil[i], soil_tested[i] = data, tested
+
+    histories = [[] for _ in farms]
+    rotation = np.zeros(len(farms))
+    for doc in crop_docs:
+        i = index.get(doc.id)  # crop profiles share their farm's id
+        if i is None:
+            continue
+        data = doc.to_dict()
+        yields = data.get('yieldHistory') or {}
+        seasons = sorted((season for season in yields if yields[season] is not None), key=scoring.season_key)
+        histories[i] = [float(yields[season]) for season in seasons]
+        rotation[i] = len(set(data.get('cropRotationHistory') or []))
+
+    owners: Dict[str, list] = {}
+    for i, doc in enumerate(farms):
+        owners.setdefault(doc.to_dict().get('userId'), []).append(i)
+    storage = np.full(len(farms), np.nan)
+    for doc in resource_docs:
+        owned = owners.get(doc.id, [])  # resource profiles share their owner's id
+        if owned:
+            storage[owned] = scoring.keyword_level(doc.to_dict().get('storageAccess'), scoring.STORAGE_LEVELS)
+
+    lengths = np.array([len(h) for h in histories], dtype=int)
+    return scoring.FarmColumns(
+        farm_ids=[doc.id for doc in farms],
+        soil_ph=_numbers(soil, 'soilPH'),
+        nitrogen=_numbers(soil, 'nitrogen'),
+        phosphorus=_numbers(soil, 'phosphorus'),
+        potassium=_numbers(soil, 'potassium'),
+        organic_carbon=_numbers(soil, 'organicCarbon'),
+        yield_values=np.array([v for h in histories for v in h], dtype=float),
+        yield_offsets=np.r_[0, np.cumsum(lengths)].astype(int),
+        rotation_crops=rotation,
+        irrigation=np.array([
+            scoring.keyword_level(doc.to_dict().get('irrigationMethod'), scoring.IRRIGATION_EFFICIENCY) for doc in farms
+        ]),
+        storage=storage,
+    )
+
+
+def run(db, incremental: bool = True, dry_run: bool = False) -> dict:
+    started_at = datetime.now(timezone.utc)
+    clock = time.perf_counter()
+    state_ref = db.collection(STATE[0]).document(STATE[1])
+    state = state_ref.get()
+    watermark = state.get('watermark') if state.exists else None
+    since = watermark - timedelta(seconds=settings.SCORING_WATERMARK_OVERLAP) if incremental and watermark else None
+    columns = load(db, changed_farm_ids(db, since) if since is not None else None)
+    loaded = time.perf_counter()
+
+    scores = scoring.score(columns)
+    computed = time.perf_counter()
+
+    written = 0
+    if not dry_run:
+        if columns.farm_ids:
+            writer = db.bulk_writer()
+            for i, farm_id in enumerate(columns.farm_ids):
+                update = {name: float(values[i]) for name, values in scores.items() if not np.isnan(values[i])}
+                update['scoredAt'] = started_at
+                writer.update(db.collection('farms').document(farm_id), update)
+                written += 1
+            writer.close()
+        state_ref.set({'watermark': started_at})
+
+    return {
+        "mode": "incremental" if since is not None else "full",
+        "since": since.isoformat() if since is not None else None,
+        "scored": len(columns.farm_ids),
+        "written": written,
+        "load_seconds": round(loaded - clock, 3),
+        "score_seconds": round(computed - loaded, 3),
+        "write_seconds": round(time.perf_counter() - computed, 3),
+    }
@@ -0,0 +1,358 @@
+"""
+User snapshots: one document per user with everything the home screen shows.
+
+userSnapshots/{user_id} is a materialized summary, so the home screen is a
+single document read instead of the deep profile's fan-out over nine
+collections:
+- profile: the user's name and preferred language;
+- farms: keyed by farm id, each farm's location and land details, its current
+  crop and season, its latest soil test, and its SNAPSHOT_RECENT_ITEMS newest
+  activity logs and chat messages;
+- unreadAlerts: the number of unread alerts;
+- version: raised by one on every change, so clients can tell snapshots apart.
+
+The create, update and delete handlers of users, farms, crops, soil profiles,
+logs, chats and alerts fan each change out to the owner's snapshot in a
+background task, which runs once the response has been sent. The hooks never
+raise: a failed snapshot update is logged and left for the rebuild, and never
+changes the outcome of the write. A change reads the snapshot, edits its own part and writes it back
+with a last-update-time precondition, retrying if another change got there
+first, so concurrent writers never lose each other's edits. A snapshot that
+does not exist yet is built from the source collections instead, which already
+include the change.
+
+Farm scores are left out, because the scoring job rewrites them outside the
+API. A snapshot is written after the change it reflects, not atomically with
+it, so a read right after a write can briefly see the previous snapshot. scripts/rebuild_snapshots.py compares
+snapshots with the source collections and rewrites the ones that drifted.
+
+Snapshots are only maintained with USER_SNAPSHOTS_ENABLED. Without it the home
+endpoint builds the summary on every read.
+"""
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+from google.api_core.exceptions import Conflict, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from core.config import settings
+from db import aio
+from db.writes import UPDATE_ATTEMPTS
+
+COLLECTION = "userSnapshots"
+PROFILE_FIELDS = ["fullName", "preferredLanguage"]
+FARM_FIELDS = ["village", "taluka", "district", "state", "totalFarmArea", "soilType", "irrigationMethod", "lastUpdated"]
+CROP_FIELDS = ["currentCrop", "season"]
+SOIL_FIELDS = ["soilPH", "nitrogen", "phosphorus", "potassium", "organicCarbon", "lastTestedAt"]
+# Per farm-scoped collection: the snapshot key of its newest items, and the fields kept per item
+RECENT = {
+    "logs": ("recentLogs", ["activityType", "description", "timestamp"]),
+    "chats": ("recentChats", ["messageType", "messageText", "timestamp"]),
+}
+
+# Maps the current snapshot to field updates, or None when nothing changes
+Change = Callable[[dict], Awaitable[Optional[dict]]]
+
+
+def snapshot_ref(db, user_id: str):
+    return db.collection(COLLECTION).document(user_id)
+
+
+def _pick(data: dict, fields: List[str]) -> dict:
+    return {field: data.get(field) for field in fields}
+
+
+def _farm_path(farm_id: str) -> str:
+    return FieldPath("farms", farm_id).to_api_repr()
+
+
+# --- Entries ---
+
+def farm_entry(farm_id: str, farm: dict) -> dict:
+    return {
+        "id": farm_id, **_pick(farm, FARM_FIELDS), **dict.fromkeys(CROP_FIELDS),
+        "latestSoilTest": None, "recentLogs": [], "recentChats": [],
+    }
+
+
+def soil_entry(profile_id: str, profile: dict) -> dict:
+    return {"id": profile_id, **_pick(profile, SOIL_FIELDS)}
+
+
+def recent_entry(collection: str, doc_id: str, data: dict) -> dict:
+    return {"id": doc_id, **_pick(data, RECENT[collection][1])}
+
+
+def merge_recent(items: List[dict], new_items: List[dict]) -> List[dict]:
+    """The newest SNAPSHOT_RECENT_ITEMS of `items` and `new_items`, newest first; new copies win."""
+    by_id = {item["id"]: item for item in items}
+    by_id.update((item["id"], item) for item in new_items)
+    newest = sorted(by_id.values(), key=lambda item: item["timestamp"], reverse=True)
+    return newest[:settings.SNAPSHOT_RECENT_ITEMS]
+
+
+# --- Building from the source collections ---
+
+def _newest(db, collection: str, farm_id: str, order_field: str, fields: List[str], limit: int):
+    query = (db.collection(collection)
+             .where(filter=FieldFilter("farmId", "==", farm_id))
+             .order_by(order_field, direction="DESCENDING")
+             .limit(limit)
+             .select(fields))
+    return aio.stream(query)
+
+
+def _recent_docs(db, collection: str, farm_id: str):
+    return _newest(db, collection, farm_id, "timestamp", RECENT[collection][1], settings.SNAPSHOT_RECENT_ITEMS)
+
+
+async def build(db, user_id: str) -> Optional[dict]:
+    """A user's snapshot computed from the source collections, or None if the user does not exist."""
+    limiter = asyncio.Semaphore(settings.DEEP_FETCH_CONCURRENCY)
+
+    async def fetch(call):
+        async with limiter:
+            return await call
+
+    unread = (db.collection('alerts')
+              .where(filter=FieldFilter("userId", "==", user_id))
+              .where(filter=FieldFilter("status", "==", "unread"))
+              .count(alias="unread"))
+    farms_query = db.collection('farms').where(filter=FieldFilter("userId", "==", user_id)).select(FARM_FIELDS)
+    user_doc, farm_docs, unread_count = await asyncio.gather(
+        fetch(aio.get(db.collection('users').document(user_id))),
+        fetch(aio.stream(farms_query)),
+        fetch(aio.aggregate(unread)),
+    )
+    if not user_doc.exists:
+        return None
+
+    crop_refs = [db.collection('crops').document(farm_doc.id) for farm_doc in farm_docs]
+    per_farm = [
+        fetch(call)
+        for farm_doc in farm_docs
+        for call in (
+            _newest(db, 'soilProfiles', farm_doc.id, "lastTestedAt", SOIL_FIELDS, 1),
+            _recent_docs(db, 'logs', farm_doc.id),
+            _recent_docs(db, 'chats', farm_doc.id),
+        )
+    ]
+    crop_docs, *farm_children = await asyncio.gather(
+        fetch(aio.get_all(db, crop_refs)) if crop_refs else asyncio.sleep(0, result=[]),
+        *per_farm,
+    )
+    crops = {doc.id: doc.to_dict() for doc in crop_docs if doc.exists}
+
+    farms = {}
+    for index, farm_doc in enumerate(farm_docs):
+        soil_docs, log_docs, chat_docs = farm_children[index * 3:index * 3 + 3]
+        entry = farm_entry(farm_doc.id, farm_doc.to_dict())
+        entry.update(_pick(crops.get(farm_doc.id, {}), CROP_FIELDS))
+        if soil_docs:
+            entry["latestSoilTest"] = soil_entry(soil_docs[0].id, soil_docs[0].to_dict())
+        entry["recentLogs"] = [recent_entry('logs', doc.id, doc.to_dict()) for doc in log_docs]
+        entry["recentChats"] = [recent_entry('chats', doc.id, doc.to_dict()) for doc in chat_docs]
+        farms[farm_doc.id] = entry
+
+    return {
+        "userId": user_id,
+        "profile": _pick(user_doc.to_dict(), PROFILE_FIELDS),
+        "farms": farms,
+        "unreadAlerts": unread_count["unread"],
+    }
+
+
+# --- Writes ---
+
+async def _create(ref, data: dict):
+    await aio.write(ref.create, {**data, "version": 1, "updatedAt": transforms.SERVER_TIMESTAMP})
+
+
+async def _update(db, ref, current, updates: dict):
+    """Writes `updates` only if the snapshot is still the version in `current`."""
+    data = {**updates, "version": transforms.Increment(1), "updatedAt": transforms.SERVER_TIMESTAMP}
+    await aio.write(ref.update, data, option=db.write_option(last_update_time=current.update_time))
+
+
+async def _modify(db, user_id: str, change: Change):
+    """Applies `change` to the user's snapshot, or builds the snapshot if there is none yet."""
+    ref = snapshot_ref(db, user_id)
+    for _ in range(UPDATE_ATTEMPTS):
+        current = await aio.get(ref)
+        try:
+            if not current.exists:
+                data = await build(db, user_id)
+                if data is not None:
+                    await _create(ref, data)
+                return
+            updates = await change(current.to_dict())
+            if updates:
+                await _update(db, ref, current, updates)
+            return
+        except (Conflict, FailedPrecondition, NotFound):
+            continue  # another change got there first; redo it on the new version
+    raise RuntimeError(f"snapshot of user {user_id} kept changing")
+
+
+async def _maintain(db, user_id: Optional[str], change: Change, farm_id: Optional[str] = None):
+    """Runs a write hook: applies `change` to the snapshot of `user_id`, or of `farm_id`'s owner."""
+    if not settings.USER_SNAPSHOTS_ENABLED:
+        return
+    try:
+        if user_id is None:
+            farm_doc = await aio.get(db.collection('farms').document(farm_id), field_paths=["userId"])
+            user_id = farm_doc.get("userId") if farm_doc.exists else None
+        if user_id:
+            await _modify(db, user_id, change)
+    except Exception as e:
+        # The change itself is saved; a stale snapshot is repaired by the next rebuild
+        print(f"User snapshot update failed: {e}")
+
+
+async def _edit_farm(db, farm_id: str, edit: Callable[[dict], dict]):
+    """Applies `edit` to one farm's entry, if the owner's snapshot has the farm."""
+    async def change(snapshot):
+        entry = (snapshot.get("farms") or {}).get(farm_id)
+        if entry is None:
+            return None
+        edited = edit(dict(entry))
+        return {_farm_path(farm_id): edited} if edited != entry else None
+
+    await _maintain(db, None, change, farm_id=farm_id)
+
+
+# --- Write hooks ---
+
+async def user_written(db, user_id: str, user: dict):
+    profile = _pick(user, PROFILE_FIELDS)
+
+    async def change(snapshot):
+        return {"profile": profile} if snapshot.get("profile") != profile else None
+
+    await _maintain(db, user_id, change)
+
+
+async def farm_written(db, user_id: str, farm_id: str, farm: dict):
+    """A farm was created or updated."""
+    async def change(snapshot):
+        entry = (snapshot.get("farms") or {}).get(farm_id) or farm_entry(farm_id, {})
+        edited = {**entry, **_pick(farm, FARM_FIELDS)}
+        return {_farm_path(farm_id): edited} if edited != entry else None
+
+    await _maintain(db, user_id, change)
+
+
+async def farm_removed(db, user_id: str, farm_id: str):
+    async def change(snapshot):
+        return {_farm_path(farm_id): transforms.DELETE_FIELD} if farm_id in (snapshot.get("farms") or {}) else None
+
+    await _maintain(db, user_id, change)
+
+
+async def crop_written(db, farm_id: str, crop: dict):
+    await _edit_farm(db, farm_id, lambda entry: {**entry, **_pick(crop, CROP_FIELDS)})
+
+
+async def soil_written(db, farm_id: str, profile_id: str, profile: dict):
+    """A soil test was created or updated; it replaces the latest one unless that was tested later."""
+    def edit(entry):
+        latest = entry.get("latestSoilTest")
+        if latest is None or latest["id"] == profile_id or latest["lastTestedAt"] <= profile["lastTestedAt"]:
+            entry["latestSoilTest"] = soil_entry(profile_id, profile)
+        return entry
+
+    await _edit_farm(db, farm_id, edit)
+
+
+async def recent_written(db, farm_id: str, collection: str, docs: list):
+    """Logs or chat messages (document snapshots) of a farm were created or updated."""
+    key = RECENT[collection][0]
+    items = [recent_entry(collection, doc.id, doc.to_dict()) for doc in docs]
+    await _edit_farm(db, farm_id, lambda entry: {**entry, key: merge_recent(entry.get(key) or [], items)})
+
+
+async def recent_refreshed(db, farm_id: str, collection: str):
+    """Rereads a farm's newest logs or chat messages, e.g. after a batch created several."""
+    if not settings.USER_SNAPSHOTS_ENABLED:
+        return
+    try:
+        docs = await _recent_docs(db, collection, farm_id)
+    except Exception as e:
+        print(f"User snapshot update failed: {e}")
+        return
+    await recent_written(db, farm_id, collection, docs)
+
+
+def _unread(alert: Optional[dict]) -> int:
+    return int(bool(alert) and alert.get("status") == "unread")
+
+
+async def alert_written(db, user_id: str, before: Optional[dict], after: dict):
+    """An alert was created (`before` is None) or updated."""
+    delta = _unread(after) - _unread(before)
+    if not delta:
+        return
+
+    async def change(snapshot):
+        return {"unreadAlerts": max(0, snapshot.get("unreadAlerts", 0) + delta)}
+
+    await _maintain(db, user_id, change)
+
+
+# --- Reads and repair ---
+
+async def load(db, user_id: str):
+    """The user's snapshot document, built first if it is missing; None if the user does not exist."""
+    ref = snapshot_ref(db, user_id)
+    snapshot_doc = await aio.get(ref)
+    if not snapshot_doc.exists:
+        await repair(db, user_id)
+        snapshot_doc = await aio.get(ref)
+    return snapshot_doc if snapshot_doc.exists else None
+
+
+async def repair(db, user_id: str, dry_run: bool = False) -> str:
+    """
+    Compares a user's snapshot with the source collections and rewrites it if
+    they differ. Returns "built", "repaired", "removed" (the user is gone) or
+    "unchanged"; with dry_run nothing is written.
+    """
+    ref = snapshot_ref(db, user_id)
+    for _ in range(UPDATE_ATTEMPTS):
+        current = await aio.get(ref)
+        data = await build(db, user_id)
+        try:
+            if data is None:
+                if current.exists and not dry_run:
+                    await aio.write(ref.delete)
+                return "removed" if current.exists else "unchanged"
+            if not current.exists:
+                if not dry_run:
+                    await _create(ref, data)
+                return "built"
+            snapshot = current.to_dict()
+            if all(snapshot.get(key) == value for key, value in data.items()):
+                return "unchanged"
+            if not dry_run:
+                await _update(db, ref, current, data)
+            return "repaired"
+        except (Conflict, FailedPrecondition, NotFound):
+            continue
+    raise RuntimeError(f"snapshot of user {user_id} kept changing")
+
+
+async def rebuild(db, user_ids: Optional[List[str]] = None, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Repairs the snapshots of `user_ids`, or of every user plus any snapshot
+    left behind by a deleted user. Users are repaired one at a time, so a
+    full rebuild does not crowd out live traffic.
+    """
+    if user_ids is None:
+        users = [doc.id for doc in await aio.stream(db.collection('users').select([]))]
+        snapshot_ids = [doc.id for doc in await aio.stream(db.collection(COLLECTION).select([]))]
+        user_ids = users + sorted(set(snapshot_ids) - set(users))
+    outcomes = Counter()
+    for user_id in user_ids:
+        outcomes[await repair(db, user_id, dry_run=dry_run)] += 1
+    return {"users": len(user_ids), **{o: outcomes[o] for o in ("built", "repaired", "removed", "unchanged")}}
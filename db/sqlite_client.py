@@ -0,0 +1,752 @@
+"""
+Embedded SQLite storage backend.
+
+SQLiteClient implements the subset of the Firestore client API the app uses:
+collections, document references, filtered/ordered/paginated queries with
+projections, count/sum/avg aggregations, multi-gets, write preconditions, transforms, batches and a bulk
+writer. Routers, db.aio and db.writes therefore run unchanged against it,
+which makes that API the storage abstraction for every collection. Select it
+with STORAGE_BACKEND=sqlite to run the API on an offline edge server or to
+load-test it without cloud access.
+
+Documents of all collections live in one WAL-mode table as JSON. Expression
+indexes cover the fields the app filters and sorts on (userId, farmId, phone
+and the timestamp fields), so lookups stay index-only reads. Every thread gets
+its own connection, and writes run in IMMEDIATE transactions so that
+precondition checks and writes are atomic. Snapshot listeners are supported
+for writes made through the same client, which covers a single-process edge
+deployment.
+"""
+import copy
+import json
+import random
+import re
+import sqlite3
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.aggregation import AggregationResult
+from google.cloud.firestore_v1.base_client import BaseClient
+from google.cloud.firestore_v1.base_document import DocumentSnapshot
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+from google.protobuf.timestamp_pb2 import Timestamp
+
+# Secondary indexes as name -> indexed JSON fields, after the collection column
+INDEXES = {
+    "user": ["userId"],
+    "farm": ["farmId"],
+    "phone": ["phone"],
+    "user_created": ["userId", "createdAt"],
+    "farm_timestamp": ["farmId", "timestamp"],
+    "farm_tested": ["farmId", "lastTestedAt"],
+    "geohash_timestamp": ["geohash", "timestamp"],
+}
+
+# Datetimes are stored as sortable UTC ISO strings behind a noncharacter marker
+_DATETIME_PREFIX = "\ufdd0dt:"
+_SIMPLE_FIELD = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_QUOTED_PART = re.compile(r"`((?:[^`\\]|\\.)*)`|([^.`]+)")
+_PAGE_SIZE = 500
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+
+
+# --- Value encoding ---
+
+def _encode(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return _DATETIME_PREFIX + value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, str) and value.startswith(_DATETIME_PREFIX):
+        return datetime.strptime(value[len(_DATETIME_PREFIX):], "%Y-%m-%dT%H:%M:%S.%f").replace(tzinfo=timezone.utc)
+    if isinstance(value, dict):
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _sql_value(value):
+    """Encodes a filter or cursor value the way json_extract will return the stored one."""
+    value = _encode(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+def _parts(field_path: str) -> List[str]:
+    """Splits a field path, where segments that are not simple names are `quoted`."""
+    if "`" not in field_path:
+        return field_path.split(".")
+    return [plain or quoted.replace("\\`", "`").replace("\\\\", "\\") for quoted, plain in _QUOTED_PART.findall(field_path)]
+
+
+def _child(field_path: str, key: str) -> str:
+    return f"{field_path}.{key}" if _SIMPLE_FIELD.match(key) else f"{field_path}.`" + key.replace("\\", "\\\\").replace("`", "\\`") + "`"
+
+
+def _json_path(field_path: str) -> str:
+    parts = _parts(field_path)
+    return "$." + ".".join(p if _SIMPLE_FIELD.match(p) else '"' + p.replace('"', '\\"') + '"' for p in parts)
+
+
+def _column(field_path: str) -> str:
+    if field_path == "__name__":
+        return "id"
+    return f"json_extract(data, '{_json_path(field_path)}')"
+
+
+def _timestamp(ns: int) -> DatetimeWithNanoseconds:
+    return DatetimeWithNanoseconds.from_timestamp_pb(Timestamp(seconds=ns // 10**9, nanos=ns % 10**9))
+
+
+def _to_ns(value) -> int:
+    if hasattr(value, "timestamp_pb"):
+        ts = value.timestamp_pb()
+        return ts.seconds * 10**9 + ts.nanos
+    if isinstance(value, Timestamp):
+        return value.seconds * 10**9 + value.nanos
+    return int(value.timestamp()) * 10**9 + value.microsecond * 1000
+
+
+def _get_nested(data: dict, field_path: str):
+    for part in _parts(field_path):
+        if not isinstance(data, dict) or part not in data:
+            raise KeyError(field_path)
+        data = data[part]
+    return data
+
+
+def _set_nested(data: dict, field_path: str, value):
+    parts = _parts(field_path)
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = value
+
+
+def _delete_nested(data: dict, field_path: str):
+    parts = _parts(field_path)
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def _apply(data: dict, field_path: str, value, now: datetime):
+    """Writes one field, resolving Firestore sentinels and transforms."""
+    if value is transforms.DELETE_FIELD:
+        _delete_nested(data, field_path)
+    elif value is transforms.SERVER_TIMESTAMP:
+        _set_nested(data, field_path, now)
+    elif isinstance(value, transforms.Increment):
+        try:
+            current = _get_nested(data, field_path)
+        except KeyError:
+            current = 0
+        _set_nested(data, field_path, (current if isinstance(current, (int, float)) else 0) + value.value)
+    elif isinstance(value, transforms.ArrayUnion):
+        try:
+            current = list(_get_nested(data, field_path))
+        except (KeyError, TypeError):
+            current = []
+        _set_nested(data, field_path, current + [v for v in value.values if v not in current])
+    elif isinstance(value, transforms.ArrayRemove):
+        try:
+            current = list(_get_nested(data, field_path))
+        except (KeyError, TypeError):
+            current = []
+        _set_nested(data, field_path, [v for v in current if v not in value.values])
+    elif isinstance(value, dict):
+        _set_nested(data, field_path, {})
+        for key, nested in value.items():
+            _apply(data, _child(field_path, key), nested, now)
+    else:
+        _set_nested(data, field_path, copy.deepcopy(value))
+
+
+def _merge(target: dict, source: dict, now: datetime):
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value, now)
+        else:
+            _apply(target, key, value, now)
+
+
+# --- Results ---
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class _Operation:
+    def __init__(self, kind: str, reference, data=None, option=None, merge=False):
+        self.kind = kind
+        self.reference = reference
+        self.data = data
+        self.option = option
+        self.merge = merge
+        self.attempts = 0
+
+
+class BulkWriteFailure:
+    def __init__(self, operation: _Operation, code: int, message: str):
+        self.operation = operation
+        self.code = code
+        self.message = message
+
+    @property
+    def attempts(self) -> int:
+        return self.operation.attempts
+
+
+# gRPC status codes reported to bulk writer error callbacks
+_ERROR_CODES = {AlreadyExists: 6, NotFound: 5, FailedPrecondition: 9}
+
+
+class Watch:
+    """
+    In-process snapshot listener. The query is re-run after every commit that
+    touches its collection (or its document, for document listeners) and the
+    callback gets the same (docs, changes, read_time) arguments as Firestore's.
+    """
+
+    def __init__(self, client: "SQLiteClient", collection: str, path: Optional[str], run, callback):
+        self._client = client
+        self.collection = collection
+        self.path = path
+        self._run = run
+        self._callback = callback
+        self._previous: Dict[str, tuple] = {}
+        self._delivered = False
+        self._lock = threading.Lock()
+        self.active = True
+
+    def unsubscribe(self):
+        self.active = False
+        self._client._remove_watch(self)
+
+    def _refresh(self):
+        with self._lock:
+            if not self.active:
+                return
+            docs = self._run()
+            current = {doc.id: (index, doc) for index, doc in enumerate(docs)}
+            changes = []
+            for doc_id, (old_index, old) in self._previous.items():
+                if doc_id not in current:
+                    changes.append(DocumentChange(ChangeType.REMOVED, old, old_index, -1))
+            for doc_id, (new_index, doc) in current.items():
+                previous = self._previous.get(doc_id)
+                if previous is None:
+                    changes.append(DocumentChange(ChangeType.ADDED, doc, -1, new_index))
+                elif previous[1].update_time != doc.update_time:
+                    changes.append(DocumentChange(ChangeType.MODIFIED, doc, previous[0], new_index))
+            self._previous = current
+            # The first callback carries the initial state, even when it is empty
+            if changes or not self._delivered:
+                self._delivered = True
+                self._callback(docs, changes, _timestamp(self._client._now_ns()))
+
+
+# --- References and queries ---
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client: "SQLiteClient", collection: str, filters=(), orders=(), limit=None,
+                 cursor=None, projection=None):
+        self._client = client
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+        self._projection = projection
+
+    def _copy(self, **changes) -> "Query":
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                     cursor=self._cursor, projection=self._projection)
+        state.update(changes)
+        return Query(self._client, self._collection, **state)
+
+    def where(self, field_path: str = None, op_string: str = None, value=None, *, filter=None) -> "Query":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "Query":
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "Query":
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields) -> "Query":
+        return self._copy(cursor=document_fields)
+
+    def select(self, field_paths: Iterable[str]) -> "Query":
+        return self._copy(projection=list(field_paths))
+
+    def stream(self, transaction=None):
+        """Yields matching documents, fetching them a page at a time."""
+        orders = self._effective_orders()
+        cursor = self._cursor_values(self._cursor, orders)
+        remaining = self._limit
+        while remaining is None or remaining > 0:
+            page_size = _PAGE_SIZE if remaining is None else min(_PAGE_SIZE, remaining)
+            rows = self._client._query(self._collection, self._filters, orders, cursor, page_size)
+            for row in rows:
+                yield self._client._snapshot(self._collection, row, self._projection)
+            if len(rows) < page_size:
+                return
+            if remaining is not None:
+                remaining -= len(rows)
+            last = rows[-1]
+            last_data = _decode(json.loads(last[1]))
+            cursor = [last[0] if field == "__name__" else _get_nested(last_data, field) for field, _ in orders]
+
+    def get(self, transaction=None) -> List[DocumentSnapshot]:
+        return list(self.stream())
+
+    def on_snapshot(self, callback) -> Watch:
+        return self._client._add_watch(Watch(self._client, self._collection, None, self.get, callback))
+
+    def count(self, alias: Optional[str] = None) -> "AggregationQuery":
+        return AggregationQuery(self).count(alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "AggregationQuery":
+        return AggregationQuery(self).sum(field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "AggregationQuery":
+        return AggregationQuery(self).avg(field_ref, alias)
+
+    def _effective_orders(self):
+        orders = list(self._orders)
+        if not any(field == "__name__" for field, _ in orders):
+            orders.append(("__name__", orders[-1][1] if orders else self.ASCENDING))
+        return orders
+
+    def _cursor_values(self, cursor, orders):
+        if cursor is None:
+            return None
+        if isinstance(cursor, DocumentSnapshot):
+            data = cursor.to_dict() or {}
+            return [cursor.id if field == "__name__" else _get_nested(data, field) for field, _ in orders]
+        if isinstance(cursor, dict):
+            return [cursor[field] for field, _ in orders if field in cursor]
+        values = list(cursor)
+        # Firestore accepts a reference or a plain id for the document-id position
+        return [v.id if isinstance(v, DocumentReference) else v for v in values]
+
+
+class AggregationQuery:
+    """count/sum/avg over a query's matches, computed in SQL like Firestore's aggregation queries."""
+
+    def __init__(self, query: Query):
+        self._query = query
+        self._aggregations = []
+
+    def _add(self, kind: str, field, alias):
+        alias = alias or f"field_{len(self._aggregations) + 1}"
+        self._aggregations.append((alias, kind, field))
+        return self
+
+    def count(self, alias: Optional[str] = None) -> "AggregationQuery":
+        return self._add("count", None, alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "AggregationQuery":
+        return self._add("sum", str(field_ref), alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "AggregationQuery":
+        return self._add("avg", str(field_ref), alias)
+
+    def get(self, transaction=None, **kwargs) -> List[List[AggregationResult]]:
+        query = self._query
+        return query._client._aggregate(query._collection, query._filters, self._aggregations)
+
+
+class CollectionReference(Query):
+    def __init__(self, client: "SQLiteClient", collection: str):
+        super().__init__(client, collection)
+        self.id = collection
+
+    def document(self, document_id: Optional[str] = None) -> "DocumentReference":
+        if document_id is None:
+            document_id = "".join(random.choices(_AUTO_ID_CHARS, k=20))
+        return DocumentReference(self._client, self._collection, document_id)
+
+    def add(self, document_data: dict, document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        result = ref.create(document_data)
+        return result.update_time, ref
+
+
+class DocumentReference:
+    def __init__(self, client: "SQLiteClient", collection: str, document_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection}/{self.id}"
+
+    @property
+    def parent(self) -> CollectionReference:
+        return CollectionReference(self._client, self._collection)
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def get(self, field_paths=None, transaction=None) -> DocumentSnapshot:
+        return next(iter(self._client.get_all([self], field_paths)))
+
+    def create(self, document_data: dict) -> WriteResult:
+        return self._client._commit([_Operation("create", self, document_data)])[0]
+
+    def on_snapshot(self, callback) -> Watch:
+        def run():
+            return [doc for doc in self._client.get_all([self]) if doc.exists]
+
+        return self._client._add_watch(Watch(self._client, self._collection, self.path, run, callback))
+
+    def set(self, document_data: dict, merge: bool = False) -> WriteResult:
+        return self._client._commit([_Operation("set", self, document_data, merge=merge)])[0]
+
+    def update(self, field_updates: dict, option=None) -> WriteResult:
+        return self._client._commit([_Operation("update", self, field_updates, option)])[0]
+
+    def delete(self, option=None) -> WriteResult:
+        return self._client._commit([_Operation("delete", self, option=option)])[0]
+
+
+class WriteBatch:
+    """Atomic group of writes, committed in a single SQLite transaction."""
+
+    def __init__(self, client: "SQLiteClient"):
+        self._client = client
+        self._operations: List[_Operation] = []
+
+    def create(self, reference, document_data):
+        self._operations.append(_Operation("create", reference, document_data))
+
+    def set(self, reference, document_data, merge=False):
+        self._operations.append(_Operation("set", reference, document_data, merge=merge))
+
+    def update(self, reference, field_updates, option=None):
+        self._operations.append(_Operation("update", reference, field_updates, option))
+
+    def delete(self, reference, option=None):
+        self._operations.append(_Operation("delete", reference, option=option))
+
+    def commit(self) -> List[WriteResult]:
+        operations, self._operations = self._operations, []
+        return self._client._commit(operations)
+
+
+class BulkWriter(WriteBatch):
+    """
+    Non-atomic writer with per-operation callbacks, mirroring Firestore's
+    BulkWriter. Operations are applied in order when flushed.
+    """
+
+    def __init__(self, client: "SQLiteClient"):
+        super().__init__(client)
+        self._on_result = lambda reference, result, writer: None
+        self._on_error = lambda failure, writer: False
+
+    def on_write_result(self, callback):
+        self._on_result = callback
+
+    def on_write_error(self, callback):
+        self._on_error = callback
+
+    def flush(self):
+        operations, self._operations = self._operations, []
+        for operation in operations:
+            while True:
+                operation.attempts += 1
+                try:
+                    result = self._client._commit([operation])[0]
+                except (AlreadyExists, NotFound, FailedPrecondition) as e:
+                    failure = BulkWriteFailure(operation, _ERROR_CODES[type(e)], str(e))
+                    if self._on_error(failure, self):
+                        continue
+                    break
+                self._on_result(operation.reference, result, self)
+                break
+
+    def close(self):
+        self.flush()
+
+
+# --- Client ---
+
+class SQLiteClient:
+    write_option = staticmethod(BaseClient.write_option)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._clock_lock = threading.Lock()
+        self._last_ns = 0
+        self._watches: List[Watch] = []
+        self._watch_lock = threading.Lock()
+        # Listener callbacks are delivered in commit order on one background thread
+        self._notifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-watch")
+        conn = self._connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                collection TEXT NOT NULL,
+                id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                create_time INTEGER NOT NULL,
+                update_time INTEGER NOT NULL,
+                PRIMARY KEY (collection, id)
+            ) WITHOUT ROWID;
+        """)
+        for name, fields in INDEXES.items():
+            columns = ", ".join(["collection"] + [_column(field) for field in fields])
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{name} ON documents ({columns})")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _now_ns(self) -> int:
+        # Strictly increasing, so every write yields a distinct update time
+        with self._clock_lock:
+            self._last_ns = max(time.time_ns(), self._last_ns + 1000)
+            return self._last_ns
+
+    # Firestore client surface
+
+    def collection(self, collection_path: str) -> CollectionReference:
+        return CollectionReference(self, collection_path)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        refs = list(references)
+        conn = self._connection()
+        found = {}
+        for collection in {ref._collection for ref in refs}:
+            ids = [ref.id for ref in refs if ref._collection == collection]
+            for start in range(0, len(ids), _PAGE_SIZE):
+                chunk = ids[start:start + _PAGE_SIZE]
+                rows = conn.execute(
+                    f"SELECT id, data, create_time, update_time FROM documents "
+                    f"WHERE collection = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [collection, *chunk],
+                ).fetchall()
+                for row in rows:
+                    found[(collection, row[0])] = row
+        read_time = _timestamp(self._now_ns())
+        for ref in refs:
+            row = found.get((ref._collection, ref.id))
+            if row is None:
+                yield DocumentSnapshot(ref, None, exists=False, read_time=read_time, create_time=None, update_time=None)
+            else:
+                yield self._snapshot(ref._collection, row, field_paths)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def bulk_writer(self, options=None) -> BulkWriter:
+        return BulkWriter(self)
+
+    def close(self):
+        self._notifier.shutdown(wait=False)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # Internals
+
+    def _snapshot(self, collection: str, row, projection=None) -> DocumentSnapshot:
+        doc_id, data, create_ns, update_ns = row
+        data = _decode(json.loads(data))
+        if projection is not None:
+            projected = {}
+            for field in projection:
+                try:
+                    _set_nested(projected, field, _get_nested(data, field))
+                except KeyError:
+                    pass
+            data = projected
+        return DocumentSnapshot(
+            DocumentReference(self, collection, doc_id), data, exists=True,
+            read_time=_timestamp(update_ns), create_time=_timestamp(create_ns), update_time=_timestamp(update_ns),
+        )
+
+    def _aggregate(self, collection, filters, aggregations) -> list:
+        clauses, params = self._where(collection, filters)
+        columns = []
+        for alias, kind, field in aggregations:
+            if kind == "count":
+                columns.append("COUNT(*)")
+                continue
+            # Like Firestore, sum and avg only take numeric values into account
+            numeric = (f"CASE WHEN json_type(data, '{_json_path(field)}') IN ('integer', 'real') "
+                       f"THEN {_column(field)} END")
+            columns.append(f"COALESCE(SUM({numeric}), 0)" if kind == "sum" else f"AVG({numeric})")
+        row = self._connection().execute(
+            f"SELECT {', '.join(columns)} FROM documents WHERE {' AND '.join(clauses)}", params
+        ).fetchone()
+        read_time = _timestamp(self._now_ns())
+        return [[AggregationResult(alias, value, read_time) for (alias, _, _), value in zip(aggregations, row)]]
+
+    def _where(self, collection, filters) -> tuple:
+        clauses, params = ["collection = ?"], [collection]
+        for field, op, value in filters:
+            column = _column(field)
+            if not isinstance(op, str) or value is None:
+                negate = (isinstance(op, str) and op == "!=") or "NOT" in str(op)
+                clauses.append(f"{column} IS {'NOT ' if negate else ''}NULL")
+            elif op in ("==", "<", "<=", ">", ">="):
+                clauses.append(f"{column} {'=' if op == '==' else op} ?")
+                params.append(_sql_value(value))
+            elif op == "!=":
+                clauses.append(f"{column} IS NOT NULL AND {column} != ?")
+                params.append(_sql_value(value))
+            elif op in ("in", "not-in"):
+                values = [_sql_value(v) for v in value]
+                negate = "NOT " if op == "not-in" else ""
+                clauses.append(f"{column} IS NOT NULL AND {column} {negate}IN ({','.join('?' * len(values))})")
+                params.extend(values)
+            elif op in ("array_contains", "array_contains_any"):
+                values = [_sql_value(v) for v in (value if op == "array_contains_any" else [value])]
+                clauses.append(
+                    f"EXISTS (SELECT 1 FROM json_each(data, '{_json_path(field)}') "
+                    f"WHERE value IN ({','.join('?' * len(values))}))"
+                )
+                params.extend(values)
+            else:
+                raise ValueError(f"Unsupported operator {op!r}")
+        return clauses, params
+
+    def _query(self, collection, filters, orders, cursor, limit) -> list:
+        clauses, params = self._where(collection, filters)
+
+        # Like Firestore, ordering on a field excludes documents that lack it
+        for field, _ in orders:
+            if field != "__name__":
+                clauses.append(f"{_column(field)} IS NOT NULL")
+
+        if cursor:
+            # (a, b) strictly after (x, y), honouring each field's direction
+            alternatives = []
+            for index, (field, direction) in enumerate(orders[:len(cursor)]):
+                parts = [f"{_column(f)} = ?" for f, _ in orders[:index]]
+                op = "<" if direction == Query.DESCENDING else ">"
+                parts.append(f"{_column(field)} {op} ?")
+                alternatives.append("(" + " AND ".join(parts) + ")")
+                params.extend(_sql_value(v) for v in cursor[:index + 1])
+            clauses.append("(" + " OR ".join(alternatives) + ")")
+
+        order_sql = ", ".join(
+            f"{_column(field)} {'DESC' if direction == Query.DESCENDING else 'ASC'}" for field, direction in orders
+        )
+        sql = (f"SELECT id, data, create_time, update_time FROM documents WHERE {' AND '.join(clauses)} "
+               f"ORDER BY {order_sql} LIMIT ?")
+        return self._connection().execute(sql, [*params, limit]).fetchall()
+
+    def _commit(self, operations: List[_Operation]) -> List[WriteResult]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = [self._write(conn, operation) for operation in operations]
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        if self._watches:
+            self._notify(operations)
+        return results
+
+    def _add_watch(self, watch: Watch) -> Watch:
+        with self._watch_lock:
+            self._watches.append(watch)
+        self._notifier.submit(watch._refresh)
+        return watch
+
+    def _remove_watch(self, watch: Watch):
+        with self._watch_lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self, operations: List[_Operation]):
+        collections = {op.reference._collection for op in operations}
+        paths = {op.reference.path for op in operations}
+        with self._watch_lock:
+            affected = [w for w in self._watches if w.collection in collections and (w.path is None or w.path in paths)]
+        for watch in affected:
+            self._notifier.submit(watch._refresh)
+
+    def _write(self, conn, operation: _Operation) -> WriteResult:
+        ref = operation.reference
+        key = (ref._collection, ref.id)
+        row = conn.execute(
+            "SELECT data, create_time, update_time FROM documents WHERE collection = ? AND id = ?", key
+        ).fetchone()
+        option = operation.option
+        if option is not None and hasattr(option, "_last_update_time"):
+            if row is None:
+                raise NotFound(f"No document to update: {ref.path}")
+            if row[2] != _to_ns(option._last_update_time):
+                raise FailedPrecondition(f"Document {ref.path} was updated since the given time")
+        elif option is not None and hasattr(option, "_exists"):
+            if bool(row) != bool(option._exists):
+                raise (NotFound if option._exists else AlreadyExists)(f"Precondition failed for {ref.path}")
+
+        now_ns = self._now_ns()
+        now = _timestamp(now_ns)
+        if operation.kind == "delete":
+            conn.execute("DELETE FROM documents WHERE collection = ? AND id = ?", key)
+            return WriteResult(now)
+
+        if operation.kind == "create":
+            if row is not None:
+                raise AlreadyExists(f"Document already exists: {ref.path}")
+            data = {}
+            _merge(data, operation.data, now)
+        elif operation.kind == "set":
+            data = _decode(json.loads(row[0])) if (row and operation.merge) else {}
+            _merge(data, operation.data, now)
+        else:  # update
+            if row is None:
+                raise NotFound(f"No document to update: {ref.path}")
+            data = _decode(json.loads(row[0]))
+            for field_path, value in operation.data.items():
+                _apply(data, field_path, value, now)
+
+        conn.execute(
+            "INSERT INTO documents (collection, id, data, create_time, update_time) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (collection, id) DO UPDATE SET data = excluded.data, update_time = excluded.update_time",
+            (*key, json.dumps(_encode(data), separators=(",", ":"), ensure_ascii=False), row[1] if row else now_ns, now_ns),
+        )
+        return WriteResult(now)
@@ -0,0 +1,87 @@
+"""
+Single-write helpers for the create and update endpoints.
+
+Creates pick the document id client-side and build the returned snapshot from
+the payload and the write result, so a POST is one RPC. Updates write with a
+last-update-time precondition against the copy they already hold and merge the
+patch onto it, so a PATCH is one read plus one write instead of read, write,
+read. If the document changed in between, the precondition fails and the update
+is retried on a fresh copy, unless the client pinned a version with If-Match, in
+which case the conflict is reported as 412.
+"""
+from fastapi import HTTPException
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from google.cloud.firestore_v1.base_document import DocumentSnapshot
+from core.etag import document_etag, etag_matches
+from db import aio
+
+UPDATE_ATTEMPTS = 3
+
+
+def _written(ref, data, write_result, create_time=None):
+    return DocumentSnapshot(
+        ref, data, exists=True,
+        read_time=write_result.update_time,
+        create_time=create_time,
+        update_time=write_result.update_time,
+    )
+
+
+async def create_document(db, collection: str, data: dict, doc_id: str = None) -> DocumentSnapshot:
+    """Creates a document (auto id unless doc_id is given) and returns it without re-reading."""
+    ref = db.collection(collection).document(doc_id)
+    result = await aio.write(ref.create, data)
+    return _written(ref, data, result, create_time=result.update_time)
+
+
+async def set_document(ref, data: dict) -> DocumentSnapshot:
+    """Creates or overwrites a document and returns it without re-reading."""
+    result = await aio.write(ref.set, data)
+    return _written(ref, data, result)
+
+
+def _precondition_failed():
+    return HTTPException(status_code=412, detail="Document has changed since it was fetched; fetch it again before updating.")
+
+
+async def update_document(db, ref, data: dict, current: DocumentSnapshot = None, if_match: str = None):
+    """
+    Applies a partial update and returns the merged document, or None if it does not exist.
+    Pass `current` when the caller already holds a snapshot to skip the read entirely,
+    and `if_match` to only update the version the client last saw.
+    """
+    _, updated = await update_with_previous(db, ref, data, current=current, if_match=if_match)
+    return updated
+
+
+async def update_with_previous(db, ref, data: dict, current: DocumentSnapshot = None, if_match: str = None) -> tuple:
+    """
+    Like update_document, but returns (previous, updated): the exact version the
+    update was applied to as well as the result, or (None, None) if the document
+    does not exist.
+    """
+    for _ in range(UPDATE_ATTEMPTS):
+        fresh = current is None
+        if fresh:
+            current = await aio.get(ref)
+        if not current.exists:
+            return None, None
+        if if_match and not etag_matches(if_match, document_etag(current)):
+            if not fresh:
+                current = None  # the caller's copy may be older than the client's
+                continue
+            raise _precondition_failed()
+        if not data:
+            return current, current
+        option = db.write_option(last_update_time=current.update_time)
+        try:
+            result = await aio.write(ref.update, data, option=option)
+        except NotFound:
+            return None, None
+        except FailedPrecondition:
+            if if_match:
+                raise _precondition_failed()
+            current = None
+            continue
+        return current, _written(ref, {**current.to_dict(), **data}, result, create_time=current.create_time)
+    raise HTTPException(status_code=409, detail="Document is being modified concurrently, please retry.")
@@ -1,20 +1,73 @@
 # main.py
+from core import startup  # first, so startup timings begin here
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
 load_dotenv()
 
 from fastapi import FastAPI
 # Import the new tts router
-from api import users, farms, soil_profiles, crops, resources, challenges, finance, chats, logs, alerts, tts
-from db.firestore_client import initialize_firestore
+from api import users, farms, soil_profiles, crops, resources, challenges, finance, chats, logs, alerts, tts, exports, metrics, deletion_jobs, regions
+from core.config import settings
+from core.encoding import EncodingMiddleware
+from core.metrics import MetricsMiddleware, run_in_threadpool
+from core.security import shutdown_password_pool
+from db import aio
+from db.deletion import resume_jobs, shutdown_deletion_workers
+from db.firestore_client import get_db
+
+startup.record("imports", time.perf_counter() - startup.PROCESS_START)
+_app_started = time.perf_counter()
+
+
+async def _warm_up_storage():
+    db = await run_in_threadpool(get_db)
+    # Any read opens the channel; a missing document costs one read
+    await aio.get(db.collection('users').document('_warmup'))
+
+
+async def warm_up():
+    """Creates the storage and TTS clients and opens their connections while the app is already serving."""
+    async def step(name, call):
+        try:
+            with startup.phase(f"warmup.{name}"):
+                await call()
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {e}")
+
+    await asyncio.gather(
+        step("storage", _warm_up_storage),
+        step("tts", lambda: run_in_threadpool(tts.warm_up_tts)),
+    )
+    startup.report()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clients are created on first use, so nothing here waits on the network
+    with startup.phase("deletion_jobs"):
+        resume_jobs()
+    warm_up_task = asyncio.create_task(warm_up()) if settings.STARTUP_WARMUP else None
+    startup.mark_ready()
+    startup.report()
+    yield
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    shutdown_password_pool()
+    shutdown_deletion_workers()
+
 
 app = FastAPI(
     title="Krishi Sakhi POC API",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
 )
 
-@app.on_event("startup")
-def startup_event():
-    initialize_firestore()
+# Metrics is added last so it is outermost and also times the encoding
+app.add_middleware(EncodingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Include all routers
 app.include_router(users.router)
@@ -29,7 +82,13 @@ app.include_router(chats.router_for_single_chat)
 app.include_router(logs.router)
 app.include_router(alerts.router)
 app.include_router(tts.router)
+app.include_router(exports.router)
+app.include_router(deletion_jobs.router)
+app.include_router(regions.router)
+app.include_router(metrics.router)
+
+startup.record("app", time.perf_counter() - _app_started)
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to the Krishi Sakhi POC API"}
\ No newline at end of file
+    return {"message": "Welcome to the Krishi Sakhi POC API"}
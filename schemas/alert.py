@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 class AlertBase(BaseModel):
@@ -22,4 +22,9 @@ class AlertUpdate(BaseModel):
 class Alert(AlertBase):
     id: str
     createdAt: datetime
-    class Config: from_attributes = True
\ No newline at end of file
+    class Config: from_attributes = True
+
+class AlertSummary(BaseModel):
+    total: int
+    unread: int
+    unreadByPriority: Dict[str, int] # keyed by priority, "1" to "3"
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import Optional, List, Dict, Any
+
+class BatchCreate(BaseModel):
+    # Items are validated one by one against the collection's create schema, so a
+    # bad item is reported in its own result instead of rejecting the whole batch.
+    # An optional "idempotencyKey" per item makes retried syncs safe.
+    items: List[Dict[str, Any]]
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: str # created, duplicate, invalid or failed
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    created: int = 0
+    duplicates: int = 0
+    errors: int = 0
+    results: List[BatchItemResult] = []
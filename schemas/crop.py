@@ -23,4 +23,5 @@ class CropUpdate(BaseModel):
 class Crop(CropBase):
     id: str # Will be the same as farmId
     createdAt: datetime
+    updatedAt: Optional[datetime] = None
     class Config: from_attributes = True
\ No newline at end of file
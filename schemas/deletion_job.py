@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class DeletionJob(BaseModel):
+    id: str
+    kind: str # farm or user
+    targetId: str
+    status: str # pending, running, done or failed
+    step: int
+    totalSteps: int
+    deleted: int # child documents deleted so far
+    error: Optional[str] = None
+    createdAt: datetime
+    updatedAt: datetime
+
+    @classmethod
+    def from_job(cls, job_id: str, job: dict) -> "DeletionJob":
+        return cls(id=job_id, totalSteps=len(job["steps"]), **{k: v for k, v in job.items() if k in cls.model_fields})
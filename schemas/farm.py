@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 class FarmBase(BaseModel):
@@ -45,4 +45,10 @@ class FarmUpdate(BaseModel):
 class Farm(FarmBase):
     id: str
     lastUpdated: datetime
-    class Config: from_attributes = True    
\ No newline at end of file
+    scoredAt: Optional[datetime] = None # set by the scoring job (scripts/score_farms.py)
+    class Config: from_attributes = True    
+
+class FarmSummary(BaseModel):
+    farms: int
+    totalFarmArea: float
+    averageScores: Dict[str, Optional[float]] # None when no farm has the score
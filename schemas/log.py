@@ -19,4 +19,8 @@ class LogUpdate(BaseModel):
 class Log(LogBase):
     id: str
     timestamp: datetime
-    class Config: from_attributes = True
\ No newline at end of file
+    class Config: from_attributes = True
+
+class LogSummary(BaseModel):
+    total: int
+    byActivityType: Dict[str, int]
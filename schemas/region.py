@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+from datetime import datetime
+
+def _ranked(counts: Optional[dict]) -> Dict[str, int]:
+    return dict(sorted(((k, int(v)) for k, v in (counts or {}).items() if v > 0), key=lambda kv: -kv[1]))
+
+class RegionSummary(BaseModel):
+    id: str
+    level: str # state, district or taluka
+    state: str
+    district: Optional[str] = None
+    taluka: Optional[str] = None
+    farms: int
+    totalFarmArea: float
+    soilTests: int
+    averageSoil: Dict[str, Optional[float]] # None when no soil test in the region has the field
+    irrigationMethods: Dict[str, int] # farms per method, most common first
+    crops: Dict[str, int] # farms per current crop, most common first
+    updatedAt: Optional[datetime] = None
+
+    @classmethod
+    def from_rollup(cls, rollup_id: str, rollup: dict, soil_fields: list) -> "RegionSummary":
+        soil = rollup.get("soil") or {}
+        average = {}
+        for field in soil_fields:
+            totals = soil.get(field) or {}
+            average[field] = round(totals["sum"] / totals["count"], 3) if totals.get("count") else None
+        return cls(
+            id=rollup_id, level=rollup["level"], state=rollup["state"],
+            district=rollup.get("district"), taluka=rollup.get("taluka"),
+            farms=rollup.get("farms", 0), totalFarmArea=rollup.get("totalFarmArea", 0),
+            soilTests=rollup.get("soilTests", 0), averageSoil=average,
+            irrigationMethods=_ranked(rollup.get("irrigation")), crops=_ranked(rollup.get("crops")),
+            updatedAt=rollup.get("updatedAt"),
+        )
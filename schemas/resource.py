@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from datetime import datetime
 
 class ResourceBase(BaseModel):
     userId: str # Changed from farmId
@@ -21,5 +22,6 @@ class ResourceUpdate(BaseModel):
     
 class Resource(ResourceBase):
     id: str # Will be the same as userId
+    updatedAt: Optional[datetime] = None
     class Config: 
         from_attributes = True
\ No newline at end of file
@@ -0,0 +1,58 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+class SoilTestSnapshot(BaseModel):
+    id: str
+    soilPH: Optional[float] = None
+    nitrogen: Optional[float] = None
+    phosphorus: Optional[float] = None
+    potassium: Optional[float] = None
+    organicCarbon: Optional[float] = None
+    lastTestedAt: Optional[datetime] = None
+
+class LogSnapshot(BaseModel):
+    id: str
+    activityType: str
+    description: str
+    timestamp: datetime
+
+class ChatSnapshot(BaseModel):
+    id: str
+    messageType: str
+    messageText: str
+    timestamp: datetime
+
+class FarmSnapshot(BaseModel):
+    id: str
+    village: Optional[str] = None
+    taluka: Optional[str] = None
+    district: Optional[str] = None
+    state: Optional[str] = None
+    totalFarmArea: Optional[float] = None
+    soilType: Optional[str] = None
+    irrigationMethod: Optional[str] = None
+    lastUpdated: Optional[datetime] = None
+    currentCrop: Optional[str] = None
+    season: Optional[str] = None
+    latestSoilTest: Optional[SoilTestSnapshot] = None
+    recentLogs: List[LogSnapshot] = [] # newest first
+    recentChats: List[ChatSnapshot] = [] # newest first
+
+class UserSnapshot(BaseModel):
+    userId: str
+    fullName: Optional[str] = None
+    preferredLanguage: Optional[str] = None
+    farms: List[FarmSnapshot]
+    unreadAlerts: int
+    version: int = 0 # raised on every change; 0 when computed on the fly
+    updatedAt: Optional[datetime] = None
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict) -> "UserSnapshot":
+        farms = sorted((snapshot.get("farms") or {}).values(), key=lambda farm: farm["id"])
+        return cls(
+            userId=snapshot["userId"], **(snapshot.get("profile") or {}), farms=farms,
+            unreadAlerts=snapshot.get("unreadAlerts", 0), version=snapshot.get("version", 0),
+            updatedAt=snapshot.get("updatedAt"),
+        )
@@ -1,11 +1,14 @@
 # schemas/user.py
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, Optional
 from datetime import datetime
 
+# Stripped on the way in, so the user document and its phone index entry hold the same number
+Phone = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
 class UserBase(BaseModel):
     fullName: str
-    phone: str
+    phone: Phone
     age: Optional[int] = None
     gender: Optional[str] = None
     preferredLanguage: Optional[str] = 'Malayalam'
@@ -17,7 +20,7 @@ class UserCreate(UserBase):
 
 # New schema for the login endpoint body
 class UserLogin(BaseModel):
-    phone: str
+    phone: Phone
     password: str
 
 class UserUpdate(BaseModel):
@@ -0,0 +1,54 @@
+"""
+Sets the geohash of activity logs recorded before nearby queries existed.
+
+    python -m scripts.backfill_log_geohash [--dry-run]
+
+Safe to re-run: logs whose stored geohash already matches their geoLocation
+are skipped.
+"""
+import argparse
+from dotenv import load_dotenv
+load_dotenv()
+
+from google.cloud.firestore_v1.field_path import FieldPath
+from db.firestore_client import initialize_storage, get_sync_db
+from db.geo import with_geohash
+
+PAGE_SIZE = 500
+
+
+def backfill(db, dry_run: bool = False) -> dict:
+    counts = {"logs": 0, "updated": 0, "current": 0, "no_location": 0}
+    query = db.collection('logs').select(['geoLocation', 'geohash']).order_by(FieldPath.document_id()).limit(PAGE_SIZE)
+    writer = None if dry_run else db.bulk_writer()
+    last = None
+
+    while True:
+        page = list((query.start_after(last) if last else query).stream())
+        if not page:
+            break
+        last = page[-1]
+        counts["logs"] += len(page)
+        for doc in page:
+            data = doc.to_dict()
+            expected = with_geohash({"geoLocation": data.get("geoLocation")})["geohash"]
+            if expected is None and data.get("geohash") is None:
+                counts["no_location"] += 1
+            elif data.get("geohash") == expected:
+                counts["current"] += 1
+            else:
+                counts["updated"] += 1
+                if writer:
+                    writer.update(doc.reference, {"geohash": expected})
+
+    if writer:
+        writer.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="report what would be updated without writing")
+    args = parser.parse_args()
+    initialize_storage()
+    print(backfill(get_sync_db(), dry_run=args.dry_run))
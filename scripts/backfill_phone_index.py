@@ -0,0 +1,63 @@
+"""
+Builds phoneIndex entries for users registered before the index existed.
+
+    python -m scripts.backfill_phone_index [--dry-run]
+
+Safe to re-run: entries that already point at the right user are skipped, and
+phone numbers shared by several existing users are reported, not overwritten.
+"""
+import argparse
+from dotenv import load_dotenv
+load_dotenv()
+
+from google.cloud.firestore_v1.field_path import FieldPath
+from db.firestore_client import initialize_storage, get_sync_db
+from db.phone_index import index_ref, normalize_phone
+
+PAGE_SIZE = 500
+
+
+def backfill(db, dry_run: bool = False) -> dict:
+    counts = {"users": 0, "created": 0, "existing": 0, "conflicts": 0, "missing_phone": 0}
+    query = db.collection('users').select(['phone']).order_by(FieldPath.document_id()).limit(PAGE_SIZE)
+    writer = None if dry_run else db.bulk_writer()
+    claimed = {}  # phone index path -> user created for it by this run
+    last = None
+
+    while True:
+        page = list((query.start_after(last) if last else query).stream())
+        if not page:
+            break
+        last = page[-1]
+        users = [doc for doc in page if doc.to_dict().get('phone')]
+        counts["users"] += len(page)
+        counts["missing_phone"] += len(page) - len(users)
+
+        refs = {doc.id: index_ref(db, normalize_phone(doc.get('phone'))) for doc in users}
+        existing = {snap.reference.path: snap for snap in db.get_all(list(refs.values()))}
+        for doc in users:
+            ref = refs[doc.id]
+            snap = existing.get(ref.path)
+            owner = snap.get('userId') if snap and snap.exists else claimed.get(ref.path)
+            if owner == doc.id:
+                counts["existing"] += 1
+            elif owner is not None:
+                counts["conflicts"] += 1
+                print(f"Conflict: phone {doc.get('phone')} belongs to {owner}, also used by {doc.id}")
+            else:
+                claimed[ref.path] = doc.id
+                counts["created"] += 1
+                if writer:
+                    writer.create(ref, {"userId": doc.id})
+
+    if writer:
+        writer.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="report what would be created without writing")
+    args = parser.parse_args()
+    initialize_storage()
+    print(backfill(get_sync_db(), dry_run=args.dry_run))
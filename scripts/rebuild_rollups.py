@@ -0,0 +1,23 @@
+"""
+Recomputes the regional rollups (regionRollups) from farms, soil profiles and crops.
+
+    python -m scripts.rebuild_rollups [--dry-run]
+
+The API keeps the rollups up to date as records change; run this after a
+bulk import that bypassed the API, or to repair drift. Increments made while
+it runs can be overwritten, so run it when writes are quiet.
+"""
+import argparse
+from dotenv import load_dotenv
+load_dotenv()
+
+from db.firestore_client import initialize_storage, get_sync_db
+from db import rollups
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="compute the rollups without writing them")
+    args = parser.parse_args()
+    initialize_storage()
+    print(rollups.rebuild(get_sync_db(), dry_run=args.dry_run))
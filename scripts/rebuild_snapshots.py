@@ -0,0 +1,27 @@
+"""
+Rebuilds the user snapshots (userSnapshots) from the source collections.
+
+    python -m scripts.rebuild_snapshots [--user USER_ID ...] [--dry-run]
+
+Each snapshot is compared with the user's profile, farms, crops, soil tests,
+logs, chats and alerts, and rewritten only if it drifted, which raises its
+version. Snapshots of deleted users are removed. Run it after turning on
+USER_SNAPSHOTS_ENABLED, after a bulk import that bypassed the API, or with
+--user to repair one user's home screen.
+"""
+import argparse
+import asyncio
+from dotenv import load_dotenv
+load_dotenv()
+
+from db.firestore_client import initialize_storage, get_db
+from db import snapshots
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", action="append", dest="users", metavar="USER_ID", help="only repair this user; repeatable")
+    parser.add_argument("--dry-run", action="store_true", help="report drifted snapshots without writing them")
+    args = parser.parse_args()
+    initialize_storage()
+    print(asyncio.run(snapshots.rebuild(get_db(), user_ids=args.users, dry_run=args.dry_run)))
@@ -0,0 +1,25 @@
+"""
+Computes yield, soil, storage, sustainability and quality scores for farms.
+
+    python -m scripts.score_farms [--full] [--dry-run]
+
+By default only farms whose farm record, soil tests, crop profile or owner's
+resource profile changed since the previous run are read and rescored, which
+keeps a nightly run short. The first run, and any run with --full, reads and
+rescores every farm, e.g. after the formulas in core/scoring.py change.
+"""
+import argparse
+from dotenv import load_dotenv
+load_dotenv()
+
+from db.firestore_client import initialize_storage, get_sync_db
+from db import scoring
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="rescore every farm, not only those with changed inputs")
+    parser.add_argument("--dry-run", action="store_true", help="compute scores without writing them")
+    args = parser.parse_args()
+    initialize_storage()
+    print(scoring.run(get_sync_db(), incremental=not args.full, dry_run=args.dry_run))
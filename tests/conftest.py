@@ -0,0 +1,32 @@
+import os
+
+# The embedded SQLite backend stands in for Firestore, so the tests need no credentials
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+
+import pytest
+from fastapi.testclient import TestClient
+from core.config import settings
+from db import firestore_client
+from db.sqlite_client import SQLiteClient
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SQLiteClient(str(tmp_path / "test.db"))
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """The app, serving from a fresh SQLite database."""
+    from main import app
+    monkeypatch.setattr(firestore_client, "db", db)
+    monkeypatch.setattr(settings, "STARTUP_WARMUP", False)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def user_id(client):
+    response = client.post("/api/users/register", json={"fullName": "A. Farmer", "phone": "+919800000001", "password": "pw123456"})
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
@@ -0,0 +1,69 @@
+import asyncio
+from db.aggregates import AggregateCache
+
+
+def test_results_are_cached_per_variant_until_invalidated():
+    cache, calls = AggregateCache(ttl=60, max_entries=10), []
+
+    async def compute():
+        calls.append(1)
+        return {"count": len(calls)}
+
+    async def scenario():
+        assert await cache.get("logs", "f1", compute, variant=("a",)) == {"count": 1}
+        assert await cache.get("logs", "f1", compute, variant=("a",)) == {"count": 1}
+        assert await cache.get("logs", "f1", compute, variant=("b",)) == {"count": 2}
+        cache.invalidate("logs", "f1")
+        assert await cache.get("logs", "f1", compute, variant=("a",)) == {"count": 3}
+
+    asyncio.run(scenario())
+
+
+def test_a_result_computed_across_an_invalidation_is_not_cached():
+    cache = AggregateCache(ttl=60, max_entries=10)
+    counts = iter([1, 2])
+
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_compute():
+            value = next(counts)
+            started.set()
+            await release.wait()
+            return {"count": value}
+
+        pending = asyncio.create_task(cache.get("alerts", "u1", slow_compute))
+        await started.wait()
+        cache.invalidate("alerts", "u1")  # a write lands while the old count is being computed
+        release.set()
+        assert await pending == {"count": 1}
+        assert await cache.get("alerts", "u1", slow_compute) == {"count": 2}
+        assert not cache._computing
+
+    asyncio.run(scenario())
+
+
+def test_log_summary_counts_per_activity_type(client, user_id):
+    farm_id = client.post(f"/api/users/{user_id}/farms/", json={"userId": user_id, "state": "Kerala"}).json()["id"]
+    for activity in ("sowing", "sowing", "harvest"):
+        client.post(f"/api/farms/{farm_id}/logs/", json={"farmId": farm_id, "activityType": activity, "description": "d"})
+    summary = client.get(f"/api/farms/{farm_id}/logs/summary", params={"activityType": ["sowing", "harvest", "sowing"]}).json()
+    assert summary == {"total": 3, "byActivityType": {"sowing": 2, "harvest": 1}}
+
+    client.post(f"/api/farms/{farm_id}/logs/", json={"farmId": farm_id, "activityType": "harvest", "description": "d"})
+    assert client.get(f"/api/farms/{farm_id}/logs/summary", params={"activityType": "harvest"}).json()["byActivityType"] == {"harvest": 2}
+
+
+def test_log_summary_caps_the_activity_types(client, user_id):
+    farm_id = client.post(f"/api/users/{user_id}/farms/", json={"userId": user_id, "state": "Kerala"}).json()["id"]
+    types = [f"type{i}" for i in range(21)]
+    assert client.get(f"/api/farms/{farm_id}/logs/summary", params={"activityType": types}).status_code == 400
+    assert client.get(f"/api/farms/{farm_id}/logs/summary", params={"activityType": types[:20] * 2}).status_code == 200
+
+
+def test_alert_summary_reflects_a_new_alert_at_once(client, user_id):
+    summary = client.get(f"/api/users/{user_id}/alerts/summary").json()
+    assert (summary["total"], summary["unread"]) == (0, 0)
+    client.post(f"/api/users/{user_id}/alerts/", json={"userId": user_id, "alertType": "pest", "message": "m", "priority": 1, "status": "unread"})
+    summary = client.get(f"/api/users/{user_id}/alerts/summary").json()
+    assert (summary["total"], summary["unread"], summary["unreadByPriority"]["1"]) == (1, 1, 1)
@@ -0,0 +1,51 @@
+import pytest
+
+
+@pytest.fixture
+def farm_id(client, user_id):
+    return client.post(f"/api/users/{user_id}/farms/", json={"userId": user_id, "state": "Kerala"}).json()["id"]
+
+
+def log_item(farm_id, key=None, **fields):
+    item = {"farmId": farm_id, "activityType": "sowing", "description": "d", **fields}
+    if key is not None:
+        item["idempotencyKey"] = key
+    return item
+
+
+def sync(client, farm_id, items):
+    response = client.post(f"/api/farms/{farm_id}/logs/batch", json={"items": items})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def stored_logs(client, farm_id):
+    return client.get(f"/api/farms/{farm_id}/logs/", params={"limit": 100}).json()
+
+
+def test_retried_sync_reports_duplicates_and_writes_nothing(client, farm_id):
+    items = [log_item(farm_id, key=f"k{i}") for i in range(3)]
+    first = sync(client, farm_id, items)
+    assert first["created"] == 3
+    retry = sync(client, farm_id, items + [log_item(farm_id, key="k3")])
+    assert (retry["created"], retry["duplicates"]) == (1, 3)
+    assert [r["id"] for r in retry["results"][:3]] == [r["id"] for r in first["results"]]
+    assert len(stored_logs(client, farm_id)) == 4
+
+
+def test_key_repeated_within_a_batch_is_written_once(client, farm_id):
+    result = sync(client, farm_id, [log_item(farm_id, key="k", description="first"), log_item(farm_id, key="k", description="second")])
+    assert [r["status"] for r in result["results"]] == ["created", "duplicate"]
+    assert [log["description"] for log in stored_logs(client, farm_id)] == ["first"]
+
+
+def test_items_without_a_key_are_always_written(client, farm_id):
+    sync(client, farm_id, [log_item(farm_id)])
+    sync(client, farm_id, [log_item(farm_id)])
+    assert len(stored_logs(client, farm_id)) == 2
+
+
+def test_invalid_items_fail_alone(client, farm_id):
+    result = sync(client, farm_id, [log_item(farm_id, key="a"), {"farmId": farm_id}, log_item("other-farm")])
+    assert [r["status"] for r in result["results"]] == ["created", "invalid", "invalid"]
+    assert (result["created"], result["errors"]) == (1, 2)
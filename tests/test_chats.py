@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from core.config import settings
+from db.chat_hub import ChatHub
+
+
+@pytest.fixture
+def farm_id(client, user_id):
+    return client.post(f"/api/users/{user_id}/farms/", json={"userId": user_id, "state": "Kerala"}).json()["id"]
+
+
+def send(client, farm_id, text):
+    response = client.post(f"/api/farms/{farm_id}/chats/", json={"farmId": farm_id, "messageType": "user", "messageText": text})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_since_returns_only_newer_messages_oldest_first(client, farm_id):
+    first = send(client, farm_id, "one")
+    send(client, farm_id, "two")
+    send(client, farm_id, "three")
+    response = client.get(f"/api/farms/{farm_id}/chats/", params={"since": first["timestamp"]})
+    assert [chat["messageText"] for chat in response.json()] == ["two", "three"]
+
+
+def chat(db, farm_id, text):
+    ref = db.collection("chats").document()
+    ref.set({"farmId": farm_id, "messageType": "user", "messageText": text, "timestamp": datetime.now(timezone.utc)})
+    return ref
+
+
+def test_subscribers_share_one_listener_and_see_every_change(client, db, farm_id):
+    hub = ChatHub()
+
+    async def main():
+        subscribers = [hub.subscribe(farm_id), hub.subscribe(farm_id)]
+        assert hub.listeners() == 1
+
+        async def expect(kind, doc_id):
+            # The listener runs on its own thread, so wait for each change before making the next
+            for subscriber in subscribers:
+                event = await subscriber.next_event(2)
+                assert event is not None and (event[0], event[1].id) == (kind, doc_id)
+
+        ref = chat(db, farm_id, "hello")
+        await expect("added", ref.id)
+        ref.update({"messageText": "hello again"})
+        await expect("modified", ref.id)
+        ref.delete()
+        await expect("removed", ref.id)
+        chat(db, "other-farm", "elsewhere")
+        assert await subscribers[0].next_event(0.1) is None
+
+        hub.unsubscribe(farm_id, subscribers[0])
+        assert hub.listeners() == 1
+        hub.unsubscribe(farm_id, subscribers[1])
+        assert hub.listeners() == 0
+
+    asyncio.run(main())
+
+
+def test_subscriber_that_falls_behind_is_cut_off(client, db, farm_id, monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_STREAM_QUEUE", 2)
+    hub = ChatHub()
+
+    async def main():
+        subscriber = hub.subscribe(farm_id)
+        for i in range(4):
+            chat(db, farm_id, f"message {i}")
+            await asyncio.sleep(0.05)
+        assert subscriber.overflowed
+        hub.unsubscribe(farm_id, subscriber)
+
+    asyncio.run(main())
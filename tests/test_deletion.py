@@ -0,0 +1,72 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _farm(client, user_id, area=2.0):
+    response = client.post(f"/api/users/{user_id}/farms/", json={
+        "userId": user_id, "state": "Kerala", "district": "Palakkad", "totalFarmArea": area, "irrigationMethod": "drip"})
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _wait_for_job(client, job_id):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/deletion-jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"deletion job {job_id} did not finish")
+
+
+def _region(client):
+    return client.get("/api/regions/summary", params={"state": "Kerala", "district": "Palakkad"}).json()
+
+
+def test_farm_deletion_removes_children_and_leaves_the_rollup(client, user_id, db):
+    farm_id = _farm(client, user_id)
+    kept = _farm(client, user_id, area=3.0)
+    client.post(f"/api/farms/{farm_id}/crops/", json={"farmId": farm_id, "currentCrop": "Rice"})
+    client.post(f"/api/farms/{farm_id}/soil-profiles/", json={"farmId": farm_id, "soilPH": 6.5})
+    client.post(f"/api/farms/{farm_id}/logs/", json={"farmId": farm_id, "activityType": "sow", "description": "d"})
+
+    response = client.delete(f"/api/farms/{farm_id}")
+    assert response.status_code == 202
+    assert _wait_for_job(client, response.json()["id"])["status"] == "done"
+
+    assert client.get(f"/api/farms/{farm_id}").status_code == 404
+    for collection in ("crops", "soilProfiles", "logs"):
+        assert not db.collection(collection).where("farmId", "==", farm_id).get()
+    region = _region(client)
+    assert (region["farms"], region["totalFarmArea"], region["soilTests"], region["crops"]) == (1, 3.0, 0, {})
+    assert client.get(f"/api/farms/{kept}").status_code == 200
+
+
+def test_concurrent_deletes_of_one_farm_subtract_it_once(client, user_id):
+    farm_ids = [_farm(client, user_id) for _ in range(3)]
+    with ThreadPoolExecutor(4) as pool:
+        statuses = sorted(pool.map(lambda _: client.delete(f"/api/farms/{farm_ids[0]}").status_code, range(4)))
+    assert statuses == [202, 404, 404, 404]
+    _wait_for_job(client, f"farm-{farm_ids[0]}")
+    region = _region(client)
+    assert (region["farms"], region["totalFarmArea"]) == (2, 4.0)
+
+
+def test_retried_delete_does_not_reset_the_job(client, user_id):
+    farm_id = _farm(client, user_id)
+    job_id = client.delete(f"/api/farms/{farm_id}").json()["id"]
+    _wait_for_job(client, job_id)
+    assert client.delete(f"/api/farms/{farm_id}").status_code == 404
+    assert client.get(f"/api/deletion-jobs/{job_id}").json()["status"] == "done"
+
+
+def test_user_deletion_cascades_and_releases_the_phone_number(client, user_id):
+    farm_id = _farm(client, user_id)
+    response = client.delete(f"/api/users/{user_id}")
+    assert response.status_code == 202
+    assert client.delete(f"/api/users/{user_id}").status_code == 404
+    assert _wait_for_job(client, response.json()["id"])["status"] == "done"
+    assert client.get(f"/api/farms/{farm_id}").status_code == 404
+    assert _region(client)["farms"] == 0
+    again = client.post("/api/users/register", json={"fullName": "B", "phone": "+919800000001", "password": "pw123456"})
+    assert again.status_code == 201
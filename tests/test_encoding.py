@@ -0,0 +1,104 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from core.config import settings
+from core import encoding
+from core.encoding import EncodingMiddleware, choose_coding, wants_msgpack
+
+# brotli and msgpack are optional dependencies
+needs_brotli = pytest.mark.skipif(encoding.brotli is None, reason="brotli is not installed")
+needs_msgpack = pytest.mark.skipif(encoding.msgpack is None, reason="msgpack is not installed")
+
+ITEMS = [{"id": i, "crop": "rice", "season": "kharif"} for i in range(200)]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(EncodingMiddleware)
+
+    @app.get("/large")
+    def large(response: Response):
+        response.headers["ETag"] = '"v1"'
+        return ITEMS
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a" * 2000, b"b" * 2000]), media_type="text/csv")
+
+    return TestClient(app)
+
+
+@needs_brotli
+def test_choose_coding_prefers_brotli_and_honours_q_values():
+    assert choose_coding("gzip, br") == "br"
+    assert choose_coding("gzip, br;q=0") == "gzip"
+    assert choose_coding("br;q=0.5, gzip") == "gzip"
+    assert choose_coding("*") == "br"
+    assert choose_coding("identity") is None
+    assert choose_coding("") is None
+
+
+@needs_msgpack
+def test_wants_msgpack_follows_accept_and_setting(monkeypatch):
+    assert wants_msgpack("application/json, application/x-msgpack")
+    assert not wants_msgpack("application/msgpack;q=0")
+    monkeypatch.setattr(settings, "MSGPACK_ENABLED", False)
+    assert not wants_msgpack("application/msgpack")
+
+
+def test_large_json_is_compressed_with_a_weak_etag(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == ITEMS
+
+
+@needs_brotli
+def test_brotli_is_preferred_when_accepted(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == ITEMS
+
+
+def test_small_and_unnegotiated_bodies_pass_through(client):
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"v1"'
+
+
+@needs_msgpack
+def test_msgpack_body_is_negotiated_and_can_be_compressed(client):
+    response = client.get("/large", headers={"Accept": "application/msgpack", "Accept-Encoding": "gzip"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert response.headers["content-encoding"] == "gzip"
+    assert encoding.msgpack.unpackb(response.content) == ITEMS
+
+    response = client.get("/small", headers={"Accept": "application/msgpack", "Accept-Encoding": "identity"})
+    assert encoding.msgpack.unpackb(response.content) == {"ok": True}
+
+
+def test_streamed_responses_and_head_requests_pass_through(client):
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"a" * 2000 + b"b" * 2000
+
+    response = client.head("/large", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_content_length_is_that_of_the_encoded_body(client):
+    with client.stream("GET", "/large", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert int(response.headers["content-length"]) == len(raw)
+    assert gzip.decompress(raw) == client.get("/large").content
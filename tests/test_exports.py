@@ -0,0 +1,53 @@
+import gzip
+import json
+
+import pytest
+
+from api import exports
+
+
+@pytest.fixture
+def farm_id(client, user_id):
+    return client.post(f"/api/users/{user_id}/farms/", json={"userId": user_id, "state": "Kerala"}).json()["id"]
+
+
+def add_logs(client, farm_id, count):
+    for i in range(count):
+        client.post(f"/api/farms/{farm_id}/logs/", json={"farmId": farm_id, "activityType": "sowing", "description": f"log {i}"})
+
+
+def lines(body: bytes) -> list:
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_export_streams_one_document_per_line_in_id_order(client, farm_id, monkeypatch):
+    monkeypatch.setattr(exports, "CHUNK_BYTES", 100)  # several chunks
+    add_logs(client, farm_id, 5)
+    response = client.get(f"/api/farms/{farm_id}/export/logs")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = lines(response.content)
+    assert len(rows) == 5
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+    assert {row["description"] for row in rows} == {f"log {i}" for i in range(5)}
+    assert {row["id"]: row["timestamp"] for row in rows} == {log["id"]: log["timestamp"] for log in client.get(f"/api/farms/{farm_id}/logs/").json()}
+
+
+def test_export_resumes_after_the_last_id_received(client, farm_id):
+    add_logs(client, farm_id, 4)
+    rows = lines(client.get(f"/api/farms/{farm_id}/export/logs").content)
+    rest = lines(client.get(f"/api/farms/{farm_id}/export/logs", params={"start_after": rows[1]["id"]}).content)
+    assert rest == rows[2:]
+
+
+def test_gzip_export_is_one_gzip_stream(client, farm_id, monkeypatch):
+    monkeypatch.setattr(exports, "CHUNK_BYTES", 100)
+    add_logs(client, farm_id, 5)
+    with client.stream("GET", f"/api/farms/{farm_id}/export/logs", params={"gzip": True}) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.headers["content-encoding"] == "gzip"
+    assert lines(gzip.decompress(raw)) == lines(client.get(f"/api/farms/{farm_id}/export/logs").content)
+
+
+def test_empty_export_has_no_lines(client, farm_id):
+    assert client.get(f"/api/farms/{farm_id}/export/chats").content == b""
+    assert client.get(f"/api/farms/{farm_id}/export/unknown").status_code == 422
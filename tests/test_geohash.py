@@ -0,0 +1,81 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from core import geohash
+from core.config import settings
+from db import geo
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+INSIDE, OUTSIDE = (10.75, 76.65), (10.7501, 76.6501)
+
+
+def _covered(cells, lat, lng):
+    point = geohash.encode(lat, lng)
+    return any(point.startswith(cell) for cell in cells)
+
+
+def test_cover_contains_every_point_of_the_box():
+    rng = random.Random(7)
+    for bbox in [geohash.radius_bbox(10.78, 76.65, 5), geohash.radius_bbox(28.6, 77.2, 50), (-0.5, -0.5, 0.5, 0.5)]:
+        cells = geohash.cover(bbox, 16)
+        assert 0 < len(cells) <= 16
+        corners = [(bbox[0], bbox[1]), (bbox[0], bbox[3]), (bbox[2], bbox[1]), (bbox[2], bbox[3])]
+        samples = [(rng.uniform(bbox[0], bbox[2]), rng.uniform(bbox[1], bbox[3])) for _ in range(500)]
+        assert all(_covered(cells, lat, lng) for lat, lng in corners + samples)
+
+
+def test_smaller_areas_get_finer_cells():
+    wide = geohash.cover(geohash.radius_bbox(10.78, 76.65, 50))
+    narrow = geohash.cover(geohash.radius_bbox(10.78, 76.65, 0.5))
+    assert len(narrow[0]) > len(wide[0])
+
+
+def test_cover_respects_max_cells():
+    bbox = geohash.radius_bbox(10.78, 76.65, 20)
+    assert len(geohash.cover(bbox, 4)) <= 4
+    assert len(geohash.cover(bbox, 1)) == 1
+
+
+def test_prefix_range_brackets_every_hash_in_the_cell():
+    start, end = geohash.prefix_range("tdr1")
+    assert start <= "tdr1" + "0" * 5 < end
+    assert start <= "tdr1" + "z" * 5 < end
+    assert not start <= "tdr2" < end
+
+
+def test_coordinates_accepts_both_key_styles_and_rejects_bad_points():
+    assert geohash.coordinates({"lat": 10, "lng": 76}) == (10.0, 76.0)
+    assert geohash.coordinates({"latitude": 10, "longitude": 76}) == (10.0, 76.0)
+    assert geohash.coordinates({"lat": 91, "lng": 76}) is None
+    assert geohash.coordinates({"lat": 10}) is None
+    assert geohash.coordinates(None) is None
+
+
+def _log(db, lat, lng, minutes):
+    data = geo.with_geohash({"farmId": "f1", "activityType": "spray", "geoLocation": {"lat": lat, "lng": lng},
+                             "timestamp": START + timedelta(minutes=minutes)})
+    db.collection("logs").document().set(data)
+
+
+def _nearby(db, limit, since=None):
+    # The box takes in both spots; only the first counts as inside the area
+    bbox = (10.7, 76.6, 10.8, 76.7)
+    return asyncio.run(geo.logs_in_area(db, bbox, lambda lat, lng: (lat, lng) == INSIDE, limit, since=since))
+
+
+def test_busy_neighbours_outside_the_area_do_not_crowd_out_matches(db):
+    _log(db, *INSIDE, minutes=0)
+    for minute in range(1, 60):
+        _log(db, *OUTSIDE, minutes=minute)
+    docs, truncated = _nearby(db, limit=2)
+    assert [doc.get("geoLocation") for doc in docs] == [{"lat": INSIDE[0], "lng": INSIDE[1]}]
+    assert not truncated
+    assert _nearby(db, limit=2, since=START + timedelta(minutes=1)) == ([], False)
+
+
+def test_hitting_the_scan_ceiling_is_reported(db, monkeypatch):
+    monkeypatch.setattr(settings, "GEO_MAX_SCAN", 10)
+    _log(db, *INSIDE, minutes=0)
+    for minute in range(1, 20):
+        _log(db, *OUTSIDE, minutes=minute)
+    assert _nearby(db, limit=2) == ([], True)
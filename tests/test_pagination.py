@@ -0,0 +1,82 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException, Response
+from core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate
+from google.cloud.firestore_v1.base_query import FieldFilter
+from schemas import log as log_schema
+
+
+def test_cursor_round_trips_datetimes_and_ids():
+    values = [datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc), 42, "doc-id"]
+    token = encode_cursor(values)
+    assert "=" not in token
+    assert decode_cursor(token) == values
+
+
+@pytest.mark.parametrize("token", ["not a cursor", "e30", encode_cursor([{"x": 1}])[:-2]])
+def test_malformed_cursor_is_400(token):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(token)
+    assert raised.value.status_code == 400
+
+
+def _page(limit, start_after=None, fields=None):
+    return SimpleNamespace(limit=limit, start_after=start_after, fields=fields, if_none_match=None)
+
+
+def _logs(db, count):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(count):
+        db.collection("logs").document(f"log{i}").set({
+            "farmId": "f1", "activityType": "sow", "description": f"d{i}",
+            "timestamp": start + timedelta(minutes=i % 3),  # ties broken by id
+        })
+    return db.collection("logs").where(filter=FieldFilter("farmId", "==", "f1"))
+
+
+def test_cursor_pages_visit_every_document_once(db):
+    query = _logs(db, 7)
+    seen, cursor = [], None
+    while True:
+        response = Response()
+        rows = asyncio.run(paginate(query, _page(3, cursor), response, log_schema.Log, order_by="timestamp"))
+        seen += [row["id"] for row in rows]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    assert sorted(seen) == [f"log{i}" for i in range(7)]
+    assert len(seen) == len(set(seen))
+
+
+def test_fields_projection_returns_only_the_requested_fields(db):
+    query = _logs(db, 2)
+    result = asyncio.run(paginate(query, _page(10, fields=["description"]), Response(), log_schema.Log))
+    assert json.loads(result.body) == [{"id": "log0", "description": "d0"}, {"id": "log1", "description": "d1"}]
+
+
+def test_projecting_a_field_outside_the_model_is_400(db):
+    db.collection("users").document("u1").set({"fullName": "A", "hashed_password": "secret"})
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(paginate(db.collection("users"), _page(10, fields=["hashed_password"]), Response(), log_schema.Log))
+    assert raised.value.status_code == 400
+
+
+def test_each_projection_has_its_own_etag(db):
+    query = _logs(db, 2)
+    full = Response()
+    asyncio.run(paginate(query, _page(10), full, log_schema.Log))
+    by_description = asyncio.run(paginate(query, _page(10, fields=["description"]), Response(), log_schema.Log))
+    reordered = asyncio.run(paginate(query, _page(10, fields=["timestamp", "description"]), Response(), log_schema.Log))
+    by_both = asyncio.run(paginate(query, _page(10, fields=["description", "timestamp"]), Response(), log_schema.Log))
+    etags = [full.headers["ETag"], by_description.headers["ETag"], by_both.headers["ETag"]]
+    assert len(set(etags)) == 3
+    assert reordered.headers["ETag"] == by_both.headers["ETag"]
+
+    page = _page(10, fields=["description"])
+    page.if_none_match = full.headers["ETag"]
+    assert asyncio.run(paginate(query, page, Response(), log_schema.Log)).status_code == 200
+    page.if_none_match = by_description.headers["ETag"]
+    assert asyncio.run(paginate(query, page, Response(), log_schema.Log)).status_code == 304
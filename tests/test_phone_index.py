@@ -0,0 +1,43 @@
+from db.phone_index import index_ref
+from scripts.backfill_phone_index import backfill
+
+PHONE = "+919800000001"
+
+
+def register(client, phone, password="pw123456"):
+    return client.post("/api/users/register", json={"fullName": "A. Farmer", "phone": phone, "password": password})
+
+
+def test_phone_can_only_be_registered_once(client, user_id):
+    assert register(client, PHONE).status_code == 409
+    assert register(client, f"  {PHONE} ").status_code == 409
+
+
+def test_user_and_index_store_the_same_stripped_phone(client, db):
+    response = register(client, f" {PHONE}\t")
+    assert response.status_code == 201
+    user_id = response.json()["id"]
+    assert response.json()["phone"] == PHONE
+    assert db.collection("users").document(user_id).get().get("phone") == PHONE
+    assert index_ref(db, PHONE).get().get("userId") == user_id
+
+
+def test_login_finds_the_user_through_the_index(client, user_id):
+    response = client.post("/api/users/login", json={"phone": f" {PHONE}", "password": "pw123456"})
+    assert response.status_code == 200
+    assert response.json()["id"] == user_id
+    assert client.post("/api/users/login", json={"phone": "+919800000002", "password": "pw123456"}).status_code == 404
+
+
+def test_deleting_the_user_releases_the_phone(client, user_id):
+    assert client.delete(f"/api/users/{user_id}").status_code == 202
+    assert register(client, PHONE).status_code == 201
+
+
+def test_backfill_indexes_older_users_by_their_stripped_phone(client, db):
+    db.collection("users").document("old").set({"fullName": "Old", "phone": f" {PHONE} ", "hashed_password": "x"})
+    assert backfill(db)["created"] == 1
+    assert index_ref(db, PHONE).get().get("userId") == "old"
+    assert backfill(db)["existing"] == 1
+    assert client.delete("/api/users/old").status_code == 202
+    assert not index_ref(db, PHONE).get().exists
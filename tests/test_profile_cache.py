@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from core.config import settings
+from db import cache as cache_module
+from db.cache import ProfileCache, profile_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+def read(cache, db, doc_id="f1", collection="crops"):
+    return asyncio.run(cache.get(db, collection, doc_id))
+
+
+def test_hit_is_served_until_invalidated(db, clock):
+    cache = ProfileCache("ttl", max_entries=10, ttls={"crops": 60})
+    db.collection("crops").document("f1").set({"currentCrop": "rice"})
+    assert read(cache, db).get("currentCrop") == "rice"
+    db.collection("crops").document("f1").set({"currentCrop": "wheat"})
+    assert read(cache, db).get("currentCrop") == "rice"
+    cache.invalidate("crops", "f1")
+    assert read(cache, db).get("currentCrop") == "wheat"
+
+
+def test_entries_expire_after_the_collection_ttl(db, clock):
+    cache = ProfileCache("ttl", max_entries=10, ttls={"crops": 60})
+    db.collection("crops").document("f1").set({"currentCrop": "rice"})
+    read(cache, db)
+    db.collection("crops").document("f1").set({"currentCrop": "wheat"})
+    clock.now += 61
+    assert read(cache, db).get("currentCrop") == "wheat"
+
+
+def test_misses_are_cached_only_briefly(db, clock):
+    cache = ProfileCache("ttl", max_entries=10, ttls={"crops": 60})
+    assert not read(cache, db).exists
+    db.collection("crops").document("f1").set({"currentCrop": "rice"})
+    assert not read(cache, db).exists
+    clock.now += settings.PROFILE_CACHE_MISS_TTL + 1
+    assert read(cache, db).exists
+
+
+def test_least_recently_used_entry_is_evicted(db, clock):
+    cache = ProfileCache("ttl", max_entries=2, ttls={"crops": 60})
+    for doc_id in ("a", "b", "c"):
+        db.collection("crops").document(doc_id).set({"currentCrop": doc_id})
+    read(cache, db, "a"), read(cache, db, "b"), read(cache, db, "a"), read(cache, db, "c")
+    for doc_id in ("a", "b", "c"):
+        db.collection("crops").document(doc_id).set({"currentCrop": "changed"})
+    assert read(cache, db, "a").get("currentCrop") == "a"
+    assert read(cache, db, "b").get("currentCrop") == "changed"
+
+
+@pytest.mark.parametrize("mode, collection", [("off", "crops"), ("ttl", "farms")])
+def test_off_mode_and_uncached_collections_always_read(db, clock, mode, collection):
+    cache = ProfileCache(mode, max_entries=10, ttls={"crops": 60})
+    db.collection(collection).document("f1").set({"version": 1})
+    read(cache, db, collection=collection)
+    db.collection(collection).document("f1").set({"version": 2})
+    assert read(cache, db, collection=collection).get("version") == 2
+
+
+def test_crop_writes_invalidate_the_cached_profile(client, user_id):
+    profile_cache.clear()
+    farm_id = client.post(f"/api/users/{user_id}/farms/", json={"userId": user_id, "state": "Kerala"}).json()["id"]
+    assert client.get(f"/api/farms/{farm_id}/crops/").status_code == 404
+    assert client.post(f"/api/farms/{farm_id}/crops/", json={"farmId": farm_id, "currentCrop": "rice"}).status_code == 201
+    assert client.get(f"/api/farms/{farm_id}/crops/").json()["currentCrop"] == "rice"
+    client.patch(f"/api/farms/{farm_id}/crops/", json={"currentCrop": "wheat"})
+    assert client.get(f"/api/farms/{farm_id}/crops/").json()["currentCrop"] == "wheat"
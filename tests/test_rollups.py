@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import pytest
+from db import aio, deletion, rollups
+
+REGION = {"state": "Kerala", "district": "Palakkad", "taluka": None}
+
+
+def test_difference_is_the_new_contribution_minus_the_old():
+    old = rollups.farm_contribution({"totalFarmArea": 2.0, "irrigationMethod": "Drip"})
+    new = rollups.farm_contribution({"totalFarmArea": 3.5, "irrigationMethod": "flood"})
+    assert rollups.prune(rollups.difference(new, old)) == {"totalFarmArea": 1.5, "irrigation": {"drip": -1, "flood": 1}}
+    assert rollups.prune(rollups.difference(new, new)) == {}
+
+
+def test_emptied_deletes_only_entries_down_to_zero():
+    rollup = {"crops": {"green gram": 0, "rice": 2}, "irrigation": {"drip": 1},
+              "soil": {"soilPH": {"sum": 0.0, "count": 0}, "nitrogen": {"sum": 200.0, "count": 1}}}
+    assert sorted(rollups.emptied(rollup)) == ["crops.`green gram`", "soil.soilPH"]
+
+
+def _summary(client, **params):
+    return client.get("/api/regions/summary", params={"state": "Kerala", **params}).json()
+
+
+def _farm(client, user_id, district, area=2.0, irrigation="drip"):
+    return client.post(f"/api/users/{user_id}/farms/", json={
+        "userId": user_id, "state": "Kerala", "district": district, "totalFarmArea": area, "irrigationMethod": irrigation}).json()["id"]
+
+
+def test_write_handlers_keep_the_rollups_in_step(client, user_id):
+    f1 = _farm(client, user_id, "Palakkad")
+    f2 = _farm(client, user_id, "Thrissur", area=3.0, irrigation="flood")
+    client.post(f"/api/farms/{f1}/crops/", json={"farmId": f1, "currentCrop": "Green gram"})
+    client.post(f"/api/farms/{f1}/soil-profiles/", json={"farmId": f1, "soilPH": 6.0})
+    state = _summary(client)
+    assert (state["farms"], state["totalFarmArea"], state["soilTests"]) == (2, 5.0, 1)
+    assert state["crops"] == {"green gram": 1}
+
+    client.patch(f"/api/farms/{f1}/crops/", json={"currentCrop": "Banana"})
+    assert _summary(client)["crops"] == {"banana": 1}
+
+    # Moving a farm takes its soil tests and crop to the new district
+    client.patch(f"/api/farms/{f1}", json={"district": "Thrissur"})
+    moved = _summary(client, district="Thrissur")
+    assert (moved["farms"], moved["soilTests"], moved["crops"]) == (2, 1, {"banana": 1})
+    emptied = _summary(client, district="Palakkad")
+    assert (emptied["farms"], emptied["soilTests"], emptied["crops"], emptied["irrigationMethods"]) == (0, 0, {}, {})
+    assert client.get(f"/api/farms/{f2}").status_code == 200
+
+
+class _Crash(Exception):
+    pass
+
+
+def test_a_page_that_fails_keeps_its_docs_and_its_rollup_delta(client, user_id, db, monkeypatch):
+    farm_id = _farm(client, user_id, "Palakkad")
+    for ph in (6.0, 7.0):
+        client.post(f"/api/farms/{farm_id}/soil-profiles/", json={"farmId": farm_id, "soilPH": ph})
+    step = deletion.farm_steps(farm_id, rollups.region_of({"state": "Kerala", "district": "Palakkad"}))[1]
+    assert step["collection"] == "soilProfiles"
+
+    batch = db.batch
+    def crashing_batch():
+        crashing = batch()
+        def commit():
+            raise _Crash()
+        crashing.commit = commit
+        return crashing
+
+    monkeypatch.setattr(db, "batch", crashing_batch)
+    with pytest.raises(_Crash):
+        deletion._delete_page(db, step, None)
+    assert _summary(client, district="Palakkad")["soilTests"] == 2
+    assert len(db.collection("soilProfiles").where("farmId", "==", farm_id).get()) == 2
+
+    monkeypatch.setattr(db, "batch", batch)
+    assert len(deletion._delete_page(db, step, None)) == 2
+    assert deletion._delete_page(db, step, None) == []  # a redone page subtracts nothing
+    assert _summary(client, district="Palakkad")["soilTests"] == 0
+
+
+def test_a_failed_rollup_update_is_logged_not_raised(db, monkeypatch, caplog):
+    async def failing_write(*args, **kwargs):
+        raise RuntimeError("rollups unavailable")
+
+    monkeypatch.setattr(aio, "write", failing_write)
+    with caplog.at_level(logging.ERROR, logger="db.rollups"):
+        asyncio.run(rollups.apply(db, [(REGION, {"farms": 1})]))
+    assert "Region rollup update failed" in caplog.text
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+import numpy as np
+from core import scoring
+from core.config import settings
+from db import scoring as farm_scoring
+
+
+def _columns(n, yields=None, **overrides):
+    yields = yields if yields is not None else [[] for _ in range(n)]
+    lengths = [len(h) for h in yields]
+    columns = dict(
+        farm_ids=[f"f{i}" for i in range(n)],
+        soil_ph=np.full(n, np.nan), nitrogen=np.full(n, np.nan), phosphorus=np.full(n, np.nan),
+        potassium=np.full(n, np.nan), organic_carbon=np.full(n, np.nan),
+        yield_values=np.array([v for h in yields for v in h], dtype=float),
+        yield_offsets=np.r_[0, np.cumsum(lengths)].astype(int),
+        rotation_crops=np.zeros(n), irrigation=np.full(n, np.nan), storage=np.full(n, np.nan),
+    )
+    columns.update({k: np.asarray(v, dtype=float) for k, v in overrides.items()})
+    return scoring.FarmColumns(**columns)
+
+
+def test_season_key_orders_seasons_chronologically():
+    labels = ["Zaid 2024", "misc", "Kharif 2024", "2022-23", "Rabi 2023-24", "Kharif 2023", "2019", "2021-22"]
+    assert sorted(labels, key=scoring.season_key) == [
+        "2019", "2021-22", "2022-23", "Kharif 2023", "Rabi 2023-24", "Zaid 2024", "Kharif 2024", "misc"]
+
+
+def test_missing_inputs_are_left_out_rather_than_counted_as_zero():
+    scores = scoring.score(_columns(2, soil_ph=[6.5, np.nan], nitrogen=[np.nan, 280]))
+    assert scores["soilScore"].tolist() == [100.0, 100.0]
+    assert np.isnan(scores["yieldScore"]).all()
+    assert np.isnan(scores["storageScore"]).all()
+
+
+def test_yield_score_compares_the_latest_season_with_the_best():
+    steady, falling = [2.0, 2.0, 2.0], [4.0, 2.0]
+    scores = scoring.score(_columns(3, yields=[steady, falling, [3.0]]))
+    assert scores["yieldScore"][0] == 100.0
+    assert scores["yieldScore"][1] < 100.0
+    assert np.isnan(scores["yieldScore"][2])  # one season is not enough
+
+
+def test_scoring_a_subset_matches_the_full_run():
+    rng = np.random.default_rng(3)
+    yields = [list(rng.uniform(1, 5, size=k)) for k in (0, 1, 3, 2, 4)]
+    columns = _columns(5, yields=yields, soil_ph=rng.uniform(5, 8, 5), storage=[1, np.nan, 0.5, 0, 0.8],
+                       irrigation=[0.3, 1, np.nan, 0.5, 0.8], rotation_crops=[0, 1, 2, 3, 4])
+    mask = np.array([False, True, True, False, True])
+    full, subset = scoring.score(columns), scoring.score(columns.take(mask))
+    for name in scoring.SCORES:
+        np.testing.assert_array_equal(full[name][mask], subset[name])
+
+
+def _farm(db, farm_id, user_id, **data):
+    db.collection("farms").document(farm_id).set({"userId": user_id, "irrigationMethod": "drip",
+                                                  "lastUpdated": datetime.now(timezone.utc), **data})
+
+
+def test_load_puts_yield_history_in_season_order(db):
+    _farm(db, "f1", "u1")
+    # Alphabetical order would put "Kharif 2024" first and score the farm as declining
+    db.collection("crops").document("f1").set({"yieldHistory": {"Rabi 2023-24": 2.0, "Kharif 2024": 4.0, "Kharif 2023": 1.0}})
+    columns = farm_scoring.load(db)
+    assert columns.yield_values.tolist() == [1.0, 2.0, 4.0]
+
+
+def test_incremental_runs_only_read_farms_changed_since_the_watermark(db, monkeypatch):
+    monkeypatch.setattr(settings, "SCORING_WATERMARK_OVERLAP", 0)
+    for i in range(3):
+        _farm(db, f"f{i}", "u1" if i < 2 else "u2")
+    first = farm_scoring.run(db)
+    assert (first["mode"], first["scored"]) == ("full", 3)
+    assert farm_scoring.run(db)["scored"] == 0
+
+    db.collection("crops").document("f2").set({"yieldHistory": {"2023": 1.0}, "updatedAt": datetime.now(timezone.utc)})
+    assert farm_scoring.run(db)["scored"] == 1
+    # A resource profile is the owner's, so every farm of theirs is rescored
+    db.collection("resources").document("u1").set({"storageAccess": "cold", "updatedAt": datetime.now(timezone.utc)})
+    report = farm_scoring.run(db)
+    assert (report["mode"], report["scored"]) == ("incremental", 2)
+    assert db.collection("farms").document("f0").get().get("storageScore") == 100.0
+
+    assert farm_scoring.run(db, incremental=False, dry_run=True)["scored"] == 3
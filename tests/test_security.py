@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from core import security
+from core.config import settings
+
+
+def test_hash_round_trip(monkeypatch):
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+    hashed = asyncio.run(security.hash_password("pw123456"))
+    assert hashed.startswith("$2b$04$")
+    assert asyncio.run(security.verify_password("pw123456", hashed))
+    assert not asyncio.run(security.verify_password("wrong", hashed))
+    assert not asyncio.run(security.verify_password("pw123456", ""))
+
+
+def test_needs_rehash_compares_the_stored_cost(monkeypatch):
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 12)
+    assert not security.needs_rehash("$2b$12$" + "x" * 53)
+    assert security.needs_rehash("$2b$10$" + "x" * 53)
+    assert not security.needs_rehash("not a hash")
+
+
+def test_calls_beyond_the_queue_limit_are_shed(monkeypatch):
+    monkeypatch.setattr(security, "_in_flight", security._pool_size() + settings.PASSWORD_QUEUE_LIMIT)
+    with pytest.raises(HTTPException) as shed:
+        asyncio.run(security.hash_password("pw123456"))
+    assert shed.value.status_code == 503
+    assert shed.value.headers["Retry-After"] == "1"
+
+
+def test_login_upgrades_the_hash_to_the_configured_cost(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+    user_id = client.post("/api/users/register", json={"fullName": "A. Farmer", "phone": "+919800000009", "password": "pw123456"}).json()["id"]
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 5)
+    assert client.post("/api/users/login", json={"phone": "+919800000009", "password": "pw123456"}).status_code == 200
+    stored = db.collection("users").document(user_id).get().get("hashed_password")
+    assert stored.startswith("$2b$05$")
+    assert client.post("/api/users/login", json={"phone": "+919800000009", "password": "pw123456"}).status_code == 200
@@ -0,0 +1,26 @@
+from core.sentences import chunk_text, split_sentences
+
+
+def test_sentences_end_at_terminal_punctuation_but_not_inside_decimals():
+    assert split_sentences("Apply 2.5 kg per acre. Water daily! Done?") == ["Apply 2.5 kg per acre.", "Water daily!", "Done?"]
+
+
+def test_devanagari_danda_ends_a_sentence():
+    text = "खेत में पानी दें। फिर खाद डालें॥ ठीक है"
+    assert split_sentences(text) == ["खेत में पानी दें।", "फिर खाद डालें॥", "ठीक है"]
+
+
+def test_closing_quotes_stay_with_their_sentence():
+    assert split_sentences('He said "stop." Then left.') == ['He said "stop."', "Then left."]
+
+
+def test_first_sentence_is_its_own_chunk_and_the_rest_are_packed():
+    chunks = chunk_text("One. Two. Three. Four.", max_bytes=20)
+    assert chunks == ["One.", "Two. Three. Four."]
+
+
+def test_chunks_never_exceed_the_byte_limit_for_multibyte_text():
+    text = " ".join(["नमस्ते किसान भाई।"] * 20) + " " + "क" * 40
+    chunks = chunk_text(text, max_bytes=60)
+    assert all(len(chunk.encode("utf-8")) <= 60 for chunk in chunks)
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
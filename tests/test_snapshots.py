@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from core.config import settings
+from db import snapshots
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(settings, "USER_SNAPSHOTS_ENABLED", True)
+
+
+def home(client, user_id):
+    response = client.get(f"/api/users/{user_id}/home")
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def add_farm(client, user_id):
+    response = client.post(f"/api/users/{user_id}/farms/", json={"userId": user_id, "state": "Kerala", "village": "Aluva"})
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def test_writes_keep_the_snapshot_equal_to_a_fresh_build(client, db, user_id, enabled):
+    assert home(client, user_id)["farms"] == []
+    farm_id = add_farm(client, user_id)
+    client.post(f"/api/farms/{farm_id}/crops/", json={"farmId": farm_id, "currentCrop": "rice", "season": "kharif"})
+    for i in range(settings.SNAPSHOT_RECENT_ITEMS + 2):
+        client.post(f"/api/farms/{farm_id}/logs/", json={"farmId": farm_id, "activityType": "sowing", "description": f"log {i}"})
+    client.post(f"/api/users/{user_id}/alerts/", json={"userId": user_id, "alertType": "irrigation", "message": "water"})
+    client.patch(f"/api/users/{user_id}", json={"fullName": "B. Farmer"})
+
+    snapshot = home(client, user_id)
+    assert snapshot["fullName"] == "B. Farmer"
+    assert snapshot["unreadAlerts"] == 1
+    [farm] = snapshot["farms"]
+    assert (farm["id"], farm["village"], farm["currentCrop"]) == (farm_id, "Aluva", "rice")
+    assert [log["description"] for log in farm["recentLogs"]] == [f"log {i}" for i in range(settings.SNAPSHOT_RECENT_ITEMS + 1, 1, -1)]
+    assert asyncio.run(snapshots.repair(db, user_id, dry_run=True)) == "unchanged"
+
+
+def test_every_change_raises_the_version(client, user_id, enabled):
+    version = home(client, user_id)["version"]
+    add_farm(client, user_id)
+    assert home(client, user_id)["version"] == version + 1
+
+
+def test_failed_snapshot_update_does_not_fail_the_write(client, db, user_id, enabled, monkeypatch):
+    home(client, user_id)
+
+    async def fail(*args):
+        raise RuntimeError("snapshot store unavailable")
+
+    monkeypatch.setattr(snapshots, "_modify", fail)
+    farm_id = add_farm(client, user_id)
+    assert client.get(f"/api/farms/{farm_id}").status_code == 200
+    assert asyncio.run(snapshots.repair(db, user_id)) == "repaired"
+    assert [farm["id"] for farm in home(client, user_id)["farms"]] == [farm_id]
+
+
+def test_home_is_computed_on_the_fly_when_disabled(client, db, user_id):
+    add_farm(client, user_id)
+    assert len(home(client, user_id)["farms"]) == 1
+    assert not snapshots.snapshot_ref(db, user_id).get().exists
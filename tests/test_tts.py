@@ -0,0 +1,123 @@
+import asyncio
+import os
+import types
+
+import pytest
+
+from api import tts
+from core.tts_cache import TTSCache
+
+
+def counting_synthesizer(content=b"audio", delay=0.0):
+    calls = []
+
+    async def synthesize():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return content
+
+    return synthesize, calls
+
+
+def test_concurrent_misses_synthesize_once(tmp_path):
+    cache = TTSCache(str(tmp_path), memory_bytes=1 << 20, disk_bytes=1 << 20)
+    synthesize, calls = counting_synthesizer(delay=0.05)
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_create("k", synthesize) for _ in range(5)))
+
+    assert asyncio.run(main()) == [b"audio"] * 5
+    assert len(calls) == 1
+    assert cache.stats["deduplicated"] == 4
+
+
+def test_cancelled_leader_does_not_cancel_the_synthesis(tmp_path):
+    cache = TTSCache(str(tmp_path), memory_bytes=1 << 20, disk_bytes=1 << 20)
+    synthesize, calls = counting_synthesizer(delay=0.05)
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_create("k", synthesize))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.get_or_create("k", synthesize))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == b"audio"
+    assert len(calls) == 1
+
+
+def test_disk_hit_is_shared_across_caches_and_promoted_to_memory(tmp_path):
+    writer = TTSCache(str(tmp_path), memory_bytes=1 << 20, disk_bytes=1 << 20)
+    reader = TTSCache(str(tmp_path), memory_bytes=1 << 20, disk_bytes=1 << 20)
+    synthesize, calls = counting_synthesizer()
+
+    asyncio.run(writer.get_or_create("k", synthesize))
+    assert asyncio.run(reader.get_or_create("k", synthesize)) == b"audio"
+    assert asyncio.run(reader.get_or_create("k", synthesize)) == b"audio"
+    assert len(calls) == 1
+    assert reader.stats["disk_hits"] == 1 and reader.stats["memory_hits"] == 1
+
+
+def test_evicted_file_is_synthesized_again(tmp_path):
+    writer = TTSCache(str(tmp_path), memory_bytes=1 << 20, disk_bytes=1 << 20)
+    reader = TTSCache(str(tmp_path), memory_bytes=1 << 20, disk_bytes=1 << 20)
+    synthesize, calls = counting_synthesizer()
+
+    asyncio.run(writer.get_or_create("k", synthesize))
+    os.remove(writer._path("k"))
+    assert asyncio.run(reader.get_or_create("k", synthesize)) == b"audio"
+    assert len(calls) == 2
+
+
+def test_failed_disk_write_still_serves_the_audio(tmp_path, monkeypatch):
+    cache = TTSCache(str(tmp_path), memory_bytes=1 << 20, disk_bytes=1 << 20)
+    synthesize, _ = counting_synthesizer()
+
+    def fail(key, content):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(cache, "_store", fail)
+    assert asyncio.run(cache.get_or_create("k", synthesize)) == b"audio"
+
+
+class ScriptedTTS:
+    """Returns each input's text as its audio, and fails for texts in `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def synthesize_speech(self, input, voice, audio_config):
+        if input.text in self.failing:
+            raise RuntimeError("upstream unavailable")
+        return types.SimpleNamespace(audio_content=input.text.encode())
+
+
+@pytest.fixture
+def scripted_tts(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(tts, "tts_cache", TTSCache(str(tmp_path / "tts"), 1 << 20, 1 << 20))
+    monkeypatch.setattr(tts.settings, "TTS_CHUNK_MAX_BYTES", 8)
+
+    def install(failing=()):
+        monkeypatch.setattr(tts, "tts_client", ScriptedTTS(failing))
+    return install
+
+
+def test_stream_yields_chunks_in_order(client, scripted_tts):
+    scripted_tts()
+    response = client.post("/api/tts/synthesize/stream", json={"text": "One. Two. Three.", "language": "english"})
+    assert response.status_code == 200
+    assert response.content == b"One.Two.Three."
+
+
+def test_stream_fails_with_500_when_the_first_chunk_fails(client, scripted_tts):
+    scripted_tts(failing={"One."})
+    response = client.post("/api/tts/synthesize/stream", json={"text": "One. Two. Three.", "language": "english"})
+    assert response.status_code == 500
+
+
+def test_stream_is_cut_short_when_a_later_chunk_fails(client, scripted_tts):
+    scripted_tts(failing={"Three."})
+    response = client.post("/api/tts/synthesize/stream", json={"text": "One. Two. Three.", "language": "english"})
+    assert response.status_code == 200
+    assert response.content == b"One.Two."
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from core.etag import document_etag
+from db import writes
+
+
+def _update(db, ref, data, **kwargs):
+    return asyncio.run(writes.update_document(db, ref, data, **kwargs))
+
+
+def test_create_document_returns_written_data_without_a_read(db):
+    doc = asyncio.run(writes.create_document(db, "farms", {"state": "Kerala"}))
+    assert doc.exists and doc.to_dict() == {"state": "Kerala"}
+    assert doc.update_time == db.collection("farms").document(doc.id).get().update_time
+
+
+def test_update_merges_the_patch_onto_the_stored_document(db):
+    ref = db.collection("farms").document("f1")
+    ref.set({"state": "Kerala", "district": "Palakkad"})
+    updated = _update(db, ref, {"district": "Thrissur"})
+    assert updated.to_dict() == {"state": "Kerala", "district": "Thrissur"}
+    assert ref.get().to_dict() == updated.to_dict()
+
+
+def test_update_of_a_missing_document_returns_none(db):
+    assert _update(db, db.collection("farms").document("missing"), {"state": "Kerala"}) is None
+
+
+def test_stale_copy_is_retried_on_a_fresh_read(db):
+    ref = db.collection("farms").document("f1")
+    ref.set({"state": "Kerala", "district": "Palakkad"})
+    stale = ref.get()
+    ref.update({"district": "Thrissur"})
+    updated = _update(db, ref, {"village": "X"}, current=stale)
+    # The retry merged onto the newer version, so the concurrent edit survives
+    assert ref.get().to_dict() == {"state": "Kerala", "district": "Thrissur", "village": "X"}
+    assert updated.to_dict() == ref.get().to_dict()
+
+
+def test_if_match_with_an_old_etag_is_412(db):
+    ref = db.collection("farms").document("f1")
+    ref.set({"state": "Kerala"})
+    old_etag = document_etag(ref.get())
+    ref.update({"state": "Goa"})
+    with pytest.raises(HTTPException) as raised:
+        _update(db, ref, {"district": "North Goa"}, if_match=old_etag)
+    assert raised.value.status_code == 412
+    assert ref.get().to_dict() == {"state": "Goa"}
+
+
+def test_if_match_is_412_when_the_document_changes_before_the_write(db):
+    ref = db.collection("farms").document("f1")
+    ref.set({"state": "Kerala"})
+    seen = ref.get()
+    ref.update({"state": "Goa"})
+    # The client's version matches the copy held, but the precondition catches the newer write
+    with pytest.raises(HTTPException) as raised:
+        _update(db, ref, {"district": "X"}, current=seen, if_match=document_etag(seen))
+    assert raised.value.status_code == 412
+
+
+def test_if_match_newer_than_the_held_copy_rereads(db):
+    ref = db.collection("farms").document("f1")
+    ref.set({"state": "Kerala"})
+    cached = ref.get()
+    ref.update({"state": "Goa"})
+    updated = _update(db, ref, {"district": "North Goa"}, current=cached, if_match=document_etag(ref.get()))
+    assert updated.to_dict() == {"state": "Goa", "district": "North Goa"}
+
+
+def test_update_with_previous_returns_the_version_it_replaced(db):
+    ref = db.collection("alerts").document("a1")
+    ref.set({"status": "unread"})
+    previous, updated = asyncio.run(writes.update_with_previous(db, ref, {"status": "read"}))
+    assert previous.to_dict() == {"status": "unread"}
+    assert updated.to_dict() == {"status": "read"}